@@ -1,4 +1,5 @@
 import cmd
+import inspect
 import json
 
 from config.config import Config
@@ -35,11 +36,11 @@ class InteractiveMenu(cmd.Cmd):
         self.active_simulation = None
 
     def do_messages(self, arg):
-        'Run or show code for the basic Messages simulation with threads: messages [run/show]'
+        'Run or show code for the Messages simulation: messages [run [threads/asyncio/compare/processes/ring]/show]'
         self._handle_command('messages', arg)
 
     def do_shared_memory(self, arg):
-        'Run or show code for the Shared Memory simulation with threads: shared_memory [run/show]'
+        'Run or show code for the Shared Memory simulation with threads: shared_memory [run [lock/striped/thread_local/batched/compare]/show]'
         self._handle_command('shared_memory', arg)
 
     def do_thread_synchronization(self, arg):
@@ -64,9 +65,13 @@ class InteractiveMenu(cmd.Cmd):
             print(f"{Color.RED}Simulation '{simulation_name}' not found.{Color.RESET}")
             return
 
-        if arg.lower() == 'run':
-            simulation.run()
-        elif arg.lower() == 'show':
+        # Options after 'run' are passed to simulations accepting them, e.g. "messages run asyncio".
+        action, *options = arg.lower().split() or ['']
+        if action == 'run' and len(options) <= len(inspect.signature(simulation.run).parameters):
+            simulation.run(*options)
+        elif action == 'run':
+            print(f"{Color.RED}Too many options for '{simulation_name}'.{Color.RESET}")
+        elif action == 'show' and not options:
             simulation.show_code()
         else:
             print(f"{Color.RED}Invalid command. Use 'run' or 'show'.{Color.RESET}")
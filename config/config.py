@@ -54,17 +54,87 @@ class Config:
         default_config = {
             "message_count": 5,
             "delay_between_messages": 2,
+            "message_benchmark": False,
+            "message_benchmark_messages": 100000,
+            "message_benchmark_producers": [1, 2, 4],
+            "message_benchmark_consumers": [1, 2, 4],
+            "message_benchmark_batch_sizes": [1, 16, 256],
+            "message_queue_size": 1024,
+            "message_transport": "queue",
+            "message_latency": True,
+            "message_latency_json": None,
+            "message_engine": "threads",
+            "message_async_producers": 4,
+            "message_async_consumers": 100,
+            "message_handler_latency": 0.01,
+            "message_compare_consumers": [10, 1000, 10000],
+            "message_compare_messages_per_consumer": 5,
+            "message_process_transports": ["queue", "pipe", "shared_ring"],
+            "message_process_sizes": [64, 1024, 16384],
+            "message_process_messages": 20000,
+            "message_process_transport": "queue",
+            "message_process_consumers": 2,
+            "message_process_record_size": 256,
+            "message_process_handler_rounds": 200,
+            "message_process_timeout": 120,
             "max_threads": 10,
+            "shared_memory_strategy": "lock",
+            "shared_memory_stripes": 8,
+            "shared_memory_flush_interval": 1000,
+            "shared_memory_batch_size": 1000,
+            "shared_memory_strategies": ["lock", "striped", "thread_local", "batched"],
             "use_colors": True,
             "num_threads": 4,
             "delay_between_stages": 1,
             "array_size": 1000000,
             "num_processes": 4,
             "num_arrays": 100,
+            "array_shared_memory": False,
+            "array_worker_generation": False,
+            "array_seed": None,
+            "array_reductions": [],
+            "array_histogram_bins": 10,
+            "array_histogram_range": [0.0, 1.0],
+            "array_block_bytes": 262144,
+            "array_dtype": "float64",
+            "array_benchmark": False,
+            "array_benchmark_dtypes": ["float32", "float64", "int32", "int64"],
+            "array_benchmark_block_bytes": [16384, 262144, 4194304],
+            "array_inputs": [],
+            "array_chunk_elements": 4194304,
             "words_to_count": ["python", "multiprocessing", "example"],
             "file_prefix": "text",
+            "word_count_inputs": [],
+            "word_count_batch_bytes": 1048576,
+            "word_match": "count",
+            "word_count_cache": False,
+            "word_count_cache_path": "word_count_cache.json",
+            "word_count_cache_size": 10000,
+            "word_count_cache_hash": False,
+            "word_count_mode": "words",
+            "word_count_top_k": 10,
+            "word_count_sketch": False,
+            "word_count_sketch_verify": False,
+            "word_count_sketch_width": 65536,
+            "word_count_sketch_depth": 4,
+            "word_count_heavy_hitters": 1000,
+            "word_count_mmap": False,
+            "word_count_chunk_size": 16777216,
+            "word_count_read_size": 4194304,
+            "word_count_bytes": False,
+            "word_count_compare_paths": False,
+            "word_count_prefetch": False,
+            "word_count_prefetch_threads": 4,
+            "word_count_prefetch_depth": 8,
             "start_number": 2,
-            "end_number": 100000
+            "end_number": 100000,
+            "prime_engine": "sieve",
+            "sieve_segment_size": 262144,
+            "prime_result_mode": "count",
+            "prime_shared_memory": False,
+            "prime_chunks_per_process": 16,
+            "prime_cache": False,
+            "prime_cache_path": "prime_bitmap.cache"
         }
         self.data = default_config
         self._write_config(path)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from color import Color
+
+# Put into the queue once per consumer after all producers are done, telling it to stop.
+SENTINEL = None
+
+
+class AsyncMessages:
+    """
+    Producer/consumer engine running on one asyncio event loop instead of one
+    OS thread per consumer. The queue is bounded, so producers are suspended
+    in `put` while consumers are behind (backpressure), and the handlers wait
+    for simulated I/O with `asyncio.sleep` without blocking the loop.
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    async def handler(self, message, latency):
+        """
+        Handles one message, simulating an I/O call of `latency` seconds.
+
+        :param message: The message to handle.
+        :param latency: Seconds of simulated I/O per message.
+        """
+        await asyncio.sleep(latency)
+
+    async def producer(self, message_queue, count):
+        """
+        Puts `count` messages into the queue, waiting whenever it is full.
+
+        :param message_queue: The asyncio.Queue to put into.
+        :param count: The number of messages to send.
+        """
+        for i in range(count):
+            await message_queue.put(i)
+
+    async def consumer(self, message_queue, latency, handled, index):
+        """
+        Handles messages from the queue until it gets the sentinel.
+
+        :param message_queue: The asyncio.Queue to take from.
+        :param latency: Seconds of simulated I/O per message.
+        :param handled: List where the number of handled messages is stored.
+        :param index: Index of this consumer in `handled`.
+        """
+        count = 0
+        while True:
+            message = await message_queue.get()
+            if message is SENTINEL:
+                break
+            await self.handler(message, latency)
+            count += 1
+        handled[index] = count
+
+    async def run_engine(self, num_producers, num_consumers, total_messages, latency, queue_size):
+        """
+        Runs producer and consumer coroutines until all messages are handled.
+
+        :param num_producers: The number of producer coroutines.
+        :param num_consumers: The number of consumer coroutines.
+        :param total_messages: The number of messages sent by all producers together.
+        :param latency: Seconds of simulated I/O per message.
+        :param queue_size: Capacity of the queue.
+        :return: Tuple of messages per second and the number of messages handled.
+        """
+        message_queue = asyncio.Queue(maxsize=queue_size)
+        handled = [0] * num_consumers
+        shares = [total_messages // num_producers + (i < total_messages % num_producers)
+                  for i in range(num_producers)]
+        start_time = time.perf_counter()
+        consumers = [asyncio.create_task(self.consumer(message_queue, latency, handled, index))
+                     for index in range(num_consumers)]
+        await asyncio.gather(*(self.producer(message_queue, share) for share in shares))
+        for _ in consumers:
+            await message_queue.put(SENTINEL)
+        await asyncio.gather(*consumers)
+        elapsed = time.perf_counter() - start_time
+        return (total_messages / elapsed if elapsed else 0.0), sum(handled)
+
+    def benchmark(self, num_producers, num_consumers, total_messages, latency):
+        """
+        Runs the engine on a new event loop.
+
+        :param num_producers: The number of producer coroutines.
+        :param num_consumers: The number of consumer coroutines.
+        :param total_messages: The number of messages sent by all producers together.
+        :param latency: Seconds of simulated I/O per message.
+        :return: Tuple of messages per second and the number of messages handled.
+        """
+        return asyncio.run(self.run_engine(num_producers, num_consumers, total_messages, latency,
+                                           self.config.get('message_queue_size', 1024)))
+
+    def run(self):
+        """
+        Runs the asyncio engine with the configured numbers of producers and
+        consumers and prints its throughput.
+        """
+        num_producers = self.config.get('message_async_producers', 4)
+        num_consumers = self.config.get('message_async_consumers', 100)
+        total_messages = self.config.get('message_benchmark_messages', 100000)
+        latency = self.config.get('message_handler_latency', 0.01)
+        throughput, handled = self.benchmark(num_producers, num_consumers, total_messages, latency)
+
+        print(
+            f"{Color.BLUE}Blueprint: This simulation passes messages between coroutines on one event loop, waiting for I/O without a thread per consumer.{Color.RESET}")
+        print(f"{Color.GREEN}Asyncio Messages Results:")
+        print(f"- Producers: {num_producers}, consumers: {num_consumers}")
+        print(f"- Queue size: {self.config.get('message_queue_size', 1024)}")
+        print(f"- Handler latency: {latency} seconds")
+        print(f"- Messages handled: {handled} of {total_messages}")
+        print(f"- Throughput: {throughput:.0f} messages/s{Color.RESET}")
@@ -0,0 +1,159 @@
+import bz2
+import lzma
+import mmap
+import os
+import re
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression formats recognised by file suffix.
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bzip2', '.xz': 'xz', '.zst': 'zstd'}
+# Formats whose files are often made of several independent members (e.g. from
+# `cat a.gz b.gz`, pigz or pbzip2) that can be decompressed on their own.
+SPLITTABLE = ('gzip', 'bzip2')
+# Start of a gzip member (ID1, ID2, deflate) and of a bzip2 stream (header and first block).
+MEMBER_START = {
+    'gzip': re.compile(rb'\x1f\x8b\x08[\x00-\x1f]'),
+    'bzip2': re.compile(rb'BZh[1-9]1AY&SY'),
+}
+# Compressed bytes decompressed to check that a candidate member start is real.
+PROBE_SIZE = 1 << 16
+
+
+class MemberBoundaryError(ValueError):
+    """
+    Raised when a byte range of a compressed file doesn't start or end exactly at
+    member boundaries, so the members decompressed for it don't line up with the
+    neighbouring ranges.
+    """
+
+
+def compression_of(file_path):
+    """
+    Return the compression format of a file, judging by its suffix.
+
+    :param file_path: Path to the file.
+    :return: 'gzip', 'bzip2', 'xz', 'zstd', or None for uncompressed files.
+    """
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(file_path)[1].lower())
+
+
+def new_decompressor(compression):
+    """
+    Create a decompressor for a single member of the given format. All of them
+    expose `decompress`, `eof` and `unused_data`.
+
+    :param compression: The compression format (see `compression_of`).
+    :return: The decompressor object.
+    """
+    if compression == 'gzip':
+        return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    if compression == 'bzip2':
+        return bz2.BZ2Decompressor()
+    if compression == 'xz':
+        return lzma.LZMADecompressor()
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("Reading .zst files requires the 'zstandard' package.")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown compression format '{compression}'.")
+
+
+def member_ranges(file_path, chunk_size):
+    """
+    Split a multi-member gzip or bzip2 file into byte ranges of about `chunk_size`
+    compressed bytes, each starting at a member. A candidate start found by its
+    magic bytes is only used once a probe decompresses from it without error;
+    whether it really is a member boundary is confirmed later by
+    `iter_decompressed`, which raises MemberBoundaryError otherwise.
+
+    Other formats, single-member files and small files give one range.
+
+    :param file_path: Path to the compressed file.
+    :param chunk_size: The approximate number of compressed bytes per range.
+    :return: List of (file_path, start, end) tuples.
+    """
+    size = os.path.getsize(file_path)
+    compression = compression_of(file_path)
+    if compression not in SPLITTABLE or size <= chunk_size:
+        return [(file_path, 0, size)]
+    bounds = [0]
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = chunk_size
+            while position < size:
+                match = MEMBER_START[compression].search(data, position)
+                if match is None:
+                    break
+                start = match.start()
+                try:
+                    new_decompressor(compression).decompress(data[start:start + PROBE_SIZE])
+                except (OSError, EOFError, ValueError, zlib.error):
+                    position = start + 1
+                    continue
+                bounds.append(start)
+                position = start + chunk_size
+    bounds.append(size)
+    return [(file_path, lo, hi) for lo, hi in zip(bounds, bounds[1:])]
+
+
+def iter_decompressed(file_path, start=0, end=None, read_size=1 << 22):
+    """
+    Decompress the members of a compressed file that start within [start, end),
+    streaming: compressed data is read `read_size` bytes at a time and only the
+    output of one read is held in memory.
+
+    `start` must be a member start, and the last member has to end exactly at
+    `end`; otherwise MemberBoundaryError is raised, since the range would
+    overlap or miss data of its neighbours. Errors of the decompressor in a
+    range not starting at 0 mean the start was not a real member and are
+    reported the same way.
+
+    :param file_path: Path to the compressed file.
+    :param start: Compressed offset of the first member.
+    :param end: Compressed offset the last member has to end at, the file size by default.
+    :param read_size: The number of compressed bytes read at a time.
+    :return: Generator of decompressed byte blocks.
+    """
+    compression = compression_of(file_path)
+    with open(file_path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        end = size if end is None else end
+        if start >= end:
+            return
+        file.seek(start)
+        offset = start
+        decompressor = new_decompressor(compression)
+        data = b''
+        try:
+            while True:
+                if not data:
+                    data = file.read(read_size)
+                    if not data:
+                        break
+                block_size = len(data)
+                output = decompressor.decompress(data)
+                if output:
+                    yield output
+                if not decompressor.eof:
+                    offset += block_size
+                    data = b''
+                    continue
+                # The member ended; the rest of the data belongs to the next one.
+                data = decompressor.unused_data
+                offset += block_size - len(data)
+                if offset >= end:
+                    break
+                decompressor = new_decompressor(compression)
+            if not decompressor.eof:
+                raise EOFError(f"{file_path} ends in the middle of a compressed member.")
+        except (OSError, EOFError, ValueError, zlib.error) as error:
+            if start == 0:
+                raise
+            raise MemberBoundaryError(f"{file_path} has no member starting at offset {start}.") from error
+    if offset != end:
+        raise MemberBoundaryError(f"Members of {file_path} from offset {start} end at {offset}, not at {end}.")
@@ -0,0 +1,157 @@
+import json
+import math
+
+import numpy as np
+
+# Buckets per power of two are 2 ** (SUB_BUCKET_BITS - 1), which bounds the
+# relative error of a recorded value to 2 ** -(SUB_BUCKET_BITS - 1).
+SUB_BUCKET_BITS = 8
+HALF = 1 << (SUB_BUCKET_BITS - 1)
+# Enough buckets for any delay up to 2 ** 63 nanoseconds.
+BUCKETS = (63 - SUB_BUCKET_BITS + 2) * HALF
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed histogram of non-negative integers, such as delays in
+    nanoseconds, in the style of HdrHistogram. Values below 2 ** SUB_BUCKET_BITS
+    have a bucket each; above that every power of two is split into HALF equally
+    wide buckets, so a value is known within 1 / HALF of itself (0.8 %) with a
+    fixed array of a few thousand counts. Hot loops should collect values in a
+    list and hand them to `record_many`, which buckets them all at once with
+    NumPy. Histograms of different consumers merge by adding their counts.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(BUCKETS, dtype=np.int64)
+        self.count = 0
+        self.maximum = 0
+
+    def record(self, value, count=1):
+        """
+        Record a value, `count` times.
+
+        :param value: Non-negative integer; negative values (e.g. from clock steps) are recorded as 0.
+        :param count: How many times the value occurred.
+        """
+        if value < 0:
+            value = 0
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        if shift > 0:
+            self.counts[shift * HALF + (value >> shift)] += count
+        else:
+            self.counts[value] += count
+        self.count += count
+        if value > self.maximum:
+            self.maximum = value
+
+    def record_many(self, values, counts=None):
+        """
+        Record many values at once.
+
+        :param values: Sequence or NumPy array of integers; negative values are recorded as 0.
+        :param counts: How many times each value occurred, once each by default.
+        """
+        values = np.maximum(np.asarray(values, dtype=np.int64), 0)
+        if not values.size:
+            return
+        # frexp gives the bit length as the exponent; exact below 2 ** 53 ns (104 days).
+        shifts = np.maximum(np.frexp(values.astype(np.float64))[1] - SUB_BUCKET_BITS, 0)
+        indexes = np.where(shifts > 0, shifts * HALF + (values >> shifts), values)
+        if counts is None:
+            self.counts += np.bincount(indexes, minlength=BUCKETS)
+            self.count += values.size
+        else:
+            counts = np.asarray(counts, dtype=np.int64)
+            np.add.at(self.counts, indexes, counts)
+            self.count += int(counts.sum())
+        self.maximum = max(self.maximum, int(values.max()))
+
+    def merge(self, other):
+        """
+        Add the values recorded by another histogram to this one.
+
+        :param other: The LatencyHistogram to add.
+        :return: This histogram.
+        """
+        self.counts += other.counts
+        self.count += other.count
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    @staticmethod
+    def bucket_range(index):
+        """
+        The lowest and the highest value counted in a bucket.
+
+        :param index: Index of the bucket.
+        :return: Tuple of the lowest and the highest value.
+        """
+        if index < 2 * HALF:
+            return index, index
+        shift = index // HALF - 1
+        mantissa = index - shift * HALF
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def percentile(self, percent):
+        """
+        The value below or at which `percent` % of the recorded values are,
+        reported as the highest value of its bucket, but never above the maximum.
+
+        :param percent: Percentile between 0 and 100.
+        :return: The value, or 0 if nothing was recorded.
+        """
+        if not self.count:
+            return 0
+        # The rank of the value, counted from 1, as in HdrHistogram. Rounding first
+        # keeps e.g. 20000 * 99.9 / 100 from becoming 19980.000000000004 and rank 19981.
+        rank = max(1, math.ceil(round(self.count * percent / 100, 6)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self.bucket_range(index)[1], self.maximum)
+
+    def summary(self):
+        """
+        :return: Dictionary with the count, the PERCENTILES (as 'p50', 'p99.9'...) and the maximum.
+        """
+        result = {'count': self.count}
+        for percent in PERCENTILES:
+            result[f'p{percent:g}'] = self.percentile(percent)
+        result['max'] = self.maximum
+        return result
+
+    def to_json(self):
+        """
+        :return: The summary with the non-empty buckets as [lowest value, count] pairs,
+                 ready for `json.dump`.
+        """
+        result = self.summary()
+        result['buckets'] = [[self.bucket_range(index)[0], int(self.counts[index])]
+                             for index in np.flatnonzero(self.counts).tolist()]
+        return result
+
+
+def merge_histograms(histograms):
+    """
+    Merge the histograms of several consumers into a new one.
+
+    :param histograms: Iterable of LatencyHistogram objects.
+    :return: The merged LatencyHistogram.
+    """
+    merged = LatencyHistogram()
+    for histogram in histograms:
+        merged.merge(histogram)
+    return merged
+
+
+def export_json(path, runs):
+    """
+    Write latency results to a JSON file.
+
+    :param path: Path of the file to write.
+    :param runs: List of dictionaries describing the runs; LatencyHistogram
+                 values are written with `to_json`.
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(runs, file, indent=2,
+                  default=lambda value: value.to_json() if isinstance(value, LatencyHistogram) else str(value))
@@ -1,20 +1,74 @@
+import copy
+import multiprocessing
+import sys
 import threading
 import time
+import tracemalloc
 import queue
+
 from color import Color
 from config.config import Config
+from examples.async_messages import AsyncMessages
+from examples.latency_histogram import LatencyHistogram, export_json, merge_histograms
+from examples.process_messages import TRANSPORTS, benchmark_transport, run_pipeline
+from examples.ring_buffer import RingBuffer, spsc_benchmark
 from examples.simulation import Simulation
 
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where Python allocations are measured with tracemalloc instead.
+    resource = None
+
+# Put into the queue once per consumer after all producers are done, telling it to stop.
+SENTINEL = None
+# Queueing delays a consumer collects before bucketing them into its histogram at once.
+LATENCY_FLUSH_SIZE = 4096
+
+
+def measure_engine(config, engine, num_producers, num_consumers, total_messages, latency):
+    """
+    Runs one engine and measures how much its peak memory grew. Meant to run
+    in a fresh process, so earlier runs don't hide the peak.
+
+    :param config: The Config of the Messages simulation.
+    :param engine: 'threads' or 'asyncio'.
+    :param num_producers: The number of producers.
+    :param num_consumers: The number of consumers.
+    :param total_messages: The number of messages sent by all producers together.
+    :param latency: Seconds of simulated I/O per message.
+    :return: Tuple of messages per second, messages handled and peak memory growth in KiB,
+             or None for the throughput when the threads couldn't be started.
+    """
+    messages = Messages()
+    messages.config = config
+    if resource is None:
+        tracemalloc.start()
+    baseline = messages.peak_memory_kib()
+    try:
+        if engine == 'asyncio':
+            throughput, handled = AsyncMessages(config).benchmark(
+                num_producers, num_consumers, total_messages, latency)
+        else:
+            throughput, handled = messages.benchmark(num_producers, num_consumers, 1, total_messages, latency)
+    except RuntimeError:
+        # "can't start new thread": the system limit on threads was reached.
+        return None, 0, messages.peak_memory_kib() - baseline
+    return throughput, handled, messages.peak_memory_kib() - baseline
+
 
 class Messages(Simulation):
     def __init__(self):
         self.message_queue = queue.Queue()
         self.config = Config()
         self.print_lock = threading.Lock()
+        # One histogram of queueing delays per consumer run.
+        self.latency_histograms = []
 
     def producer(self):
         """
-        Produces messages and puts them into the queue.
+        Produces messages and puts them into the queue, each with the
+        `perf_counter_ns` time it was enqueued at.
         Simulates a delay between each message to mimic real-world scenarios.
 
         This method prints the status of each message sent, using a lock to avoid
@@ -22,7 +76,7 @@ class Messages(Simulation):
         """
         for i in range(self.config.get('message_count', 5)):
             time.sleep(self.config.get('delay_between_messages', 2))
-            self.message_queue.put(f"Message {i}")
+            self.message_queue.put((time.perf_counter_ns(), f"Message {i}"))
             with self.print_lock:
                 print(f"{Color.GREEN}Producer: Sent message {i}{Color.RESET}")
                 print(
@@ -35,11 +89,18 @@ class Messages(Simulation):
         need to wait for production.
 
         Prints each message received and uses a lock for thread-safe printing.
+        The queueing delay of every timestamped message is recorded in a
+        histogram added to `latency_histograms`.
         """
+        histogram = LatencyHistogram()
+        self.latency_histograms.append(histogram)
         consumed_count = 0
         while consumed_count < self.config.get('message_count', 5):
             try:
                 message = self.message_queue.get(block=True, timeout=5)  # Wait for up to 5 seconds for a message
+                if isinstance(message, tuple):
+                    sent, message = message
+                    histogram.record(time.perf_counter_ns() - sent)
                 time.sleep(self.config.get('delay_between_messages', 2))
                 with self.print_lock:
                     print(f"{Color.RED}Consumer: Received {message}{Color.RESET}")
@@ -52,13 +113,386 @@ class Messages(Simulation):
                     print(f"{Color.RED}Consumer: No message available, waiting...{Color.RESET}")
                 continue
 
-    def run(self):
+    def benchmark_producer(self, message_queue, count, batch_size, timed=False):
+        """
+        Puts `count` messages into the queue as fast as possible, in lists of
+        `batch_size` messages when batching.
+
+        :param message_queue: The queue to put into.
+        :param count: The number of messages to send.
+        :param batch_size: Messages per put; 1 puts the messages themselves.
+        :param timed: Put every item together with the `perf_counter_ns` time it was enqueued at.
+        """
+        put = message_queue.put
+        clock = time.perf_counter_ns
+        if batch_size == 1:
+            for i in range(count):
+                put((clock(), i) if timed else i)
+            return
+        for start in range(0, count, batch_size):
+            batch = list(range(start, min(start + batch_size, count)))
+            put((clock(), batch) if timed else batch)
+
+    def benchmark_consumer(self, message_queue, batch_size, received, index, latency=0.0, histograms=None):
+        """
+        Takes messages from the queue until it gets the sentinel, without timeouts.
+        With `histograms`, the items are expected to be timestamped by the
+        producers. Their queueing delays are collected in a list and bucketed
+        into the consumer's histogram LATENCY_FLUSH_SIZE at a time; a batch is
+        recorded once with the number of its messages.
+
+        :param message_queue: The queue to take from.
+        :param batch_size: Messages per put, as used by the producers.
+        :param received: List where the number of received messages is stored.
+        :param index: Index of this consumer in `received`.
+        :param latency: Seconds of simulated blocking I/O per message.
+        :param histograms: List where the LatencyHistogram of this consumer is stored at
+                           `index`, or None to not measure the queueing delay.
+        """
+        timed = histograms is not None
+        histogram = LatencyHistogram()
+        delays = []
+        sizes = [] if batch_size > 1 else None
+        get = message_queue.get
+        clock = time.perf_counter_ns
+        count = 0
+        while True:
+            item = get()
+            if item is SENTINEL:
+                break
+            if timed:
+                sent, item = item
+                delays.append(clock() - sent)
+                if sizes is not None:
+                    sizes.append(len(item))
+                if len(delays) == LATENCY_FLUSH_SIZE:
+                    histogram.record_many(delays, sizes)
+                    delays.clear()
+                    if sizes is not None:
+                        sizes.clear()
+            messages = len(item) if batch_size > 1 else 1
+            if latency:
+                time.sleep(latency * messages)
+            count += messages
+        received[index] = count
+        if timed:
+            histogram.record_many(delays, sizes)
+            histograms[index] = histogram
+
+    def new_queue(self, num_producers=1, num_consumers=1):
+        """
+        Creates the queue selected by 'message_transport', with a capacity of
+        'message_queue_size': a `queue.Queue`, or a RingBuffer, which only
+        supports a single producer and a single consumer.
+
+        :param num_producers: The number of producer threads using the queue.
+        :param num_consumers: The number of consumer threads using the queue.
+        :return: The new queue.
+        """
+        capacity = self.config.get('message_queue_size', 1024)
+        transport = self.config.get('message_transport', 'queue')
+        if transport == 'ring':
+            if num_producers != 1 or num_consumers != 1:
+                raise ValueError("The ring transport supports one producer and one consumer only.")
+            return RingBuffer(capacity)
+        if transport != 'queue':
+            raise ValueError(f"Unknown transport '{transport}'. Use 'queue' or 'ring'.")
+        return queue.Queue(maxsize=capacity)
+
+    def benchmark(self, num_producers, num_consumers, batch_size, total_messages, latency=0.0,
+                  latency_histograms=None):
+        """
+        Measures the throughput of the queue with several producer and consumer
+        threads. Once all producers are done, one sentinel per consumer is put
+        into the queue, so consumers stop without polling.
+
+        :param num_producers: The number of producer threads.
+        :param num_consumers: The number of consumer threads.
+        :param batch_size: Messages per put and get.
+        :param total_messages: The number of messages sent by all producers together.
+        :param latency: Seconds of simulated blocking I/O per message in the consumers.
+        :param latency_histograms: List that receives the queueing delay LatencyHistogram of
+                                   every consumer; the delays are only measured when it is given.
+        :return: Tuple of messages per second and the number of messages received.
+        """
+        message_queue = self.new_queue(num_producers, num_consumers)
+        received = [0] * num_consumers
+        timed = latency_histograms is not None
+        histograms = [None] * num_consumers if timed else None
+        shares = [total_messages // num_producers + (i < total_messages % num_producers)
+                  for i in range(num_producers)]
+        producers = [threading.Thread(target=self.benchmark_producer, args=(message_queue, share, batch_size, timed))
+                     for share in shares]
+        consumers = [threading.Thread(target=self.benchmark_consumer,
+                                      args=(message_queue, batch_size, received, index, latency, histograms))
+                     for index in range(num_consumers)]
+        start_time = time.perf_counter()
+        started = []
+        try:
+            for thread in consumers + producers:
+                thread.start()
+                started.append(thread)
+        except RuntimeError:
+            # Too many threads: stop the ones already running before giving up.
+            for thread in started:
+                if thread in producers:
+                    thread.join()
+            for thread in started:
+                if thread in consumers:
+                    message_queue.put(SENTINEL)
+            for thread in started:
+                thread.join()
+            raise
+        for thread in producers:
+            thread.join()
+        for _ in consumers:
+            message_queue.put(SENTINEL)
+        for thread in consumers:
+            thread.join()
+        elapsed = time.perf_counter() - start_time
+        if timed:
+            latency_histograms.extend(histograms)
+        return (total_messages / elapsed if elapsed else 0.0), sum(received)
+
+    def run_benchmark(self):
+        """
+        Runs the queue benchmark for every combination of the configured numbers
+        of producers, consumers and batch sizes, and prints the throughput of
+        each relative to the first combination, with the percentiles of the
+        queueing delay merged over all consumers. The ring transport is only
+        measured with one producer and one consumer.
+        """
+        total_messages = self.config.get('message_benchmark_messages', 100000)
+        single = self.config.get('message_transport', 'queue') == 'ring'
+        timed = self.config.get('message_latency', True)
+        rows = []
+        for num_producers in self.config.get('message_benchmark_producers', [1, 2, 4]):
+            for num_consumers in self.config.get('message_benchmark_consumers', [1, 2, 4]):
+                if single and (num_producers, num_consumers) != (1, 1):
+                    continue
+                for batch_size in self.config.get('message_benchmark_batch_sizes', [1, 16, 256]):
+                    histograms = [] if timed else None
+                    throughput, received = self.benchmark(num_producers, num_consumers, batch_size, total_messages,
+                                                          latency_histograms=histograms)
+                    rows.append((num_producers, num_consumers, batch_size, throughput, received,
+                                 merge_histograms(histograms) if timed else None))
+
+        print(
+            f"{Color.BLUE}Blueprint: This benchmark measures how many messages per second a queue passes between threads.{Color.RESET}")
+        print(f"{Color.GREEN}Queue Benchmark ({total_messages} messages per run):")
+        latency_header = ' '.join(f"{name:>8}" for name in ('p50 us', 'p90 us', 'p99 us', 'p99.9 us', 'max us'))
+        latency_header = latency_header + ' ' if timed else ''
+        print(f"  {'producers':>9} {'consumers':>9} {'batch':>6} {'messages/s':>12} {latency_header}{'scaling':>8}")
+        baseline = rows[0][3] if rows else 0.0
+        for num_producers, num_consumers, batch_size, throughput, received, histogram in rows:
+            scaling = throughput / baseline if baseline else 0.0
+            lost = f"  ({total_messages - received} lost)" if received != total_messages else ''
+            delays = ''
+            if timed:
+                delays = ' '.join(f"{value / 1000:>8.1f}" for key, value in histogram.summary().items()
+                                  if key != 'count') + ' '
+            print(f"  {num_producers:>9} {num_consumers:>9} {batch_size:>6} {throughput:>12.0f} {delays}"
+                  f"{scaling:>7.2f}x{lost}")
+        print(Color.RESET, end='')
+        if timed:
+            self.export_latency([{'producers': num_producers, 'consumers': num_consumers, 'batch_size': batch_size,
+                                  'messages_per_second': throughput, 'latency_ns': histogram}
+                                 for num_producers, num_consumers, batch_size, throughput, _, histogram in rows])
+
+    def export_latency(self, runs):
+        """
+        Writes the latency results to the JSON file named by 'message_latency_json', if any.
+
+        :param runs: List of dictionaries describing the runs, see `export_json`.
+        """
+        path = self.config.get('message_latency_json', None)
+        if path:
+            export_json(path, runs)
+            print(f"{Color.GREEN}Latency histograms written to {path}.{Color.RESET}")
+
+    def print_latency(self):
+        """
+        Merges the histograms of all consumers and prints the percentiles of the queueing delay.
+        """
+        histogram = merge_histograms(self.latency_histograms)
+        summary = histogram.summary()
+        print(f"{Color.GREEN}Queueing delay of {summary.pop('count')} messages:")
+        print('- ' + ', '.join(f"{key}: {value / 1000:.1f} us" for key, value in summary.items()) + Color.RESET)
+        self.export_latency([{'messages': histogram.count, 'latency_ns': histogram}])
+
+    @staticmethod
+    def peak_memory_kib():
+        """
+        Peak resident memory of the process in KiB, or the peak of Python
+        allocations traced by tracemalloc where `resource` is not available.
+        """
+        if resource is None:
+            return tracemalloc.get_traced_memory()[1] // 1024
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+        return peak // 1024 if sys.platform == 'darwin' else peak
+
+    def compare_engines(self):
+        """
+        Compares the threaded and the asyncio engine with handlers simulating
+        I/O latency, at every consumer count of 'message_compare_consumers'. Each
+        measurement runs in a fresh process and reports throughput and the
+        growth of peak memory. The threads always use `queue.Queue`, since the
+        ring transport only supports one producer and one consumer.
+        """
+        config = copy.copy(self.config)
+        config.data = {**self.config.data, 'message_transport': 'queue'}
+        num_producers = self.config.get('message_async_producers', 4)
+        latency = self.config.get('message_handler_latency', 0.01)
+        per_consumer = self.config.get('message_compare_messages_per_consumer', 5)
+        rows = []
+        for num_consumers in self.config.get('message_compare_consumers', [10, 1000, 10000]):
+            total_messages = num_consumers * per_consumer
+            for engine in ('threads', 'asyncio'):
+                with multiprocessing.Pool(processes=1, maxtasksperchild=1) as pool:
+                    throughput, handled, memory = pool.apply(
+                        measure_engine, (config, engine, num_producers, num_consumers, total_messages, latency))
+                rows.append((num_consumers, engine, throughput, handled, total_messages, memory))
+
+        print(
+            f"{Color.BLUE}Blueprint: Threads block an OS thread per waiting consumer, coroutines only keep a small object per consumer.{Color.RESET}")
+        print(f"{Color.GREEN}Engine Comparison (handler latency {latency} seconds, {per_consumer} messages per consumer):")
+        memory_unit = 'KiB RSS' if resource is not None else 'KiB traced'
+        print(f"  {'consumers':>9} {'engine':>8} {'messages/s':>12} {memory_unit:>12}")
+        for num_consumers, engine, throughput, handled, total_messages, memory in rows:
+            if throughput is None:
+                print(f"  {num_consumers:>9} {engine:>8} {'failed':>12} {memory:>12}  (too many threads)")
+                continue
+            lost = f"  ({total_messages - handled} lost)" if handled != total_messages else ''
+            print(f"  {num_consumers:>9} {engine:>8} {throughput:>12.0f} {memory:>12}{lost}")
+        print(Color.RESET, end='')
+
+    def compare_transports(self):
+        """
+        Passes fixed-size messages from a producer process to a consumer process
+        through every transport of 'message_process_transports', at every size of
+        'message_process_sizes', and prints the throughput and the latency
+        percentiles of each.
+        """
+        count = self.config.get('message_process_messages', 20000)
+        capacity = self.config.get('message_queue_size', 1024)
+        rows = []
+        for size in self.config.get('message_process_sizes', [64, 1024, 16384]):
+            for name in self.config.get('message_process_transports', list(TRANSPORTS)):
+                throughput, histogram = benchmark_transport(name, size, count, capacity,
+                                                            self.config.get('message_process_timeout', 120))
+                rows.append((size, name, throughput, histogram))
+
+        print(
+            f"{Color.BLUE}Blueprint: Queues pickle every message, pipes copy raw bytes through the kernel and a shared-memory ring copies them into preallocated slots.{Color.RESET}")
+        print(f"{Color.GREEN}Process Transport Comparison ({count} messages per run):")
+        latency_header = ' '.join(f"{name:>8}" for name in ('p50 us', 'p90 us', 'p99 us', 'p99.9 us', 'max us'))
+        print(f"  {'bytes':>6} {'transport':>11} {'messages/s':>12} {'MB/s':>8} {latency_header}")
+        for size, name, throughput, histogram in rows:
+            delays = ' '.join(f"{value / 1000:>8.1f}" for key, value in histogram.summary().items() if key != 'count')
+            print(f"  {size:>6} {name:>11} {throughput:>12.0f} {throughput * size / 1e6:>8.1f} {delays}")
+        print(Color.RESET, end='')
+        self.export_latency([{'bytes': size, 'transport': name, 'messages_per_second': throughput,
+                              'latency_ns': histogram} for size, name, throughput, histogram in rows])
+
+    def run_processes(self):
+        """
+        Runs the process-based variant: a producer process sends fixed-size
+        records to 'message_process_consumers' consumer processes, each through
+        its own transport of the kind 'message_process_transport', and every
+        consumer handles its records with a CPU-bound handler, so the consumers
+        work in parallel instead of taking turns on the GIL.
+        """
+        name = self.config.get('message_process_transport', 'queue')
+        consumers = self.config.get('message_process_consumers', 2)
+        count = self.config.get('message_process_messages', 20000)
+        record_size = self.config.get('message_process_record_size', 256)
+        rounds = self.config.get('message_process_handler_rounds', 200)
+        throughput, histogram, checksum = run_pipeline(
+            name, record_size, count, self.config.get('message_queue_size', 1024), consumers, rounds,
+            self.config.get('message_process_timeout', 120))
+
+        print(
+            f"{Color.BLUE}Blueprint: Each consumer is a separate process, so CPU-heavy handlers run in parallel instead of taking turns on the GIL.{Color.RESET}")
+        print(f"{Color.GREEN}Process Messages Results:")
+        print(f"- Transport: {name}, consumers: {consumers}, record size: {record_size} bytes")
+        print(f"- Handler rounds per message: {rounds}")
+        print(f"- Messages handled: {histogram.count} of {count}, checksum {checksum}")
+        print(f"- Throughput: {throughput:.0f} messages/s")
+        summary = histogram.summary()
+        del summary['count']
+        print('- Queueing delay: ' + ', '.join(f"{key}: {value / 1000:.1f} us" for key, value in summary.items())
+              + Color.RESET)
+
+    def compare_buffers(self):
+        """
+        Compares `queue.Queue`, `collections.deque` and RingBuffer passing
+        messages from one producer thread to one consumer thread, at every batch
+        size of 'message_benchmark_batch_sizes', and checks that no message is
+        lost or reordered.
+        """
+        total_messages = self.config.get('message_benchmark_messages', 100000)
+        capacity = self.config.get('message_queue_size', 1024)
+        rows = []
+        for batch_size in self.config.get('message_benchmark_batch_sizes', [1, 16, 256]):
+            for structure in ('queue', 'deque', 'ring'):
+                # queue.Queue has no batch operations, so it is only measured once.
+                if structure == 'queue' and rows:
+                    continue
+                throughput, in_order = spsc_benchmark(structure, total_messages, batch_size, capacity)
+                rows.append((structure, 1 if structure == 'queue' else batch_size, throughput, in_order))
+
+        print(
+            f"{Color.BLUE}Blueprint: A ring of preallocated slots only takes a lock when one side has to wait; the deque is unbounded and its consumer polls.{Color.RESET}")
+        print(f"{Color.GREEN}Buffer Comparison (1 producer, 1 consumer, {total_messages} messages, capacity {capacity}):")
+        print(f"  {'structure':>9} {'batch':>6} {'messages/s':>12}")
+        for structure, batch_size, throughput, in_order in rows:
+            note = '' if in_order else '  (messages lost or reordered)'
+            print(f"  {structure:>9} {batch_size:>6} {throughput:>12.0f}{note}")
+        print(Color.RESET, end='')
+
+    def run(self, engine=None):
         """
         Runs the simulation by starting both producer and consumer threads.
 
         The producer is started first to populate the queue before the consumer
         starts, ensuring there are messages to consume.
+
+        :param engine: 'threads' (the default, or 'message_engine' from the config),
+                       'asyncio' to run the asyncio engine, 'compare' to
+                       compare both engines, 'processes' to run the process-based
+                       variant (or compare its transports with 'message_benchmark'),
+                       or 'ring' to compare the
+                       ring buffer with queue.Queue and collections.deque.
         """
+        engine = engine or self.config.get('message_engine', 'threads')
+        if engine == 'asyncio':
+            AsyncMessages(self.config).run()
+            return
+        if engine == 'compare':
+            self.compare_engines()
+            return
+        if engine == 'processes':
+            if self.config.get('message_benchmark', False):
+                self.compare_transports()
+            else:
+                self.run_processes()
+            return
+        if engine == 'ring':
+            self.compare_buffers()
+            return
+        if engine != 'threads':
+            print(f"{Color.RED}Unknown engine '{engine}'. Use 'threads', 'asyncio', 'compare', 'processes' or 'ring'.{Color.RESET}")
+            return
+        if self.config.get('message_benchmark', False):
+            self.run_benchmark()
+            return
+        # A new queue every run, so the transport follows the config when it changes between runs.
+        if self.config.get('message_transport', 'queue') == 'ring':
+            self.message_queue = RingBuffer(self.config.get('message_queue_size', 1024))
+        else:
+            self.message_queue = queue.Queue()
+        self.latency_histograms = []
         print(
             f"{Color.BLUE}Blueprint: This simulation demonstrates message passing between threads using a queue.{Color.RESET}")
 
@@ -71,6 +505,7 @@ class Messages(Simulation):
 
         producer_thread.join()  # Wait for producer to finish before consumer can potentially end
         consumer_thread.join()
+        self.print_latency()
 
     def show_code(self):
         """
@@ -130,4 +565,4 @@ class Messages(Simulation):
         
                 producer_thread.join()  # Wait for producer to finish before consumer can potentially end
                 consumer_thread.join()
-        """)
\ No newline at end of file
+        """)
@@ -1,10 +1,80 @@
+import glob
 import multiprocessing
+import os
+from multiprocessing import shared_memory
 import numpy as np
-from time import time
+from time import perf_counter, time
 from color import Color
 from config.config import Config
+from examples.reductions import SumReduction, combine_states, make_reductions, reduce_array
 from examples.simulation import Simulation
 
+# Element types the arrays can be generated with.
+DTYPES = ('float32', 'float64', 'int32', 'int64')
+
+
+def random_array(size, dtype='float64', rng=None):
+    """
+    Generate a random array: floats uniform in [0, 1), integers uniform in [0, 1000).
+
+    :param size: Number of elements.
+    :param dtype: One of DTYPES.
+    :param rng: NumPy Generator to draw from, the global legacy generator by default.
+    :return: NumPy array of the given dtype.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.name not in DTYPES:
+        raise ValueError(f"Unsupported array dtype '{dtype.name}'. Choose from {', '.join(DTYPES)}.")
+    if dtype.kind == 'f':
+        if rng is None:
+            values = np.random.random(size)
+            return values if dtype == np.float64 else values.astype(dtype)
+        return rng.random(size, dtype=dtype)
+    if rng is None:
+        return np.random.randint(0, 1000, size, dtype=dtype)
+    return rng.integers(0, 1000, size, dtype=dtype)
+
+
+# Shared-memory blocks attached by this worker process, by name.
+_shared_blocks = {}
+
+
+def shared_array(name, shape, dtype, offset):
+    """
+    Wrap an array stored in a shared-memory block without copying it. The block
+    is attached on first use and stays attached for the life of the process.
+
+    :param name: Name of the shared-memory block.
+    :param shape: Shape of the array.
+    :param dtype: NumPy dtype (or its string) of the array.
+    :param offset: Byte offset of the array within the block.
+    :return: NumPy array backed by the shared memory.
+    """
+    block = _shared_blocks.get(name)
+    if block is None:
+        block = _shared_blocks[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+
+
+# Memory-mapped .npy files opened by this worker process, by path and modification time.
+_mapped_arrays = {}
+
+
+def mapped_array(path):
+    """
+    Memory-map a .npy file read-only as a flat array. The file is mapped on
+    first use and the mapping is reused by later tasks of the same process.
+
+    :param path: Path to the .npy file.
+    :return: One-dimensional view of the memory-mapped array.
+    """
+    key = (path, os.stat(path).st_mtime_ns)
+    array = _mapped_arrays.get(key)
+    if array is None:
+        # Order 'K' keeps Fortran-ordered files flat without copying them.
+        array = _mapped_arrays[key] = np.ravel(np.load(path, mmap_mode='r'), order='K')
+    return array
+
 
 class MultiprocessingSimulation(Simulation):
     def __init__(self):
@@ -19,22 +89,193 @@ class MultiprocessingSimulation(Simulation):
         """
         return np.sum(array)
 
+    def reductions(self):
+        """
+        Create the reductions listed in 'array_reductions'.
+
+        :return: List of Reduction objects, or None when only the plain sum is computed.
+        """
+        names = self.config.get('array_reductions', [])
+        if not names:
+            return None
+        return make_reductions(names, self.config.get('array_histogram_bins', 10),
+                               self.config.get('array_histogram_range', [0.0, 1.0]))
+
+    def reduce(self, array):
+        """
+        Reduce one array in a worker: the plain sum, or the partial states of all
+        configured reductions computed in a single pass. Both go over tiles of
+        `block_elements`, so the default sum is tiled too.
+
+        :param array: A NumPy array to reduce.
+        :return: The sum, or a dictionary of partial reduction states.
+        """
+        reductions = self.reductions()
+        if reductions is None:
+            reduction = SumReduction()
+            return reduction.finalize(reduce_array(array, [reduction], self.block_elements(array.dtype))['sum'])
+        return reduce_array(array, reductions, self.block_elements(array.dtype))
+
+    def block_elements(self, dtype):
+        """
+        Number of elements of a tile of 'array_block_bytes' bytes, sized so the
+        tile stays in the L2 cache while all reductions go over it.
+
+        :param dtype: The element type of the array.
+        :return: Number of elements per tile.
+        """
+        return max(1, self.config.get('array_block_bytes', 1 << 18) // np.dtype(dtype).itemsize)
+
+    def combine(self, results):
+        """
+        Combine the results of all workers.
+
+        :param results: List of `reduce` results.
+        :return: Dictionary mapping the reduction names to their final results.
+        """
+        reductions = self.reductions()
+        if reductions is None:
+            return {'sum': sum(results)}
+        return combine_states(reductions, results)
+
+    def print_results(self, results):
+        """
+        Print the combined results of all workers.
+
+        :param results: List of `reduce` results.
+        """
+        if self.reductions() is None:
+            print(f"- Total sum of arrays: {sum(results)}")
+            return
+        print("- Reductions:")
+        for name, value in self.combine(results).items():
+            print(f"  - {name}: {value.tolist() if isinstance(value, np.ndarray) else value}")
+
+    def file_worker(self, task):
+        """
+        Worker function reducing a range of elements of a .npy file. The worker
+        maps the file itself, so only the path and range are sent to it.
+
+        :param task: Tuple of the file path and the element range (start, end).
+        :return: Tuple of the `reduce` result, the bytes read and the busy seconds.
+        """
+        path, start, end = task
+        busy_start = perf_counter()
+        block = mapped_array(path)[start:end]
+        result = self.reduce(block)
+        return result, block.nbytes, perf_counter() - busy_start
+
+    def collect_arrays(self):
+        """
+        Collect the .npy files listed in 'array_inputs'. Entries can be files,
+        directories (searched recursively) or glob patterns.
+
+        :return: List of .npy file paths without duplicates.
+        """
+        inputs = self.config.get('array_inputs', [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        paths = []
+        for entry in inputs:
+            if os.path.isdir(entry):
+                for directory, _, file_names in os.walk(entry):
+                    paths.extend(os.path.join(directory, name) for name in sorted(file_names)
+                                 if name.endswith('.npy'))
+            elif glob.has_magic(entry):
+                paths.extend(path for path in sorted(glob.glob(entry, recursive=True)) if os.path.isfile(path))
+            elif os.path.isfile(entry):
+                paths.append(entry)
+            else:
+                print(f"{Color.YELLOW}Input {entry} not found. Skipping.{Color.RESET}")
+        return list(dict.fromkeys(paths))
+
+    def run_files(self, paths, num_processes):
+        """
+        Runs the reductions over .npy files that may be larger than memory. The
+        files are only memory-mapped: each is split into ranges of
+        'array_chunk_elements' elements, every worker maps the file itself and
+        walks its range in cache-sized blocks, and the parent merges the results.
+
+        :param paths: Paths to the .npy files.
+        :param num_processes: Number of processes to use.
+        """
+        chunk_elements = self.config.get('array_chunk_elements', 1 << 22)
+        tasks = []
+        for path in paths:
+            size = np.load(path, mmap_mode='r').size
+            tasks.extend((path, lo, min(lo + chunk_elements, size)) for lo in range(0, size, chunk_elements))
+
+        with multiprocessing.Pool(processes=num_processes) as pool:
+            start_time = time()
+            # Ordered results keep the merge order, and so the rounding, the same on every run.
+            results = list(pool.imap(self.file_worker, tasks))
+            end_time = time()
+
+        total_bytes = sum(nbytes for _, nbytes, _ in results)
+        busy_time = sum(busy for _, _, busy in results)
+        elapsed = end_time - start_time
+        print(
+            f"{Color.BLUE}Blueprint: This simulation demonstrates how multiprocessing can parallelize CPU-intensive tasks across multiple cores.{Color.RESET}")
+        print(f"{Color.GREEN}Multiprocessing Results (memory-mapped .npy files):")
+        print(f"- Number of processes used: {num_processes}")
+        print(f"- Number of files: {len(paths)}")
+        print(f"- Number of chunks: {len(tasks)}")
+        print(f"- Data reduced: {total_bytes / 1e9:.3f} GB")
+        self.print_results([result for result, _, _ in results])
+        print(f"- Busy time (summed over workers): {busy_time:.4f} seconds")
+        if elapsed > 0:
+            print(f"- Throughput: {total_bytes / elapsed / 1e9:.2f} GB/s")
+        print(f"- Time taken: {elapsed:.4f} seconds{Color.RESET}")
+
+    def shared_worker(self, task):
+        """
+        Worker function summing an array stored in shared memory, so only the
+        description of the array is sent to the process.
+
+        :param task: Tuple of the block name, shape, dtype string and byte offset of the array.
+        :return: The `reduce` result of the array.
+        """
+        array = shared_array(*task)
+        try:
+            return self.reduce(array)
+        finally:
+            # The view must be gone before the block can be closed.
+            del array
+
     def run(self):
         """
         Runs the multiprocessing simulation for summing large arrays.
 
-        This method generates arrays, uses multiprocessing to sum them in parallel,
-        and then prints the results including performance metrics.
+        This method generates arrays, uses multiprocessing to sum them (or compute
+        the configured reductions) in parallel, and then prints the results
+        including performance metrics.
         """
         array_size = self.config.get('array_size', 1000000)
         num_processes = self.config.get('num_processes', 4)
         num_arrays = self.config.get('num_arrays', 4)
 
-        arrays = [np.random.random(array_size) for _ in range(num_arrays)]
+        if self.config.get('array_inputs', []):
+            self.run_files(self.collect_arrays(), num_processes)
+            return
+        if self.config.get('array_worker_generation', False):
+            self.run_generated(array_size, num_processes, num_arrays)
+            return
+        if self.config.get('array_shared_memory', False):
+            self.run_shared(array_size, num_processes, num_arrays)
+            return
+
+        if self.config.get('array_benchmark', False):
+            self.run_benchmark(array_size, num_processes, num_arrays)
+            return
+
+        dtype = self.config.get('array_dtype', 'float64')
+        generation_start = time()
+        arrays = [random_array(array_size, dtype) for _ in range(num_arrays)]
+        generation_time = time() - generation_start
 
         with multiprocessing.Pool(processes=num_processes) as pool:
             start_time = time()
-            results = pool.map(self.worker, arrays)
+            results = pool.map(self.reduce, arrays)
             end_time = time()
 
         print(
@@ -43,9 +284,186 @@ class MultiprocessingSimulation(Simulation):
         print(f"- Number of processes used: {num_processes}")
         print(f"- Array size per process: {array_size}")
         print(f"- Number of arrays: {num_arrays}")
-        print(f"- Total sum of arrays: {sum(results)}")
+        print(f"- Element type: {dtype}")
+        self.print_results(results)
+        print(f"- Generation time (in the parent): {generation_time:.4f} seconds")
+        print(f"- Time taken: {end_time - start_time:.4f} seconds{Color.RESET}")
+
+    def generate_and_reduce(self, task):
+        """
+        Worker function generating its own array from an independent random
+        stream and reducing it, so no array data is created in or sent from the
+        parent.
+
+        :param task: Tuple of the SeedSequence of the array and the array size.
+        :return: Tuple of the `reduce` result, generation seconds and reduction seconds.
+        """
+        seed_sequence, array_size = task
+        generation_start = perf_counter()
+        array = random_array(array_size, self.config.get('array_dtype', 'float64'),
+                             np.random.default_rng(seed_sequence))
+        reduction_start = perf_counter()
+        result = self.reduce(array)
+        return result, reduction_start - generation_start, perf_counter() - reduction_start
+
+    def run_generated(self, array_size, num_processes, num_arrays):
+        """
+        Runs the simulation with every array generated by the worker that reduces
+        it. The streams are spawned from one SeedSequence, array i always gets
+        child i, so the results only depend on 'array_seed' and not on which
+        process handles which array. Without a seed, the generated entropy is
+        printed so the run can be repeated.
+
+        :param array_size: Number of elements per array.
+        :param num_processes: Number of processes to use.
+        :param num_arrays: Number of arrays.
+        """
+        seed_sequence = np.random.SeedSequence(self.config.get('array_seed', None))
+        tasks = [(child, array_size) for child in seed_sequence.spawn(num_arrays)]
+
+        with multiprocessing.Pool(processes=num_processes) as pool:
+            start_time = time()
+            results = pool.map(self.generate_and_reduce, tasks)
+            end_time = time()
+
+        reduced = [result for result, _, _ in results]
+        generation_time = sum(generation for _, generation, _ in results)
+        reduction_time = sum(reduction for _, _, reduction in results)
+        print(
+            f"{Color.BLUE}Blueprint: This simulation demonstrates how multiprocessing can parallelize CPU-intensive tasks across multiple cores.{Color.RESET}")
+        print(f"{Color.GREEN}Multiprocessing Results (generated in workers):")
+        print(f"- Number of processes used: {num_processes}")
+        print(f"- Array size per process: {array_size}")
+        print(f"- Number of arrays: {num_arrays}")
+        print(f"- Element type: {self.config.get('array_dtype', 'float64')}")
+        print(f"- Seed: {seed_sequence.entropy}")
+        self.print_results(reduced)
+        print(f"- Generation time (summed over workers): {generation_time:.4f} seconds")
+        print(f"- Reduction time (summed over workers): {reduction_time:.4f} seconds")
         print(f"- Time taken: {end_time - start_time:.4f} seconds{Color.RESET}")
 
+    def run_shared(self, array_size, num_processes, num_arrays):
+        """
+        Runs the simulation with the arrays allocated in one shared-memory block.
+        Workers receive only the block name, shape, dtype and offset of their
+        array and read it in place. The same arrays are then summed again by
+        pickling them to the workers, and both timings are reported.
+
+        :param array_size: Number of elements per array.
+        :param num_processes: Number of processes to use.
+        :param num_arrays: Number of arrays.
+        """
+        dtype = np.dtype(self.config.get('array_dtype', 'float64'))
+        block = shared_memory.SharedMemory(create=True, size=max(1, num_arrays * array_size * dtype.itemsize))
+        try:
+            arrays = np.ndarray((num_arrays, array_size), dtype=dtype, buffer=block.buf)
+            for i in range(num_arrays):
+                arrays[i] = random_array(array_size, dtype)
+            tasks = [(block.name, (array_size,), dtype.str, i * arrays.strides[0]) for i in range(num_arrays)]
+
+            with multiprocessing.Pool(processes=num_processes) as pool:
+                start_time = time()
+                results = pool.map(self.shared_worker, tasks)
+                shared_time = time() - start_time
+
+                start_time = time()
+                pickled_results = pool.map(self.reduce, list(arrays))
+                pickled_time = time() - start_time
+            del arrays
+        finally:
+            block.close()
+            block.unlink()
+
+        print(
+            f"{Color.BLUE}Blueprint: This simulation demonstrates how multiprocessing can parallelize CPU-intensive tasks across multiple cores.{Color.RESET}")
+        print(f"{Color.GREEN}Multiprocessing Results (shared memory):")
+        print(f"- Number of processes used: {num_processes}")
+        print(f"- Array size per process: {array_size}")
+        print(f"- Number of arrays: {num_arrays}")
+        self.print_results(results)
+        shared, pickled = self.combine(results), self.combine(pickled_results)
+        matching = all(np.allclose(shared[name], pickled[name]) for name in shared)
+        print(f"- Results match the pickling path: {matching}")
+        print(f"- Element type: {dtype.name}")
+        print(f"- Data not pickled: {num_arrays * array_size * dtype.itemsize / 1e6:.1f} MB")
+        print(f"- Time taken (shared memory): {shared_time:.4f} seconds")
+        print(f"- Time taken (pickling): {pickled_time:.4f} seconds")
+        if shared_time > 0:
+            print(f"- Speedup: {pickled_time / shared_time:.2f}x")
+        print(Color.RESET, end='')
+
+    def benchmark_worker(self, task):
+        """
+        Worker function reducing an array in shared memory with a given tile size.
+
+        :param task: Tuple of the block name, shape, dtype string and byte offset
+                     of the array, the reduction names and the tile size in elements.
+        :return: Dictionary of partial reduction states.
+        """
+        name, shape, dtype, offset, names, block_elements = task
+        array = shared_array(name, shape, dtype, offset)
+        try:
+            return reduce_array(array, make_reductions(names, self.config.get('array_histogram_bins', 10),
+                                                       self.config.get('array_histogram_range', [0.0, 1.0])),
+                                block_elements)
+        finally:
+            del array
+
+    def run_benchmark(self, array_size, num_processes, num_arrays):
+        """
+        Measure how the element type and the tile size change the throughput and
+        the result of the fused reductions. For every dtype of
+        'array_benchmark_dtypes' the arrays are generated once into shared memory
+        and reduced with every tile size of 'array_benchmark_block_bytes' and
+        with whole arrays as one tile, after an untimed warm-up pass.
+
+        :param array_size: Number of elements per array.
+        :param num_processes: Number of processes to use.
+        :param num_arrays: Number of arrays.
+        """
+        names = self.config.get('array_reductions', []) or ['sum', 'mean', 'std', 'min', 'max']
+        reductions = make_reductions(names, self.config.get('array_histogram_bins', 10),
+                                     self.config.get('array_histogram_range', [0.0, 1.0]))
+        block_sizes = self.config.get('array_benchmark_block_bytes', [1 << 14, 1 << 18, 1 << 22]) + [None]
+        rows = []
+        for dtype in map(np.dtype, self.config.get('array_benchmark_dtypes', list(DTYPES))):
+            nbytes = num_arrays * array_size * dtype.itemsize
+            block = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+            try:
+                arrays = np.ndarray((num_arrays, array_size), dtype=dtype, buffer=block.buf)
+                for i in range(num_arrays):
+                    arrays[i] = random_array(array_size, dtype)
+                del arrays
+                # A pool per dtype, so the workers' attachments end with it.
+                with multiprocessing.Pool(processes=num_processes) as pool:
+                    for block_bytes in [block_sizes[0]] + block_sizes:
+                        block_elements = array_size if block_bytes is None else max(1, block_bytes // dtype.itemsize)
+                        tasks = [(block.name, (array_size,), dtype.str, i * array_size * dtype.itemsize,
+                                  names, block_elements) for i in range(num_arrays)]
+                        start_time = perf_counter()
+                        states = pool.map(self.benchmark_worker, tasks)
+                        elapsed = perf_counter() - start_time
+                        rows.append((dtype.name, block_bytes, nbytes / elapsed / 1e9 if elapsed else 0.0,
+                                     combine_states(reductions, states)[names[0]]))
+                    # The first pass only warmed up the workers and the pages.
+                    del rows[-len(block_sizes) - 1]
+            finally:
+                block.close()
+                block.unlink()
+
+        print(
+            f"{Color.BLUE}Blueprint: This simulation demonstrates how multiprocessing can parallelize CPU-intensive tasks across multiple cores.{Color.RESET}")
+        print(f"{Color.GREEN}Array Kernel Benchmark:")
+        print(f"- Number of processes used: {num_processes}")
+        print(f"- Arrays: {num_arrays} x {array_size} elements")
+        print(f"- Fused reductions: {', '.join(names)}")
+        print(f"  {'dtype':<8} {'tile':>10} {'GB/s':>8}  {names[0]}")
+        for dtype_name, block_bytes, throughput, result in rows:
+            tile = 'array' if block_bytes is None else f"{block_bytes // 1024} KiB"
+            value = result.tolist() if isinstance(result, np.ndarray) else result
+            print(f"  {dtype_name:<8} {tile:>10} {throughput:>8.2f}  {value}")
+        print(Color.RESET, end='')
+
     def show_code(self):
         """
         Displays the code of the MultiprocessingSimulation for educational purposes.
@@ -1,16 +1,214 @@
+import glob
+import mmap
 import multiprocessing
-from collections import Counter
-from time import time
+import queue
+import re
+import threading
+from collections import Counter, deque
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, time
 from color import Color
 from config.config import Config
+from examples.compressed_input import MemberBoundaryError, compression_of, iter_decompressed, member_ranges
 from examples.simulation import Simulation
+from examples.word_count_cache import WordCountCache
+from examples.word_matcher import WORD_PATTERN, WordMatcher
+from examples.word_sketch import VocabularySketch
 import os
 
+# Bytes that can't be part of a word: everything except ASCII word characters and
+# the bytes of multi-byte UTF-8 sequences.
+WORD_BOUNDARY = re.compile(rb'[^\w\x80-\xff]')
+# Translation table mapping every byte to its ASCII lowercase.
+ASCII_LOWER = bytes.maketrans(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ', b'abcdefghijklmnopqrstuvwxyz')
+
+
+def cut_context(words):
+    """
+    :param words: Words a cut must not split (see `WordMatcher.separated_words`).
+    :return: The number of bytes on each side of a cut that hold the longest of
+             the words whole, even in 4-byte UTF-8 characters.
+    """
+    return 4 * max(map(len, words), default=0)
+
+
+def splits_word(data, cut, words):
+    """
+    Check whether an occurrence of one of the words, in the lowercased text,
+    contains the character at `cut`, so cutting there would lose it.
+
+    :param data: Bytes-like object with UTF-8 text.
+    :param cut: Position of a non-word byte.
+    :param words: Words with a non-word character (see `WordMatcher.separated_words`).
+    :return: True if a word crosses the cut.
+    """
+    context = cut_context(words)
+    before = data[max(cut - context, 0):cut].decode('utf-8', errors='replace').lower()
+    after = data[cut:cut + context].decode('utf-8', errors='replace').lower()
+    return any(word in before[max(len(before) - len(word) + 1, 0):] + after[:len(word) - 1] for word in words)
+
+
+def find_cut(data, position, words=()):
+    """
+    Find the first non-word byte at or after `position` that no occurrence of
+    the words crosses.
+
+    :param data: Bytes-like object with UTF-8 text.
+    :param position: The position to start searching from.
+    :param words: Words a cut must not split (see `WordMatcher.separated_words`).
+    :return: Position of the byte, or None if there is none.
+    """
+    while True:
+        match = WORD_BOUNDARY.search(data, position)
+        if match is None:
+            return None
+        if not words or not splits_word(data, match.start(), words):
+            return match.start()
+        position = match.start() + 1
+
+
+def word_boundary(data, position, words=()):
+    """
+    Find the first position at or after `position` where data can be cut without
+    splitting a word or a UTF-8 character.
+
+    Pure words can't contain a non-word byte, but words such as "c++" or "a-b"
+    can, so cuts where one of `words` occurs across the byte are skipped.
+    Both sides of a cut find the same position, so every occurrence is
+    counted by exactly one of them.
+
+    :param data: Bytes-like object (e.g. a memory-mapped file).
+    :param position: The position to start searching from.
+    :param words: Words a cut must not split (see `WordMatcher.separated_words`).
+    :return: Position of the first non-word byte no word crosses, or the length of the data.
+    """
+    if position <= 0:
+        return 0
+    cut = find_cut(data, position, words)
+    return len(data) if cut is None else cut
+
+
+def cut_pieces(blocks, skip_start, read_size, words=()):
+    """
+    Cut a stream of decompressed UTF-8 blocks into lowercased text pieces of
+    about `read_size` bytes, cut only where `word_boundary` would cut.
+
+    The blocks of a member range are followed by None and then by the blocks of
+    the following members. As with the ends of a memory-mapped chunk, the range
+    starts at its first cut when `skip_start` is set (the partial word before it
+    is counted by the previous range) and ends at the first cut after its last
+    member, which can lie in the following members. With `words`, these cuts
+    are searched from `cut_context` bytes after the member start, so both ranges
+    check them on the same text, and a cut is only taken once the text after it
+    is read.
+
+    :param blocks: Iterable of decompressed blocks, with None after the range's own members.
+    :param skip_start: Whether the range starts after the beginning of the file.
+    :param read_size: The approximate number of bytes per piece.
+    :param words: Words a cut must not split (see `WordMatcher.separated_words`).
+    :return: Generator of lowercased text pieces.
+    """
+    context = cut_context(words)
+    blocks = iter(blocks)
+    buffer = bytearray()
+    position = 0
+    # Position of the end of the range's own members in the buffer, once read.
+    members_end = None
+    exhausted = False
+    while True:
+        goal = context if skip_start else position + read_size
+        if members_end is not None:
+            goal = min(goal, max(members_end + context, position))
+        cut = find_cut(buffer, goal, words)
+        if (cut is None or cut + context > len(buffer)) and not exhausted:
+            # Drop the text already yielded, but keep what the checks of the next cuts look at.
+            drop = max(position - context, 0)
+            del buffer[:drop]
+            position -= drop
+            if members_end is not None:
+                members_end -= drop
+            block = next(blocks, b'')
+            if block is None:
+                members_end = len(buffer)
+            elif block:
+                buffer += block
+            else:
+                exhausted = True
+            continue
+        if cut is None:
+            cut = len(buffer)
+        if skip_start:
+            skip_start = False
+        else:
+            if cut > position:
+                yield buffer[position:cut].decode('utf-8', errors='replace').lower()
+            if cut == len(buffer) or (members_end is not None and cut >= members_end + context):
+                return
+        position = cut
+
+
+def count_piece(matcher, data):
+    """
+    Count the words of a matcher in raw UTF-8 bytes, lowercasing them with a
+    byte translation table. Pure ASCII data is counted without decoding; other
+    data is decoded, since its lowercase can't be computed per byte.
+
+    :param matcher: The WordMatcher to count with.
+    :param data: Bytes-like object with UTF-8 text.
+    :return: Dictionary with words and their counts.
+    """
+    piece = data.translate(ASCII_LOWER)
+    if piece.isascii():
+        return matcher.count_bytes(piece)
+    return matcher.count(piece.decode('utf-8', errors='replace').lower())
+
+
+# Matcher built once per run by the parent and set in every worker by `init_matcher`.
+_matcher = None
+
+
+def init_matcher(matcher):
+    """
+    Pool initializer storing the run's word matcher in the worker process.
+
+    :param matcher: The WordMatcher built for the run.
+    """
+    global _matcher
+    _matcher = matcher
+
+
+def merge_vocabularies(pair):
+    """
+    Merge two partial vocabulary results, used as one step of the tree merge.
+
+    :param pair: Tuple of two (exact Counter or None, VocabularySketch or None) results.
+    :return: The merged (exact Counter or None, VocabularySketch or None) result.
+    """
+    (exact, sketch), (other_exact, other_sketch) = pair
+    if exact is not None:
+        exact.update(other_exact)
+    if sketch is not None:
+        sketch.merge(other_sketch)
+    return exact, sketch
+
 
 class WordCountSimulation(Simulation):
     def __init__(self):
         self.config = Config()
 
+    def get_matcher(self, words_to_count):
+        """
+        Return the matcher of the current run, or build one when called outside a run.
+
+        :param words_to_count: List of words to count.
+        :return: WordMatcher for the words and the configured 'word_match' mode.
+        """
+        mode = self.config.get('word_match', 'count')
+        if _matcher is not None and _matcher.words == list(words_to_count) and _matcher.mode == mode:
+            return _matcher
+        return WordMatcher(words_to_count, mode)
+
     def count_words(self, file_path, words_to_count):
         """
         Count specified words in a single file. If the file doesn't exist,
@@ -28,49 +226,621 @@ class WordCountSimulation(Simulation):
                 file.write("This is a default text for file creation. Use Python, multiprocessing, example.")
             with open(file_path, 'r') as file:
                 text = file.read().lower()
-        counts = {word: text.count(word) for word in words_to_count}
+        counts = self.get_matcher(words_to_count).count(text)
         return counts
 
+    def count_chunk(self, file_path, start, end, words_to_count):
+        """
+        Count specified words in a byte range of a memory-mapped file.
+
+        Both ends of the range are moved forward to the next non-word byte that
+        no occurrence of the words crosses (see `word_boundary`), so a word
+        straddling a chunk boundary is counted by exactly one chunk. The
+        range is decoded and counted in pieces of 'word_count_read_size' bytes,
+        so memory use doesn't grow with the size of the file.
+
+        :param file_path: Path to the file to be processed.
+        :param start: The start of the byte range.
+        :param end: The end of the byte range (exclusive).
+        :param words_to_count: List of words to count in the range.
+        :return: Dictionary with words and their counts.
+        """
+        matcher = self.get_matcher(words_to_count)
+        counts = Counter(dict.fromkeys(words_to_count, 0))
+        for text in self.read_pieces(file_path, start, end, matcher.separated_words):
+            counts.update(matcher.count(text))
+        return dict(counts)
+
+    def read_pieces(self, file_path, start, end, words=()):
+        """
+        Yield the lowercased text of a byte range of a memory-mapped file in pieces
+        of about 'word_count_read_size' bytes, cut only at non-word bytes
+        (see `count_chunk`).
+
+        :param file_path: Path to the file to be processed.
+        :param start: The start of the byte range.
+        :param end: The end of the byte range (exclusive).
+        :param words: Words a cut must not split (see `WordMatcher.separated_words`).
+        :return: Generator of lowercased text pieces.
+        """
+        read_size = self.config.get('word_count_read_size', 1 << 22)
+        with open(file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                position = word_boundary(data, start, words)
+                end = word_boundary(data, end, words)
+                while position < end:
+                    piece_end = word_boundary(data, min(position + read_size, end), words)
+                    yield data[position:piece_end].decode('utf-8', errors='replace').lower()
+                    position = piece_end
+
+    def count_bytes(self, file_path, start, end, words_to_count):
+        """
+        Count specified words in a byte range of a file without decoding it.
+
+        The range is cut into the same pieces as in `count_chunk`, which no word
+        crosses, and each piece is lowercased with a byte translation table into
+        a new piece, so memory use is bounded by the read size instead of holding
+        the decoded file and its lowercased copy. Pure ASCII pieces are counted on the bytes directly; pieces with
+        other UTF-8 characters, whose lowercase can't be computed per byte, fall
+        back to decoding, so the counts are always the same as from `count_words`.
+
+        :param file_path: Path to the file to be processed.
+        :param start: The start of the byte range.
+        :param end: The end of the byte range (exclusive).
+        :param words_to_count: List of words to count in the range.
+        :return: Dictionary with words and their counts.
+        """
+        matcher = self.get_matcher(words_to_count)
+        counts = Counter(dict.fromkeys(words_to_count, 0))
+        read_size = self.config.get('word_count_read_size', 1 << 22)
+        with open(file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return dict(counts)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                position = word_boundary(data, start, matcher.separated_words)
+                end = word_boundary(data, end, matcher.separated_words)
+                while position < end:
+                    piece_end = word_boundary(data, min(position + read_size, end), matcher.separated_words)
+                    counts.update(count_piece(matcher, data[position:piece_end]))
+                    position = piece_end
+        return dict(counts)
+
+    def read_compressed_pieces(self, file_path, start, end, words=()):
+        """
+        Yield the lowercased text of the members of a compressed file starting
+        within [start, end), decompressed as a stream (see `iter_decompressed`).
+
+        Member boundaries are not word boundaries, so the text is cut like the
+        chunks of a memory-mapped file (see `cut_pieces`): a range not starting
+        at 0 drops its leading partial word, and the last word of a range is
+        completed by decompressing the start of the following members.
+
+        :param file_path: Path to the compressed file.
+        :param start: Compressed offset of the first member.
+        :param end: Compressed offset the last member ends at.
+        :param words: Words a cut must not split (see `WordMatcher.separated_words`).
+        :return: Generator of lowercased text pieces.
+        """
+        read_size = self.config.get('word_count_read_size', 1 << 22)
+        blocks = iter_decompressed(file_path, start, end, read_size)
+        if end < os.path.getsize(file_path):
+            blocks = chain(blocks, [None], iter_decompressed(file_path, end, None, read_size))
+        return cut_pieces(blocks, start > 0, read_size, words)
+
+    def count_compressed(self, file_path, start, end, words_to_count):
+        """
+        Count specified words in the members of a compressed file starting within
+        [start, end), without writing or holding the decompressed file.
+
+        :param file_path: Path to the compressed file.
+        :param start: Compressed offset of the first member.
+        :param end: Compressed offset the last member ends at.
+        :param words_to_count: List of words to count.
+        :return: Dictionary with words and their counts.
+        """
+        matcher = self.get_matcher(words_to_count)
+        counts = Counter(dict.fromkeys(words_to_count, 0))
+        for text in self.read_compressed_pieces(file_path, start, end, matcher.separated_words):
+            counts.update(matcher.count(text))
+        return dict(counts)
+
+    def count_vocabulary(self, batch):
+        """
+        Count every word in a batch of files or file ranges.
+
+        Each text piece is first counted into a small local Counter (the combiner
+        step), which is then added to the exact vocabulary, the bounded-memory
+        VocabularySketch, or both when 'word_count_sketch_verify' is enabled.
+
+        :param batch: List of (file_path, start, end) tuples.
+        :return: Tuple of the worker process id, busy seconds, bytes processed and
+                 the (exact Counter or None, VocabularySketch or None) result.
+        """
+        busy_start = perf_counter()
+        use_sketch = self.config.get('word_count_sketch', False)
+        exact = Counter() if not use_sketch or self.config.get('word_count_sketch_verify', False) else None
+        sketch = None
+        if use_sketch:
+            sketch = VocabularySketch(self.config.get('word_count_sketch_width', 1 << 16),
+                                      self.config.get('word_count_sketch_depth', 4),
+                                      self.config.get('word_count_heavy_hitters', 1000))
+        for file_path, start, end in batch:
+            if compression_of(file_path):
+                texts = self.read_compressed_pieces(file_path, start, end)
+            elif self.config.get('word_count_mmap', False):
+                texts = self.read_pieces(file_path, start, end)
+            else:
+                with open(file_path, 'r') as file:
+                    texts = [file.read().lower()]
+            for text in texts:
+                local_counts = Counter(WORD_PATTERN.findall(text))
+                if exact is not None:
+                    exact.update(local_counts)
+                if sketch is not None:
+                    sketch.update(local_counts)
+        processed = sum(end - start for _, start, end in batch)
+        return os.getpid(), perf_counter() - busy_start, processed, (exact, sketch)
+
+    def tree_merge(self, pool, results):
+        """
+        Merge partial vocabulary results pairwise in the pool, halving their number
+        every round, instead of folding all of them into one in the parent.
+
+        Every round sends the results to the workers and back, so a result is
+        pickled twice per round; `group_batches` keeps their number down to a
+        few per process, which keeps the rounds few and the data moved small
+        compared with sending one result per batch.
+
+        :param pool: The multiprocessing pool to merge in.
+        :param results: List of (exact Counter or None, VocabularySketch or None) results.
+        :return: The merged result.
+        """
+        while len(results) > 1:
+            merged = pool.map(merge_vocabularies, list(zip(results[0::2], results[1::2])))
+            if len(results) % 2:
+                merged.append(results[-1])
+            results = merged
+        return results[0]
+
+    def group_batches(self, batches, groups):
+        """
+        Join batches into at most `groups` tasks, dealing them out in turn so the
+        largest batches are spread evenly. A worker folds all batches of a task
+        into one partial result, so only one result per task is sent back and
+        merged instead of one per batch.
+
+        :param batches: List of batches, largest first (see `schedule`).
+        :param groups: The largest number of tasks.
+        :return: List of batches, each a list of (file_path, start, end) tuples.
+        """
+        return [sum(batches[index::groups], []) for index in range(min(groups, len(batches)))]
+
+    def split_files(self, file_paths, chunk_size):
+        """
+        Split files into byte ranges of at most `chunk_size` bytes, so one large
+        file is spread across several processes.
+
+        :param file_paths: Paths to the files to be processed.
+        :param chunk_size: The maximum number of bytes per range.
+        :return: List of (file_path, start, end) tuples.
+        """
+        chunks = []
+        for path in file_paths:
+            size = os.path.getsize(path)
+            chunks.extend((path, start, min(start + chunk_size, size))
+                          for start in range(0, max(size, 1), chunk_size))
+        return chunks
+
+    def count_loaded(self, data, words_to_count):
+        """
+        Count specified words in file contents that were already read.
+
+        :param data: The contents of the file as bytes.
+        :param words_to_count: List of words to count.
+        :return: Dictionary with words and their counts.
+        """
+        matcher = self.get_matcher(words_to_count)
+        if self.config.get('word_count_bytes', False):
+            return count_piece(matcher, data)
+        return matcher.count(data.decode('utf-8', errors='replace').lower())
+
+    def load_batch(self, batch, words=()):
+        """
+        Read the contents of the byte ranges of plain files in a batch, with both
+        ends moved to a word boundary like in `count_chunk`. Compressed files are
+        left to the worker, which decompresses them as a stream.
+
+        :param batch: List of (file_path, start, end) tuples.
+        :param words: Words a cut must not split (see `WordMatcher.separated_words`).
+        :return: List of (file_path, start, end, data) tuples, or (file_path,
+                 start, end) tuples for compressed files.
+        """
+        loaded = []
+        for file_path, start, end in batch:
+            if compression_of(file_path):
+                loaded.append((file_path, start, end))
+                continue
+            with open(file_path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    loaded.append((file_path, start, end, b''))
+                    continue
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    loaded.append((file_path, start, end,
+                                   data[word_boundary(data, start, words):word_boundary(data, end, words)]))
+        return loaded
+
+    def prefetch_batches(self, pool, batches, words_to_count, stage_times):
+        """
+        Count batches in the pool while a few reader threads read the following
+        ones ahead, so reading from disk overlaps with counting.
+
+        Read batches wait in a queue of at most 'word_count_prefetch_depth'
+        batches, and at most twice the number of processes are counted at a
+        time. Large files are split into ranges of 'word_count_chunk_size'
+        bytes, so a batch holds at most that or 'word_count_batch_bytes' bytes
+        and memory stays bounded. `stage_times` is filled with the seconds
+        the readers spent reading ('read') and waiting for room in the queue
+        because counting was behind ('reader_wait'), and the seconds counting
+        waited for a read batch ('counter_wait').
+
+        :param pool: The multiprocessing pool to count in.
+        :param batches: List of batches, each a list of (file_path, start, end) tuples.
+        :param words_to_count: List of words to count.
+        :param stage_times: Dictionary receiving the stage times.
+        :return: Generator of `count_batch` results.
+        """
+        loaded_batches = queue.Queue(maxsize=self.config.get('word_count_prefetch_depth', 8))
+        words = self.get_matcher(words_to_count).separated_words
+        max_in_flight = 2 * self.config.get('num_processes', 4)
+        times_lock = threading.Lock()
+        stage_times.update(read=0.0, reader_wait=0.0, counter_wait=0.0)
+
+        def load(batch):
+            read_start = perf_counter()
+            try:
+                loaded = self.load_batch(batch, words)
+            except OSError as error:
+                # Handed over instead of the batch, so the counting side doesn't wait forever.
+                loaded = error
+            put_start = perf_counter()
+            loaded_batches.put(loaded)
+            with times_lock:
+                stage_times['read'] += put_start - read_start
+                stage_times['reader_wait'] += perf_counter() - put_start
+
+        with ThreadPoolExecutor(max_workers=self.config.get('word_count_prefetch_threads', 4)) as readers:
+            futures = [readers.submit(load, batch) for batch in batches]
+            try:
+                pending = deque()
+                for _ in batches:
+                    get_start = perf_counter()
+                    loaded = loaded_batches.get()
+                    stage_times['counter_wait'] += perf_counter() - get_start
+                    if isinstance(loaded, OSError):
+                        raise loaded
+                    pending.append(pool.apply_async(self.count_batch, ((loaded, words_to_count),)))
+                    if len(pending) >= max_in_flight:
+                        yield pending.popleft().get()
+                while pending:
+                    yield pending.popleft().get()
+            finally:
+                # When stopped early, unblock the readers so the executor can shut down.
+                for future in futures:
+                    future.cancel()
+                while not all(future.done() for future in futures):
+                    try:
+                        loaded_batches.get(timeout=0.01)
+                    except queue.Empty:
+                        pass
+
+    def count_batch(self, task):
+        """
+        Count specified words in a batch of files or file ranges and measure how
+        long the process was busy.
+
+        :param task: Tuple of the batch, a list of (file_path, start, end) tuples,
+                     and the list of words to count. Items prefetched by
+                     `prefetch_batches` carry the file contents as a fourth element.
+        :return: Tuple of the worker process id, busy seconds, bytes processed
+                 and a dictionary mapping each file path to its word counts, or
+                 to None if the members of a compressed file didn't line up with
+                 its ranges (see `member_ranges`).
+        """
+        batch, words_to_count = task
+        busy_start = perf_counter()
+        use_mmap = self.config.get('word_count_mmap', False)
+        use_bytes = self.config.get('word_count_bytes', False)
+        file_counts = {}
+        for file_path, start, end, *loaded in batch:
+            if loaded:
+                counts = self.count_loaded(loaded[0], words_to_count)
+            elif compression_of(file_path):
+                try:
+                    counts = self.count_compressed(file_path, start, end, words_to_count)
+                except MemberBoundaryError:
+                    file_counts[file_path] = None
+                    continue
+            elif use_bytes:
+                counts = self.count_bytes(file_path, start, end, words_to_count)
+            elif use_mmap:
+                counts = self.count_chunk(file_path, start, end, words_to_count)
+            else:
+                counts = self.count_words(file_path, words_to_count)
+            if file_counts.get(file_path, True) is not None:
+                file_counts.setdefault(file_path, Counter(dict.fromkeys(words_to_count, 0))).update(counts)
+        processed = sum(item[2] - item[1] for item in batch)
+        return os.getpid(), perf_counter() - busy_start, processed, \
+            {file_path: None if counts is None else dict(counts) for file_path, counts in file_counts.items()}
+
+    def collect_files(self):
+        """
+        Collect the files to process. Entries of 'word_count_inputs' can be files,
+        directories (searched recursively) or glob patterns. Without inputs, the
+        files named {file_prefix}_{i}.txt are used and created when missing.
+
+        :return: List of file paths without duplicates.
+        """
+        inputs = self.config.get('word_count_inputs', [])
+        if isinstance(inputs, str):
+            # Set from the menu, e.g. "config word_count_inputs corpus/*.txt"
+            inputs = [inputs]
+        if not inputs:
+            num_files = self.config.get('num_files', 5)
+            file_prefix = self.config.get('file_prefix', "text")
+            file_paths = []
+            for i in range(num_files):
+                file_name = f"{file_prefix}_{i}.txt"
+                if not os.path.exists(file_name):
+                    print(f"{Color.YELLOW}File {file_name} not found. Creating default file.{Color.RESET}")
+                    with open(file_name, 'w') as file:
+                        file.write("This is a default text for file creation. Use Python, multiprocessing, example.")
+                file_paths.append(file_name)
+            return file_paths
+
+        file_paths = []
+        for entry in inputs:
+            if os.path.isdir(entry):
+                for directory, _, file_names in os.walk(entry):
+                    file_paths.extend(os.path.join(directory, name) for name in sorted(file_names))
+            elif glob.has_magic(entry):
+                file_paths.extend(path for path in sorted(glob.glob(entry, recursive=True))
+                                  if os.path.isfile(path))
+            elif os.path.isfile(entry):
+                file_paths.append(entry)
+            else:
+                print(f"{Color.YELLOW}Input {entry} not found. Skipping.{Color.RESET}")
+        return list(dict.fromkeys(file_paths))
+
+    def compare_paths(self, file_paths, words_to_count):
+        """
+        Count the files once with the text path (`count_words`) and once with the
+        bytes path (`count_bytes`) in this process, check that the counts agree
+        and print the throughput of both.
+
+        :param file_paths: Paths to the files to be processed.
+        :param words_to_count: List of words to count.
+        :return: Dictionary mapping 'text' and 'bytes' to their throughput in MB/s.
+        """
+        # Both paths read plain files only.
+        file_paths = [path for path in file_paths if not compression_of(path)]
+        total_bytes = sum(os.path.getsize(path) for path in file_paths)
+        paths = {
+            'text': lambda path: self.count_words(path, words_to_count),
+            'bytes': lambda path: self.count_bytes(path, 0, os.path.getsize(path), words_to_count),
+        }
+        throughputs = {}
+        results = {}
+        for name, count in paths.items():
+            path_start = perf_counter()
+            results[name] = [count(path) for path in file_paths]
+            elapsed = perf_counter() - path_start
+            throughputs[name] = total_bytes / elapsed / 1e6 if elapsed else 0.0
+        print(f"{Color.GREEN}Counting path comparison ({total_bytes} bytes, 1 process):")
+        for name, throughput in throughputs.items():
+            print(f"  - {name}: {throughput:.2f} MB/s")
+        if results['text'] == results['bytes']:
+            print(f"  - Counts are identical.{Color.RESET}")
+        else:
+            print(f"{Color.RED}  - Counts differ between the text and bytes paths.{Color.RESET}")
+        return throughputs
+
+    def schedule(self, items, batch_bytes):
+        """
+        Order the work largest first, so the biggest files don't end up last on a
+        single process, and pack small items into batches of about `batch_bytes`,
+        so the IPC overhead is paid per batch rather than per file.
+
+        :param items: List of (file_path, start, end) tuples.
+        :param batch_bytes: The size from which an item gets a task of its own.
+        :return: List of batches, each a list of (file_path, start, end) tuples.
+        """
+        batches = []
+        current, current_size = [], 0
+        for item in sorted(items, key=lambda item: item[2] - item[1], reverse=True):
+            size = item[2] - item[1]
+            if size >= batch_bytes:
+                batches.append([item])
+                continue
+            if current and current_size + size > batch_bytes:
+                batches.append(current)
+                current, current_size = [], 0
+            current.append(item)
+            current_size += size
+        if current:
+            batches.append(current)
+        return batches
+
     def run(self):
         """
         Runs the word count simulation using multiprocessing to handle multiple files.
 
-        This method checks for file existence, creates missing files, processes
-        them in parallel, and prints the results.
+        This method collects the files, schedules them largest first in batches,
+        processes them in parallel, and prints the results.
         """
-        num_files = self.config.get('num_files', 5)
         num_processes = self.config.get('num_processes', 4)
         words_to_count = self.config.get('words_to_count', ["python", "multiprocessing", "example"])
-        file_prefix = self.config.get('file_prefix', "text")
+        count_mode = self.config.get('word_count_mode', 'words')
 
-        file_paths = []
-        for i in range(num_files):
-            file_name = f"{file_prefix}_{i}.txt"
-            if not os.path.exists(file_name):
-                print(f"{Color.YELLOW}File {file_name} not found. Creating default file.{Color.RESET}")
-                with open(file_name, 'w') as file:
-                    file.write("This is a default text for file creation. Use Python, multiprocessing, example.")
-            file_paths.append(file_name)
+        file_paths = self.collect_files()
+        # The matcher is built once per run and handed to every worker process.
+        matcher = WordMatcher(words_to_count, self.config.get('word_match', 'count'))
 
         start_time = time()
-        with multiprocessing.Pool(processes=num_processes) as pool:
-            results = pool.starmap(self.count_words, [(path, words_to_count) for path in file_paths])
+        total_counts = Counter(dict.fromkeys(words_to_count, 0))
+        worker_stats = {}
 
-        end_time = time()
+        # Unchanged files are answered from the cache and only the rest is counted.
+        cache = None
+        identities = {}
+        pending_paths = file_paths
+        if self.config.get('word_count_cache', False) and count_mode == 'words':
+            cache = WordCountCache(self.config.get('word_count_cache_path', 'word_count_cache.json'),
+                                   self.config.get('word_count_cache_size', 10000),
+                                   self.config.get('word_count_cache_hash', False))
+            pending_paths = []
+            for path in file_paths:
+                identities[path] = cache.identity(path)
+                counts = cache.get(path, words_to_count, matcher.mode, identities[path])
+                if counts is None:
+                    pending_paths.append(path)
+                else:
+                    total_counts.update(counts)
+
+        use_mmap = self.config.get('word_count_mmap', False)
+        prefetch = self.config.get('word_count_prefetch', False) and count_mode == 'words'
+        chunk_size = self.config.get('word_count_chunk_size', 1 << 24)
+        items = []
+        for path in pending_paths:
+            if compression_of(path):
+                # Vocabulary results can't drop a misaligned file, so those files are not split.
+                items.extend(member_ranges(path, chunk_size if count_mode == 'words' else float('inf')))
+            elif use_mmap or prefetch:
+                # Prefetched batches are held in memory, so large files are read in chunks too.
+                items.extend(self.split_files([path], chunk_size))
+            else:
+                items.append((path, 0, os.path.getsize(path)))
+        batches = self.schedule(items, self.config.get('word_count_batch_bytes', 1 << 20))
+        if count_mode == 'vocabulary':
+            batches = self.group_batches(batches, 2 * num_processes)
+
+        file_counts = {}
+        vocabulary = (Counter(), None)
+        with multiprocessing.Pool(processes=num_processes, initializer=init_matcher,
+                                  initargs=(matcher,)) as pool:
+            stage_times = {}
+            if count_mode == 'vocabulary':
+                tasks = pool.imap_unordered(self.count_vocabulary, batches)
+            elif prefetch:
+                tasks = self.prefetch_batches(pool, batches, words_to_count, stage_times)
+            else:
+                tasks = pool.imap_unordered(self.count_batch, [(batch, words_to_count) for batch in batches])
+            partial_vocabularies = []
+            misaligned_paths = set()
+            for pid, busy, processed, result in tasks:
+                if count_mode == 'vocabulary':
+                    partial_vocabularies.append(result)
+                else:
+                    for path, counts in result.items():
+                        if counts is None:
+                            misaligned_paths.add(path)
+                            continue
+                        file_counts.setdefault(path, Counter()).update(counts)
+                        total_counts.update(counts)
+                busy_time, total_bytes = worker_stats.get(pid, (0.0, 0))
+                worker_stats[pid] = (busy_time + busy, total_bytes + processed)
+            # Compressed files whose ranges didn't line up with their members are counted again as one stream.
+            misaligned_paths = sorted(misaligned_paths)
+            for path in misaligned_paths:
+                print(f"{Color.YELLOW}Members of {path} don't line up with its ranges. Counting it as a single stream.{Color.RESET}")
+                total_counts.subtract(file_counts.pop(path, Counter()))
+            if misaligned_paths:
+                recounted = pool.starmap(self.count_compressed, [(path, 0, os.path.getsize(path), words_to_count)
+                                                                 for path in misaligned_paths])
+                for path, counts in zip(misaligned_paths, recounted):
+                    file_counts[path] = Counter(counts)
+                    total_counts.update(counts)
+            merge_start = perf_counter()
+            if partial_vocabularies:
+                vocabulary = self.tree_merge(pool, partial_vocabularies)
+            merge_time = perf_counter() - merge_start
+
+        if cache is not None:
+            for path, counts in file_counts.items():
+                cache.put(path, words_to_count, matcher.mode, identities[path], dict(counts))
+            cache.save()
 
-        total_counts = Counter()
-        for counts in results:
-            total_counts.update(counts)
+        end_time = time()
 
         print(
             f"{Color.BLUE}Blueprint: This simulation demonstrates how multiprocessing can handle both I/O and CPU-bound tasks by counting words across multiple files.{Color.RESET}")
         print(f"{Color.GREEN}Word Count Results:")
         print(f"- Number of processes used: {num_processes}")
-        print(f"- Number of files processed: {num_files}")
-        print(f"- Words counted: {', '.join(words_to_count)}")
+        print(f"- Number of files processed: {len(file_paths)}")
+        if use_mmap or prefetch:
+            print(f"- Number of memory-mapped chunks: {len(items)}")
+        compressed_ranges = sum(1 for path, _, _ in items if compression_of(path))
+        if compressed_ranges:
+            print(f"- Number of compressed member ranges: {compressed_ranges}")
+        print(f"- Number of tasks: {len(batches)}")
+        if prefetch:
+            print(f"- Prefetch: {self.config.get('word_count_prefetch_threads', 4)} reader threads, "
+                  f"queue depth {self.config.get('word_count_prefetch_depth', 8)}")
+            print(f"  - Reading: {stage_times['read']:.4f} seconds, "
+                  f"readers waited {stage_times['reader_wait']:.4f} seconds for counting")
+            print(f"  - Counting waited {stage_times['counter_wait']:.4f} seconds for reading")
+        if cache is not None:
+            print(f"- Cache: {cache.hits} hits, {cache.misses} misses, {cache.evictions} evictions")
+        if count_mode == 'words':
+            print(f"- Words counted: {', '.join(words_to_count)}")
+            print(f"- Match mode: {matcher.mode}")
+        if count_mode == 'words':
+            print(f"- Counting path: {'bytes' if self.config.get('word_count_bytes', False) else 'text'}")
+        total_processed = sum(total_bytes for _, total_bytes in worker_stats.values())
+        if end_time > start_time:
+            print(f"- Throughput: {total_processed / (end_time - start_time) / 1e6:.2f} MB/s")
         print(f"- Time taken: {end_time - start_time:.4f} seconds{Color.RESET}")
+        for worker_number, (busy_time, total_bytes) in enumerate(worker_stats.values()):
+            throughput = total_bytes / busy_time / 1e6 if busy_time else 0.0
+            print(f"  - Worker {worker_number}: {total_bytes} bytes in {busy_time:.4f} seconds ({throughput:.2f} MB/s)")
+        if count_mode == 'vocabulary':
+            print(f"{Color.GREEN}- Partial results merged: {len(partial_vocabularies)} "
+                  f"in {merge_time:.4f} seconds{Color.RESET}")
+            self.print_vocabulary(*vocabulary)
+            return
         for word, count in total_counts.items():
             print(f"  - {word}: {count}")
+        if self.config.get('word_count_compare_paths', False):
+            self.compare_paths(file_paths, words_to_count)
+
+    def print_vocabulary(self, exact, sketch):
+        """
+        Print the top-K words of the vocabulary and, when both the exact counts
+        and the sketch are available, how accurate the sketch was.
+
+        :param exact: Counter with the exact count of every word, or None.
+        :param sketch: VocabularySketch with approximate counts, or None.
+        """
+        top_k = self.config.get('word_count_top_k', 10)
+        if sketch is not None:
+            top_words = sketch.top_k(top_k)
+            print(f"{Color.GREEN}- Approximate top {top_k} words (sketch memory: {sketch.nbytes} bytes):")
+        else:
+            top_words = exact.most_common(top_k)
+            print(f"{Color.GREEN}- Distinct words: {len(exact)}")
+            print(f"- Top {top_k} words:")
+        for word, count in top_words:
+            print(f"  - {word}: {count}")
+        if sketch is not None and exact is not None:
+            exact_top = {word for word, _ in exact.most_common(top_k)}
+            found = sum(1 for word, _ in top_words if word in exact_top)
+            errors = [(count - exact[word]) / exact[word] for word, count in top_words if exact[word]]
+            print(f"- Sketch accuracy against exact counts ({len(exact)} distinct words):")
+            print(f"  - Top {top_k} words found: {found} of {len(exact_top)}")
+            print(f"  - Mean relative overestimate: {100 * sum(errors) / max(len(errors), 1):.2f}%")
+            print(f"  - Max overestimate: {max((count - exact[word] for word, count in top_words), default=0)}")
+        print(Color.RESET, end='')
 
     def show_code(self):
         """
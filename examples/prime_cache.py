@@ -0,0 +1,156 @@
+import os
+import struct
+
+import numpy as np
+
+from color import Color
+
+# Magic, format version, reserved, the number the bitmap starts at and the covered
+# end (exclusive), both multiples of 16.
+HEADER = struct.Struct('<8sIIQQ')
+MAGIC = b'PRIMEBMP'
+VERSION = 2
+# Amount of bitmap bytes processed at a time, so queries never load the whole cache.
+BLOCK_SIZE = 1 << 20
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class PrimeBitmapCache:
+    """
+    Persistent, memory-mapped odd-only prime bitmap stored on disk.
+
+    Bit j of the bitmap stands for the number base + 2 * j + 1 (the layout of
+    `primes_to_bitmap`), so every byte covers 16 numbers. The header records
+    the base, which an empty cache can move to the first range asked for (see
+    `start_at`), and how far the bitmap is valid. New data is written before the
+    header is updated, so an interrupted run leaves the previous coverage
+    intact and the cache can be reused by later sessions.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.base = 0
+        self.covered_end = 0
+        if os.path.exists(path):
+            self._read_header()
+        else:
+            self._write_header(0, 0)
+
+    def _read_header(self):
+        """
+        Read the coverage from the header, starting over if the file is not a valid cache.
+        """
+        with open(self.path, 'rb') as f:
+            header = f.read(HEADER.size)
+            data_size = os.fstat(f.fileno()).st_size - HEADER.size
+        if len(header) == HEADER.size:
+            magic, version, _, base, covered_end = HEADER.unpack(header)
+            if magic == MAGIC and version == VERSION and base % 16 == 0 and covered_end % 16 == 0 \
+                    and base <= covered_end and (covered_end - base) // 16 <= data_size:
+                self.base = base
+                self.covered_end = covered_end
+                return
+        print(f"{Color.YELLOW}Prime cache {self.path} is not valid. Starting a new cache.{Color.RESET}")
+        self._write_header(0, 0)
+
+    def _write_header(self, base, covered_end):
+        """
+        Write the header, creating the cache file if needed.
+
+        :param base: The number the bitmap starts at.
+        :param covered_end: The number the cache is valid up to (exclusive).
+        """
+        mode = 'r+b' if os.path.exists(self.path) else 'wb'
+        with open(self.path, mode) as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, base, covered_end))
+            f.flush()
+            os.fsync(f.fileno())
+        self.base = base
+        self.covered_end = covered_end
+
+    def start_at(self, base):
+        """
+        Let an empty cache begin at `base` instead of 0, so a first range far
+        from 0 doesn't have to be sieved from 0.
+
+        :param base: Multiple of 16 the bitmap starts at.
+        """
+        if self.covered_end != self.base:
+            raise ValueError("Only an empty prime cache can be moved to another base.")
+        self._write_header(base, base)
+
+    def extend(self, bitmaps):
+        """
+        Append bitmaps continuing right after the covered end.
+
+        :param bitmaps: Consecutive odd-only bitmaps, each covering a multiple of 16 numbers.
+        """
+        covered_end = self.covered_end
+        with open(self.path, 'r+b') as f:
+            f.seek(HEADER.size + (covered_end - self.base) // 16)
+            for bitmap in bitmaps:
+                f.write(bitmap.tobytes())
+                covered_end += len(bitmap) * 16
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        self._write_header(self.base, covered_end)
+
+    def _blocks(self, start, end):
+        """
+        Yield the bitmap in blocks covering [start, end), with the bits of numbers
+        outside the range cleared.
+
+        :param start: The start of the range (inclusive), at least the base.
+        :param end: The end of the range (exclusive), at most the covered end.
+        :return: Generator of (block, base) tuples, base being the number the block starts at.
+        """
+        if end <= start:
+            return
+        if start < self.base or end > self.covered_end:
+            raise ValueError(f"Range {start} to {end} is outside the cached {self.base} to {self.covered_end}.")
+        first_byte, last_byte = (start - self.base) // 16, (end - self.base + 15) // 16
+        bitmap = np.memmap(self.path, dtype=np.uint8, mode='r', offset=HEADER.size,
+                           shape=((self.covered_end - self.base) // 16,))
+        try:
+            for lo in range(first_byte, last_byte, BLOCK_SIZE):
+                hi = min(lo + BLOCK_SIZE, last_byte)
+                block = np.array(bitmap[lo:hi])
+                if lo == first_byte:
+                    block[0] &= 0xFF << (start - self.base - 16 * first_byte) // 2 & 0xFF
+                if hi == last_byte:
+                    block[-1] &= (1 << (end - self.base - 16 * (last_byte - 1)) // 2) - 1
+                yield block, self.base + 16 * lo
+        finally:
+            del bitmap
+
+    def count(self, start, end):
+        """
+        Count the primes within [start, end) using only the cache.
+
+        :param start: The start of the range (inclusive), at least the base.
+        :param end: The end of the range (exclusive), at most the covered end.
+        :return: Number of primes within the range.
+        """
+        total = 1 if start <= 2 < end else 0
+        for block, _ in self._blocks(start, end):
+            total += int(POPCOUNT[block].sum(dtype=np.int64))
+        return total
+
+    def primes(self, start, end, limit):
+        """
+        Return the first primes within [start, end) using only the cache.
+
+        :param start: The start of the range (inclusive), at least the base.
+        :param end: The end of the range (exclusive), at most the covered end.
+        :param limit: The maximum number of primes to return.
+        :return: List of at most `limit` primes.
+        """
+        found = [2] if start <= 2 < end else []
+        for block, base in self._blocks(start, end):
+            for offset in range(0, len(block), 4096):
+                if len(found) >= limit:
+                    return found[:limit]
+                bits = np.flatnonzero(np.unpackbits(block[offset:offset + 4096], bitorder='little'))
+                found.extend(int(base + 16 * offset + 2 * bit + 1) for bit in bits[:limit - len(found)])
+        return found[:limit]
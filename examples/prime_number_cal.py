@@ -1,7 +1,15 @@
 import multiprocessing
-from time import time
+import os
+from collections import deque
+from math import isqrt
+from multiprocessing import shared_memory
+from time import perf_counter, time
+
+import numpy as np
+
 from color import Color
 from config.config import Config
+from examples.prime_cache import PrimeBitmapCache
 from examples.simulation import Simulation
 
 
@@ -20,20 +28,446 @@ def is_prime(n):
     return True
 
 
+# Per-process worker state, set once per pool process by `init_worker`.
+_base_primes = None
+_shared_bitmap = None
+_bitmap_base = 0
+
+
+def simple_sieve(limit):
+    """
+    Find all primes up to and including `limit` with a plain Sieve of Eratosthenes.
+
+    :param limit: The largest number to include in the sieve.
+    :return: NumPy array of the primes <= limit.
+    """
+    if limit < 2:
+        return np.empty(0, dtype=np.int64)
+    flags = np.ones(limit + 1, dtype=bool)
+    flags[:2] = False
+    for p in range(2, isqrt(limit) + 1):
+        if flags[p]:
+            flags[p * p::p] = False
+    return np.flatnonzero(flags).astype(np.int64)
+
+
+def init_worker(base_primes, bitmap_name=None, bitmap_base=0):
+    """
+    Pool initializer storing the base primes in the worker process and, in
+    shared bitmap mode, attaching to the shared-memory block workers write into.
+
+    :param base_primes: NumPy array of all primes up to sqrt of the range end.
+    :param bitmap_name: Name of the shared-memory block holding the run bitmap.
+    :param bitmap_base: The number (multiple of 16) the shared bitmap starts at.
+    """
+    global _base_primes, _shared_bitmap, _bitmap_base
+    _base_primes = base_primes
+    _shared_bitmap = shared_memory.SharedMemory(name=bitmap_name) if bitmap_name else None
+    _bitmap_base = bitmap_base
+
+
+def primes_to_bitmap(primes, lo, hi):
+    """
+    Pack the odd primes of [lo, hi) into an odd-only bitmap.
+
+    Bit j of the bitmap stands for the number base + 2 * j + 1, where base is
+    lo rounded down to a multiple of 16, so every byte covers 16 numbers.
+
+    :param primes: NumPy array of primes within [lo, hi).
+    :param lo: The start of the range (inclusive).
+    :param hi: The end of the range (exclusive).
+    :return: NumPy uint8 array with the packed bitmap.
+    """
+    base = lo - lo % 16
+    bits = np.zeros(max(0, (hi - base + 15) // 16) * 8, dtype=np.uint8)
+    odd = primes[primes % 2 == 1]
+    bits[(odd - base) // 2] = 1
+    return np.packbits(bits, bitorder='little')
+
+
+def bitmap_to_primes(bitmap, base):
+    """
+    Unpack an odd-only bitmap created by `primes_to_bitmap`.
+
+    :param bitmap: NumPy uint8 array with the packed bitmap.
+    :param base: The number (multiple of 16) the bitmap starts at.
+    :return: NumPy array of the primes marked in the bitmap.
+    """
+    return base + 2 * np.flatnonzero(np.unpackbits(bitmap, bitorder='little')).astype(np.int64) + 1
+
+
+def sieve_segment(lo, hi, base_primes):
+    """
+    Sieve a single segment [lo, hi) using only odd numbers.
+
+    :param lo: The start of the segment (inclusive).
+    :param hi: The end of the segment (exclusive).
+    :param base_primes: Sorted NumPy array of all primes up to sqrt(hi - 1).
+    :return: NumPy array of the primes found within the segment.
+    """
+    first = lo | 1
+    size = max(0, (hi - first + 1) // 2)
+    flags = np.ones(size, dtype=bool)
+    for p in base_primes:
+        p = int(p)
+        if p == 2:
+            continue
+        if p * p >= hi:
+            break
+        multiple = max(p * p, (first + p - 1) // p * p)
+        if multiple % 2 == 0:
+            multiple += p
+        flags[(multiple - first) // 2::p] = False
+    if first == 1 and size:
+        flags[0] = False
+    primes = first + 2 * np.flatnonzero(flags).astype(np.int64)
+    if lo <= 2 < hi:
+        primes = np.concatenate((np.array([2], dtype=np.int64), primes))
+    return primes
+
+
+def segmented_sieve(start, end, base_primes=None, segment_size=1 << 18):
+    """
+    Find prime numbers within [start, end) segment by segment, so the working
+    set of each step stays small enough to live in the CPU cache. Negative
+    numbers are never prime, so sieving starts at 0 at the earliest.
+
+    :param start: The start of the range to check.
+    :param end: The end of the range to check (exclusive).
+    :param base_primes: Primes up to sqrt(end - 1); computed when not given.
+    :param segment_size: Amount of numbers sieved per segment.
+    :return: NumPy array of the primes found within the range.
+    """
+    start = max(start, 0)
+    if base_primes is None:
+        base_primes = simple_sieve(isqrt(max(end - 1, 0)))
+    segments = [sieve_segment(lo, min(lo + segment_size, end), base_primes)
+                for lo in range(start, end, segment_size)]
+    if not segments:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(segments)
+
+
+def sieve_chunk(start, end, segment_size):
+    """
+    Pool task finding the primes within [start, end) with the base primes of
+    the worker process.
+
+    :param start: The start of the range to check.
+    :param end: The end of the range to check (exclusive).
+    :param segment_size: Amount of numbers sieved per segment.
+    :return: Packed uint32 (uint64 for ranges beyond 2**32) NumPy array of primes.
+    """
+    primes = segmented_sieve(start, end, _base_primes, segment_size)
+    return primes.astype(np.uint32 if end <= 2 ** 32 else np.uint64)
+
+
+def iter_primes(start, end, num_processes=None, chunk_size=1 << 22, max_in_flight=None,
+                segment_size=1 << 18):
+    """
+    Yield the primes within [start, end) in order, without holding them all in memory.
+
+    Worker processes sieve the chunks ahead of the consumer, but at most
+    `max_in_flight` chunks are computed or waiting to be consumed at any time,
+    so memory is bounded by the chunk size rather than by the range size.
+
+    :param start: The start of the range (inclusive).
+    :param end: The end of the range (exclusive).
+    :param num_processes: Number of processes to use, defaults to the CPU count.
+    :param chunk_size: Amount of numbers handed to a worker at a time.
+    :param max_in_flight: Maximum number of chunks in flight, defaults to twice the processes.
+    :param segment_size: Amount of numbers sieved per segment inside a chunk.
+    :return: Generator of prime numbers.
+    """
+    num_processes = num_processes or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * num_processes
+    chunk_starts = iter(range(start, end, chunk_size))
+    base_primes = simple_sieve(isqrt(max(end - 1, 0)))
+    with multiprocessing.Pool(processes=num_processes, initializer=init_worker,
+                              initargs=(base_primes,)) as pool:
+        def submit(lo):
+            return pool.apply_async(sieve_chunk, (lo, min(lo + chunk_size, end), segment_size))
+
+        pending = deque(submit(lo) for _, lo in zip(range(max_in_flight), chunk_starts))
+        while pending:
+            primes = pending.popleft().get()
+            lo = next(chunk_starts, None)
+            if lo is not None:
+                pending.append(submit(lo))
+            yield from primes.tolist()
+
+
+# Values below this limit are answered from a precomputed sieve table.
+SMALL_PRIME_LIMIT = 1 << 16
+# These bases make Miller-Rabin deterministic for every n < 318665857834031151167461
+# (about 3.18 * 10**23), so for all 64-bit values.
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+# Miller-Rabin only answers values below this limit; larger ones raise ValueError.
+MILLER_RABIN_LIMIT = 2 ** 64
+_small_prime_table = None
+
+
+def small_prime_table():
+    """
+    Return the boolean primality table for all numbers below SMALL_PRIME_LIMIT,
+    building it on first use.
+
+    :return: NumPy boolean array where table[n] is True if n is prime.
+    """
+    global _small_prime_table
+    if _small_prime_table is None:
+        table = np.zeros(SMALL_PRIME_LIMIT, dtype=bool)
+        table[simple_sieve(SMALL_PRIME_LIMIT - 1)] = True
+        _small_prime_table = table
+    return _small_prime_table
+
+
+def miller_rabin(n):
+    """
+    Check if a number is prime with the deterministic Miller-Rabin test.
+
+    :param n: The number to check for primality, below MILLER_RABIN_LIMIT (2**64).
+    :return: True if the number is prime, False otherwise.
+    :raises ValueError: If the number is too large for the test to be deterministic.
+    """
+    if n >= MILLER_RABIN_LIMIT:
+        raise ValueError(f"Miller-Rabin is only deterministic here below 2**64, not for {n}.")
+    if n < 2:
+        return False
+    for p in MILLER_RABIN_BASES:
+        if n % p == 0:
+            return n == p
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in MILLER_RABIN_BASES:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _as_int_array(values):
+    """
+    Convert a sequence of integers to the narrowest NumPy array holding them
+    exactly: int64, then uint64, and an object array for anything larger.
+
+    :param values: Sequence or NumPy array of integers.
+    :return: NumPy array of the values.
+    """
+    if isinstance(values, np.ndarray):
+        return values
+    values = list(values)
+    for dtype in (np.int64, np.uint64):
+        try:
+            return np.array(values, dtype=dtype)
+        except OverflowError:
+            continue
+    return np.array(values, dtype=object)
+
+
+def is_prime_batch(values):
+    """
+    Check a batch of numbers for primality in a single process.
+
+    Values below SMALL_PRIME_LIMIT are looked up in the small prime table, larger
+    ones are first filtered by vectorized division by the small primes and only
+    the survivors run through Miller-Rabin.
+
+    :param values: Sequence or NumPy array of integers.
+    :return: NumPy boolean array, True where the value is prime.
+    :raises ValueError: If a value is 2**64 or larger.
+    """
+    values = _as_int_array(values)
+    if values.dtype.kind not in 'iu':
+        # Mixing negative values with values above 2**63 also gives an object array.
+        values = [int(value) for value in values.ravel()]
+        if max(values, default=0) >= MILLER_RABIN_LIMIT:
+            raise ValueError(f"Values must be below 2**64, got {max(values)}.")
+        return np.array([miller_rabin(value) for value in values], dtype=bool)
+    table = small_prime_table()
+    result = np.zeros(values.shape, dtype=bool)
+    small = (values >= 0) & (values < SMALL_PRIME_LIMIT)
+    result[small] = table[values[small]]
+    large = np.flatnonzero(values >= SMALL_PRIME_LIMIT)
+    candidates = values[large]
+    for p in simple_sieve(100):
+        survivors = candidates % candidates.dtype.type(p) != 0
+        large, candidates = large[survivors], candidates[survivors]
+    result[large] = [miller_rabin(int(value)) for value in candidates]
+    return result
+
+
+def is_prime_many(values, num_processes=None, batch_size=100000):
+    """
+    Check a large batch of numbers (up to 64-bit) for primality, splitting the
+    batch across a process pool when it is larger than `batch_size`.
+
+    :param values: Sequence or NumPy array of integers.
+    :param num_processes: Number of processes to use, defaults to the CPU count.
+    :param batch_size: Amount of values checked by one task.
+    :return: NumPy boolean array, True where the value is prime.
+    :raises ValueError: If a value is 2**64 or larger.
+    """
+    values = _as_int_array(values)
+    if len(values) <= batch_size or num_processes == 1:
+        return is_prime_batch(values)
+    batches = [values[i:i + batch_size] for i in range(0, len(values), batch_size)]
+    with multiprocessing.Pool(processes=num_processes) as pool:
+        return np.concatenate(pool.map(is_prime_batch, batches))
+
+
 class PrimeNumberSimulation(Simulation):
     def __init__(self):
         self.config = Config()
 
-    def worker(self, start, end):
+    def find_primes(self, start, end):
         """
-        Find prime numbers within a given range.
+        Find prime numbers within a given range using the configured engine.
+
+        The 'sieve' engine runs a segmented Sieve of Eratosthenes over the range,
+        the 'trial' engine checks every number with trial division.
 
         :param start: The start of the range to check.
         :param end: The end of the range to check.
-        :return: List of prime numbers found within the range.
+        :return: NumPy array of prime numbers found within the range.
+        """
+        if self.config.get('prime_engine', 'sieve') == 'trial':
+            return np.array([num for num in range(start, end) if is_prime(num)], dtype=np.int64)
+        segment_size = self.config.get('sieve_segment_size', 1 << 18)
+        return segmented_sieve(start, end, _base_primes, segment_size)
+
+    def worker(self, start, end, result_mode=None):
+        """
+        Find prime numbers within a given range and return them in the given (or
+        configured) result mode, so large ranges don't have to be pickled as Python lists:
+
+        - 'list': list of prime numbers.
+        - 'count': tuple of the number of primes and the first 10 of them.
+        - 'array': packed uint32 (uint64 for ranges beyond 2**32) NumPy array.
+        - 'bitmap': odd-only bitmap (see `primes_to_bitmap`). When the pool shares
+          a bitmap block, the bitmap is written into it and only the count is returned.
+
+        :param start: The start of the range to check.
+        :param end: The end of the range to check.
+        :param result_mode: Result mode overriding the 'prime_result_mode' config.
+        :return: Primes found within the range in the result mode.
+        """
+        primes = self.find_primes(start, end)
+        result_mode = result_mode or self.config.get('prime_result_mode', 'count')
+        if result_mode == 'count':
+            return len(primes), primes[:10].tolist()
+        if result_mode == 'array':
+            return primes.astype(np.uint32 if end <= 2 ** 32 else np.uint64)
+        if result_mode == 'bitmap':
+            bitmap = primes_to_bitmap(primes, start, end)
+            if _shared_bitmap is None:
+                return bitmap
+            offset = (start - start % 16 - _bitmap_base) // 16
+            _shared_bitmap.buf[offset:offset + len(bitmap)] = bitmap.tobytes()
+            return int(np.count_nonzero(primes % 2))
+        return primes.tolist()
+
+    def timed_worker(self, task):
+        """
+        Run `worker` on a single chunk and measure how long the process was busy.
+
+        :param task: Tuple of the chunk index, start, end and result mode.
+        :return: Tuple of the chunk index, worker process id, busy seconds and the worker result.
+        """
+        index, start, end, result_mode = task
+        busy_start = perf_counter()
+        result = self.worker(start, end, result_mode)
+        return index, os.getpid(), perf_counter() - busy_start, result
+
+    def dispatch(self, pool, ranges, result_mode):
+        """
+        Hand the chunks out to the pool one at a time, so processes that finish
+        early pick up more work, and collect the results in range order.
+
+        :param pool: The multiprocessing pool to run the chunks on.
+        :param ranges: The (start, end) chunks to compute.
+        :param result_mode: The result mode the workers should return.
+        :return: Tuple of the results in range order and a dictionary mapping each
+                 worker process id to its busy seconds and number of chunks.
+        """
+        results = [None] * len(ranges)
+        busy_times = {}
+        tasks = [(index, start, end, result_mode) for index, (start, end) in enumerate(ranges)]
+        for index, pid, busy, result in pool.imap_unordered(self.timed_worker, tasks):
+            results[index] = result
+            busy_time, chunk_count = busy_times.get(pid, (0.0, 0))
+            busy_times[pid] = (busy_time + busy, chunk_count + 1)
+        return results, busy_times
+
+    def split_range(self, start, end, num_chunks):
+        """
+        Split [start, end) into consecutive chunks whose inner boundaries are
+        multiples of 16, so the bitmaps of neighbouring chunks never share a byte.
+
+        :param start: The start of the range (inclusive).
+        :param end: The end of the range (exclusive).
+        :param num_chunks: The number of chunks to aim for.
+        :return: List of (start, end) tuples covering the range.
         """
-        primes = [num for num in range(start, end) if is_prime(num)]
-        return primes
+        if end <= start:
+            return []
+        chunk_size = max(1, (end - start) // num_chunks)
+        bounds = [start]
+        for i in range(1, num_chunks):
+            bound = start + i * chunk_size
+            bound -= bound % 16
+            if bounds[-1] < bound < end:
+                bounds.append(bound)
+        bounds.append(end)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def summarize(self, results, ranges, shared_bitmap=None, bitmap_base=0):
+        """
+        Aggregate worker results into the prime count and the first 10 primes
+        without materialising every prime as a Python object.
+
+        :param results: Worker results in range order.
+        :param ranges: The (start, end) ranges the results belong to.
+        :param shared_bitmap: Shared-memory block the workers wrote their bitmaps into.
+        :param bitmap_base: The number the shared bitmap starts at.
+        :return: Tuple of the number of primes and a list of the first 10 primes.
+        """
+        result_mode = self.config.get('prime_result_mode', 'count')
+        total = 0
+        first_primes = []
+        for (start, end), result in zip(ranges, results):
+            if result_mode == 'count':
+                count, head = result
+            elif result_mode == 'bitmap':
+                # The odd-only bitmap has no bit for 2, so it is added back here.
+                base = start - start % 16
+                head = [2] if start <= 2 < end else []
+                if shared_bitmap is not None:
+                    count = result + len(head)
+                    if len(first_primes) + len(head) < 10:
+                        offset = (base - bitmap_base) // 16
+                        result = bytes(shared_bitmap.buf[offset:offset + (end - base + 15) // 16])
+                        result = np.frombuffer(result, dtype=np.uint8)
+                else:
+                    count = int(np.unpackbits(result).sum()) + len(head)
+                if len(first_primes) + len(head) < 10:
+                    head += bitmap_to_primes(result, base)[:10].tolist()
+            else:
+                count = len(result)
+                head = result[:10]
+            total += count
+            if len(first_primes) < 10:
+                first_primes.extend(int(prime) for prime in head[:10 - len(first_primes)])
+        return total, first_primes
 
     def run(self):
         """
@@ -45,32 +479,79 @@ class PrimeNumberSimulation(Simulation):
         start_number = self.config.get('start_number', 2)
         end_number = self.config.get('end_number', 100000)
         num_processes = self.config.get('num_processes', 4)
+        engine = self.config.get('prime_engine', 'sieve')
+        result_mode = self.config.get('prime_result_mode', 'count')
 
+        chunks_per_process = self.config.get('prime_chunks_per_process', 16)
 
-        chunk_size = (end_number - start_number + 1) // num_processes
-        ranges = [(start_number + i * chunk_size, start_number + (i + 1) * chunk_size)
-                  for i in range(num_processes)]
+        cache = None
+        compute_start, compute_end = start_number, end_number + 1
+        if self.config.get('prime_cache', False):
+            cache = PrimeBitmapCache(self.config.get('prime_cache_path', 'prime_bitmap.cache'))
+            # Negative numbers are never prime, so the cache never holds them.
+            cache_start = max(start_number, 0)
+            if cache.covered_end == cache.base:
+                cache.start_at(cache_start - cache_start % 16)
+            # Filling the gap up to the range is only worth it while it is not larger than the range.
+            if cache_start < cache.base or cache_start - cache.covered_end > end_number + 1 - cache_start:
+                print(f"{Color.YELLOW}Prime cache covers {cache.base} to {cache.covered_end}, too far from "
+                      f"{start_number} to {end_number}. Computing the range without the cache.{Color.RESET}")
+                cache = None
+        if cache is not None:
+            result_mode = 'bitmap'
+            # The cache only grows at its end and in whole bytes of 16 numbers,
+            # so only the part beyond its coverage is computed.
+            compute_start = cache.covered_end
+            compute_end = max(compute_start, end_number + 1 + (-(end_number + 1)) % 16)
 
-        ranges[-1] = (ranges[-1][0], end_number + 1)
+        # Many small chunks handed out dynamically keep every process busy, even though
+        # chunks of large numbers take longer than chunks of small ones.
+        ranges = self.split_range(compute_start, compute_end, num_processes * chunks_per_process)
 
         start_time = time()
-        with multiprocessing.Pool(processes=num_processes) as pool:
-            results = pool.starmap(self.worker, ranges)
+        base_primes = simple_sieve(isqrt(compute_end)) if engine == 'sieve' else None
+        shared_bitmap = None
+        bitmap_base = start_number - start_number % 16
+        if cache is None and result_mode == 'bitmap' and self.config.get('prime_shared_memory', False):
+            shared_bitmap = shared_memory.SharedMemory(
+                create=True, size=max(1, (end_number + 1 - bitmap_base + 15) // 16))
+        results, busy_times = [], {}
+        try:
+            if ranges:
+                with multiprocessing.Pool(processes=num_processes, initializer=init_worker,
+                                          initargs=(base_primes, shared_bitmap and shared_bitmap.name,
+                                                    bitmap_base)) as pool:
+                    results, busy_times = self.dispatch(pool, ranges, result_mode)
+            if cache is not None:
+                cache.extend(results)
+                prime_count = cache.count(cache_start, end_number + 1)
+                first_primes = cache.primes(cache_start, end_number + 1, 10)
+            else:
+                prime_count, first_primes = self.summarize(results, ranges, shared_bitmap, bitmap_base)
+        finally:
+            if shared_bitmap is not None:
+                shared_bitmap.close()
+                shared_bitmap.unlink()
 
         end_time = time()
 
-
-        all_primes = [prime for sublist in results for prime in sublist]
-
         print(
             f"{Color.BLUE}Blueprint: This simulation demonstrates how multiprocessing can be used to distribute CPU-intensive tasks like prime number computation.{Color.RESET}")
         print(f"{Color.GREEN}Prime Number Calculation Results:")
         print(f"- Number of processes used: {num_processes}")
+        print(f"- Engine: {engine}")
+        print(f"- Result mode: {result_mode}{' (shared memory)' if shared_bitmap is not None else ''}")
         print(f"- Range checked: {start_number} to {end_number}")
-        print(f"- Number of primes found: {len(all_primes)}")
+        print(f"- Number of chunks: {len(ranges)}")
+        if cache is not None:
+            print(f"- Numbers answered from cache: {max(0, min(end_number + 1, compute_start) - cache_start)}")
+            print(f"- Numbers computed and added to cache: {compute_end - compute_start}")
+        print(f"- Number of primes found: {prime_count}")
         print(f"- Time taken: {end_time - start_time:.4f} seconds{Color.RESET}")
+        for worker_number, (busy_time, chunk_count) in enumerate(busy_times.values()):
+            print(f"  - Worker {worker_number}: busy {busy_time:.4f} seconds, {chunk_count} chunks")
         # Print first few primes for demonstration
-        print(f"First 10 primes: {all_primes[:10]}")
+        print(f"First 10 primes: {first_primes}")
 
     def show_code(self):
         """
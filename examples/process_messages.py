@@ -0,0 +1,303 @@
+import multiprocessing
+import queue
+import struct
+import time
+import zlib
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from examples.latency_histogram import LatencyHistogram
+
+# Every record starts with the perf_counter_ns time it was sent at and its message number.
+HEADER = struct.Struct('<QQ')
+# Seconds between checks of the child processes while waiting for their results.
+POLL_INTERVAL = 0.2
+
+
+class QueueTransport:
+    """
+    Sends records through a bounded `multiprocessing.Queue`, which pickles every
+    record and hands it to a feeder thread writing to a pipe.
+    """
+    name = 'queue'
+
+    def __init__(self, record_size, capacity):
+        self.record_size = record_size
+        self.queue = multiprocessing.Queue(maxsize=capacity)
+
+    def as_sender(self):
+        pass
+
+    def as_receiver(self):
+        pass
+
+    def send(self, record):
+        # The feeder thread pickles the record later, so a buffer the caller
+        # reuses has to be copied now.
+        self.queue.put(bytes(record))
+
+    def recv(self):
+        return self.queue.get()
+
+    def close(self):
+        self.queue.close()
+
+
+class PipeTransport:
+    """
+    Sends records through a one-way `multiprocessing.Pipe` as raw bytes, without
+    pickling them.
+    """
+    name = 'pipe'
+
+    def __init__(self, record_size, capacity):
+        self.record_size = record_size
+        self.receiving_end, self.sending_end = multiprocessing.Pipe(duplex=False)
+
+    def as_sender(self):
+        """
+        Close the receiving end in the producer process.
+        """
+        self.receiving_end.close()
+
+    def as_receiver(self):
+        """
+        Close the sending end in the consumer process, so it gets EOFError
+        instead of waiting forever when the producer dies.
+        """
+        self.sending_end.close()
+
+    def send(self, record):
+        self.sending_end.send_bytes(record)
+
+    def recv(self):
+        return self.receiving_end.recv_bytes()
+
+    def close(self):
+        self.receiving_end.close()
+        self.sending_end.close()
+
+
+class SharedRingTransport:
+    """
+    Sends fixed-size records through a ring of preallocated slots in shared
+    memory, for one producer and one consumer process. Records are copied into
+    and out of the slots without pickling. Two semaphores count the free and
+    the filled slots, so the producer waits while the ring is full and the
+    consumer while it is empty; they also order the slot writes before the reads.
+    """
+    name = 'shared_ring'
+
+    def __init__(self, record_size, capacity):
+        self.record_size = record_size
+        self.slots = capacity
+        self.block = shared_memory.SharedMemory(create=True, size=record_size * capacity)
+        self.block_name = self.block.name
+        self.free_slots = multiprocessing.Semaphore(capacity)
+        self.filled_slots = multiprocessing.Semaphore(0)
+        # Each side counts its own records, so the counters never have to be shared.
+        self.sent = 0
+        self.received = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The block is attached again by name in the other process.
+        state['block'] = None
+        return state
+
+    def as_sender(self):
+        pass
+
+    def as_receiver(self):
+        pass
+
+    def _buffer(self):
+        if self.block is None:
+            self.block = shared_memory.SharedMemory(name=self.block_name)
+        return self.block.buf
+
+    def send(self, record):
+        buffer = self._buffer()
+        self.free_slots.acquire()
+        offset = self.sent % self.slots * self.record_size
+        buffer[offset:offset + self.record_size] = record
+        self.sent += 1
+        self.filled_slots.release()
+
+    def recv(self):
+        buffer = self._buffer()
+        self.filled_slots.acquire()
+        offset = self.received % self.slots * self.record_size
+        record = bytes(buffer[offset:offset + self.record_size])
+        self.received += 1
+        self.free_slots.release()
+        return record
+
+    def close(self):
+        if self.block is not None:
+            self.block.close()
+
+    def unlink(self):
+        """
+        Free the shared memory; called once by the process that created the ring.
+        """
+        shared_memory.SharedMemory(name=self.block_name).unlink()
+
+
+TRANSPORTS = {transport.name: transport for transport in (QueueTransport, PipeTransport, SharedRingTransport)}
+
+
+def handle_record(record, rounds):
+    """
+    CPU-bound handler of the process-based Messages: `rounds` CRC-32 passes over
+    the record without its send time.
+
+    :param record: The received record.
+    :param rounds: The number of passes; 0 does no work.
+    :return: The checksum.
+    """
+    # The send time is the first 8 bytes of the header.
+    body = memoryview(record)[8:]
+    checksum = 0
+    for _ in range(rounds):
+        checksum = zlib.crc32(body, checksum)
+    return checksum
+
+
+def producer_process(transports, count, record_size, start_event):
+    """
+    Sends `count` records of `record_size` bytes, each stamped with its send
+    time and message number, to the transports in turn.
+
+    :param transports: The transports to send through, one per consumer.
+    :param count: The number of records to send.
+    :param record_size: Size of every record in bytes, at least HEADER.size.
+    :param start_event: Event set by the parent once all processes are running.
+    """
+    for transport in transports:
+        transport.as_sender()
+    payload = bytearray(record_size)
+    start_event.wait()
+    for number in range(count):
+        HEADER.pack_into(payload, 0, time.perf_counter_ns(), number)
+        transports[number % len(transports)].send(payload)
+    for transport in transports:
+        transport.close()
+
+
+def consumer_process(transport, count, start_event, results, index=0, rounds=0):
+    """
+    Receives `count` records, measures the latency of every record from its
+    send time and handles it with `handle_record`.
+
+    :param transport: The transport to receive from.
+    :param count: The number of records to receive.
+    :param start_event: Event set by the parent once all processes are running.
+    :param results: multiprocessing.Queue receiving a tuple of `index`, the elapsed
+                    nanoseconds, a LatencyHistogram of the latencies in nanoseconds
+                    and the sum of the handler's checksums.
+    :param index: Index of this consumer.
+    :param rounds: Rounds of work of the handler per record.
+    """
+    transport.as_receiver()
+    latencies = np.empty(count, dtype=np.int64)
+    checksum = 0
+    start_event.wait()
+    start = time.perf_counter_ns()
+    for i in range(count):
+        record = transport.recv()
+        latencies[i] = time.perf_counter_ns() - HEADER.unpack_from(record)[0]
+        if rounds:
+            checksum += handle_record(record, rounds)
+    elapsed = time.perf_counter_ns() - start
+    histogram = LatencyHistogram()
+    histogram.record_many(latencies)
+    results.put((index, elapsed, histogram, checksum))
+    transport.close()
+
+
+def run_pipeline(name, record_size, count, capacity=1024, consumers=1, rounds=0, timeout=None):
+    """
+    Passes records from a producer process to consumer processes, each consumer
+    with its own transport of the same kind. The parent waits for the results
+    while checking that no child died, so a crashed process raises instead of
+    leaving the parent waiting forever.
+
+    :param name: The transport name, see TRANSPORTS.
+    :param record_size: Size of every record in bytes.
+    :param count: The number of records to send.
+    :param capacity: Capacity of the queue or number of ring slots.
+    :param consumers: The number of consumer processes.
+    :param rounds: Rounds of work of the handler per record, see `handle_record`.
+    :param timeout: Seconds to wait for the results, forever by default.
+    :return: Tuple of messages per second, the merged LatencyHistogram of latencies
+             in nanoseconds and the sum of the handler's checksums.
+    :raises RuntimeError: If a child process exited with an error.
+    :raises TimeoutError: If the results didn't arrive in time.
+    """
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown transport '{name}'. Choose from {', '.join(TRANSPORTS)}.")
+    record_size = max(record_size, HEADER.size)
+    transports = []
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = []
+    received = []
+    try:
+        for _ in range(consumers):
+            transports.append(TRANSPORTS[name](record_size, capacity))
+        shares = [count // consumers + (index < count % consumers) for index in range(consumers)]
+        processes.append(multiprocessing.Process(target=producer_process,
+                                                 args=(transports, count, record_size, start_event)))
+        processes.extend(multiprocessing.Process(target=consumer_process,
+                                                 args=(transport, share, start_event, results, index, rounds))
+                         for index, (transport, share) in enumerate(zip(transports, shares)))
+        for process in processes:
+            process.start()
+        # The children have their own copies; the parent's would keep pipes open.
+        for transport in transports:
+            transport.close()
+        start_event.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(received) < consumers:
+            try:
+                received.append(results.get(timeout=POLL_INTERVAL))
+            except queue.Empty:
+                for role, process in zip(['producer'] + ['consumer'] * consumers, processes):
+                    if process.exitcode not in (None, 0):
+                        raise RuntimeError(f"The {role} process of the '{name}' transport "
+                                           f"exited with code {process.exitcode}.")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"No results from the '{name}' transport within {timeout} seconds.")
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for transport in transports:
+            if isinstance(transport, SharedRingTransport):
+                transport.unlink()
+    elapsed = max(result[1] for result in received)
+    histogram = LatencyHistogram()
+    for result in received:
+        histogram.merge(result[2])
+    return (count / elapsed * 1e9 if elapsed else 0.0), histogram, sum(result[3] for result in received)
+
+
+def benchmark_transport(name, record_size, count, capacity=1024, timeout=None):
+    """
+    Passes records from a producer process to a consumer process through one
+    transport, without any work in the consumer.
+
+    :param name: The transport name, see TRANSPORTS.
+    :param record_size: Size of every record in bytes.
+    :param count: The number of records to send.
+    :param capacity: Capacity of the queue or number of ring slots.
+    :param timeout: Seconds to wait for the results, forever by default.
+    :return: Tuple of messages per second and the LatencyHistogram of latencies in nanoseconds.
+    """
+    throughput, histogram, _ = run_pipeline(name, record_size, count, capacity, timeout=timeout)
+    return throughput, histogram
@@ -0,0 +1,224 @@
+import math
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class Reduction(ABC):
+    """
+    A reduction computed in three steps: `partial` summarises one block of data
+    into a small state, `combine` merges two states and `finalize` turns a state
+    into the result. Reductions with the same `key` share their partial states,
+    so e.g. mean, variance and std look at each block only once.
+    """
+    name = None
+    key = None
+
+    @abstractmethod
+    def partial(self, block):
+        """
+        :param block: NumPy array with one block of the data.
+        :return: The state summarising the block.
+        """
+
+    @abstractmethod
+    def combine(self, first, second):
+        """
+        :param first: State of the earlier blocks.
+        :param second: State of the later blocks.
+        :return: The state of both.
+        """
+
+    def finalize(self, state):
+        return state
+
+
+class SumReduction(Reduction):
+    """
+    Sum with compensated (Neumaier) combining. Blocks are summed by NumPy, which
+    uses pairwise summation, and the rounding errors of adding the block sums
+    are carried in a separate compensation term.
+    """
+    name = 'sum'
+    key = 'sum'
+
+    def partial(self, block):
+        return float(np.sum(block)), 0.0
+
+    def combine(self, first, second):
+        total, compensation = first
+        value, value_compensation = second
+        new_total = total + value
+        if abs(total) >= abs(value):
+            compensation += (total - new_total) + value
+        else:
+            compensation += (value - new_total) + total
+        return new_total, compensation + value_compensation
+
+    def finalize(self, state):
+        return state[0] + state[1]
+
+
+class MomentsReduction(Reduction):
+    """
+    Base of the reductions derived from the count, mean and sum of squared
+    deviations (M2). Within a block these are computed while the block is in
+    cache; blocks and workers are merged with the formula of Chan et al., which
+    unlike the sum of squares doesn't lose precision when the mean is large
+    compared to the spread.
+    """
+    key = 'moments'
+
+    def partial(self, block):
+        count = block.size
+        if count == 0:
+            return 0, 0.0, 0.0
+        mean = float(np.mean(block))
+        deviations = block - mean
+        return count, mean, float(np.dot(deviations, deviations))
+
+    def combine(self, first, second):
+        count, mean, m2 = first
+        other_count, other_mean, other_m2 = second
+        if other_count == 0:
+            return first
+        if count == 0:
+            return second
+        total = count + other_count
+        delta = other_mean - mean
+        return (total, mean + delta * other_count / total,
+                m2 + other_m2 + delta * delta * count * other_count / total)
+
+
+class MeanReduction(MomentsReduction):
+    name = 'mean'
+
+    def finalize(self, state):
+        count, mean, _ = state
+        return mean if count else math.nan
+
+
+class VarianceReduction(MomentsReduction):
+    """
+    Population variance (as `np.var` with the default ddof=0).
+    """
+    name = 'variance'
+
+    def finalize(self, state):
+        count, _, m2 = state
+        return m2 / count if count else math.nan
+
+
+class StdReduction(VarianceReduction):
+    name = 'std'
+
+    def finalize(self, state):
+        return math.sqrt(super().finalize(state))
+
+
+class MinReduction(Reduction):
+    name = 'min'
+    key = 'min'
+
+    def partial(self, block):
+        return float(np.min(block)) if block.size else math.inf
+
+    def combine(self, first, second):
+        return min(first, second)
+
+
+class MaxReduction(Reduction):
+    name = 'max'
+    key = 'max'
+
+    def partial(self, block):
+        return float(np.max(block)) if block.size else -math.inf
+
+    def combine(self, first, second):
+        return max(first, second)
+
+
+class HistogramReduction(Reduction):
+    """
+    Histogram with fixed, equally wide bins over [low, high]. Values outside the
+    range are not counted. The partial states are bin counts and merge by adding.
+    """
+    name = 'histogram'
+
+    def __init__(self, bins=10, value_range=(0.0, 1.0)):
+        self.edges = np.linspace(value_range[0], value_range[1], bins + 1)
+        self.key = ('histogram', bins, tuple(value_range))
+
+    def partial(self, block):
+        return np.histogram(block, self.edges)[0]
+
+    def combine(self, first, second):
+        return first + second
+
+
+REDUCTIONS = {reduction.name: reduction for reduction in
+              (SumReduction, MeanReduction, VarianceReduction, StdReduction, MinReduction, MaxReduction,
+               HistogramReduction)}
+
+
+def make_reductions(names, histogram_bins=10, histogram_range=(0.0, 1.0)):
+    """
+    Create reductions by name.
+
+    :param names: List of reduction names, see REDUCTIONS.
+    :param histogram_bins: Number of bins of the histogram reduction.
+    :param histogram_range: The (low, high) range of the histogram reduction.
+    :return: List of Reduction objects.
+    """
+    reductions = []
+    for name in names:
+        if name not in REDUCTIONS:
+            raise ValueError(f"Unknown reduction '{name}'. Choose from {', '.join(REDUCTIONS)}.")
+        if name == 'histogram':
+            reductions.append(HistogramReduction(histogram_bins, histogram_range))
+        else:
+            reductions.append(REDUCTIONS[name]())
+    return reductions
+
+
+def reduce_array(array, reductions, block_size=1 << 16):
+    """
+    Compute the partial states of several reductions in one pass over an array.
+    Every block of `block_size` elements is handed to all reductions while it is
+    in cache, and each distinct state is computed once per block.
+
+    :param array: NumPy array to reduce.
+    :param reductions: List of Reduction objects.
+    :param block_size: Number of elements per block.
+    :return: Dictionary mapping the reduction keys to their states.
+    """
+    by_key = {reduction.key: reduction for reduction in reductions}
+    flat = array.reshape(-1)
+    states = {key: reduction.partial(flat[:0]) for key, reduction in by_key.items()}
+    for lo in range(0, flat.size, block_size):
+        block = flat[lo:lo + block_size]
+        for key, reduction in by_key.items():
+            states[key] = reduction.combine(states[key], reduction.partial(block))
+    return states
+
+
+def combine_states(reductions, partial_states):
+    """
+    Merge the partial states of several workers pairwise, halving their number
+    every round, so errors grow with the logarithm of the number of workers.
+
+    :param reductions: List of Reduction objects the states were computed with.
+    :param partial_states: List of state dictionaries from `reduce_array`.
+    :return: Dictionary mapping the reduction names to their final results.
+    """
+    by_key = {reduction.key: reduction for reduction in reductions}
+    states = list(partial_states)
+    if not states:
+        states = [reduce_array(np.zeros(0), reductions)]
+    while len(states) > 1:
+        merged = [{key: reduction.combine(first[key], second[key]) for key, reduction in by_key.items()}
+                  for first, second in zip(states[0::2], states[1::2])]
+        if len(states) % 2:
+            merged.append(states[-1])
+        states = merged
+    return {reduction.name: reduction.finalize(states[0][reduction.key]) for reduction in reductions}
@@ -0,0 +1,248 @@
+import queue
+import threading
+import time
+from collections import deque
+
+
+class RingBuffer:
+    """
+    Bounded queue for one producer thread and one consumer thread, backed by a
+    preallocated list of slots. The producer only advances `_tail` and the
+    consumer only advances `_head`, so as long as neither side has to wait they
+    take no lock at all; `put_many` and `get_many` move a whole batch with one
+    slice assignment and one index update.
+
+    A side that finds the buffer full or empty raises its waiting flag under the
+    lock and checks again before sleeping, and the other side only takes the lock
+    to notify when it sees that flag after publishing its index. It offers the
+    `put`/`get`/`qsize` methods of `queue.Queue` used by Messages, so it can
+    replace the queue where there is a single producer and a single consumer.
+    """
+
+    def __init__(self, capacity=1024):
+        if capacity < 1:
+            raise ValueError("The capacity of a ring buffer must be at least 1.")
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._head = 0
+        self._tail = 0
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._getter_waiting = False
+        self._putter_waiting = False
+
+    def qsize(self):
+        return self._tail - self._head
+
+    def empty(self):
+        return self._tail == self._head
+
+    def full(self):
+        return self._tail - self._head >= self.capacity
+
+    def _wait(self, condition, flag, ready, deadline):
+        """
+        Sleep on `condition` until `ready()` is true. The flag telling the other
+        side to notify is raised before `ready()` is checked again, so a notify
+        can't be missed between the check and the wait.
+
+        :return: False if the deadline passed first.
+        """
+        with self._lock:
+            setattr(self, flag, True)
+            try:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                return condition.wait_for(ready, timeout)
+            finally:
+                setattr(self, flag, False)
+
+    def put_many(self, items, block=True, timeout=None):
+        """
+        Put a sequence of items, as many at a time as there are free slots.
+
+        :param items: Sequence of items to put.
+        :param block: Whether to wait for free slots.
+        :param timeout: Seconds to wait in total, forever by default.
+        :raises queue.Full: If the buffer stayed full; items put before remain in the buffer.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        capacity = self.capacity
+        slots = self._slots
+        position = 0
+        while position < len(items):
+            tail = self._tail
+            free = capacity - (tail - self._head)
+            if not free:
+                if not block or not self._wait(self._not_full, '_putter_waiting', self._has_space, deadline):
+                    raise queue.Full
+                continue
+            count = min(free, len(items) - position)
+            start = tail % capacity
+            first = min(count, capacity - start)
+            slots[start:start + first] = items[position:position + first]
+            slots[:count - first] = items[position + first:position + count]
+            self._tail = tail + count
+            position += count
+            if self._getter_waiting:
+                with self._lock:
+                    self._not_empty.notify()
+
+    def get_many(self, max_items, block=True, timeout=None):
+        """
+        Take up to `max_items` items, waiting only while the buffer is empty.
+
+        :param max_items: The largest number of items to return.
+        :param block: Whether to wait for an item.
+        :param timeout: Seconds to wait, forever by default.
+        :return: List of between 1 and `max_items` items in the order they were put.
+        :raises queue.Empty: If no item arrived.
+        """
+        head = self._head
+        available = self._tail - head
+        if not available:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            if not block or not self._wait(self._not_empty, '_getter_waiting', self._has_items, deadline):
+                raise queue.Empty
+            available = self._tail - head
+        capacity = self.capacity
+        slots = self._slots
+        count = min(available, max_items)
+        start = head % capacity
+        first = min(count, capacity - start)
+        items = slots[start:start + first] + slots[:count - first]
+        # Drop the references, so consumed items can be freed.
+        slots[start:start + first] = [None] * first
+        slots[:count - first] = [None] * (count - first)
+        self._head = head + count
+        if self._putter_waiting:
+            with self._lock:
+                self._not_full.notify()
+        return items
+
+    def _has_items(self):
+        return self._tail != self._head
+
+    def _has_space(self):
+        return self._tail - self._head < self.capacity
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Put one item; the same as `put_many((item,))` without the slicing.
+        """
+        tail = self._tail
+        if tail - self._head >= self.capacity:
+            self.put_many((item,), block, timeout)
+            return
+        self._slots[tail % self.capacity] = item
+        self._tail = tail + 1
+        if self._getter_waiting:
+            with self._lock:
+                self._not_empty.notify()
+
+    def get(self, block=True, timeout=None):
+        """
+        Take one item; the same as `get_many(1)[0]` without the slicing.
+        """
+        head = self._head
+        if self._tail == head:
+            return self.get_many(1, block, timeout)[0]
+        index = head % self.capacity
+        item = self._slots[index]
+        self._slots[index] = None
+        self._head = head + 1
+        if self._putter_waiting:
+            with self._lock:
+                self._not_full.notify()
+        return item
+
+    def task_done(self):
+        """
+        Accepted for compatibility with `queue.Queue`; the ring doesn't track unfinished items.
+        """
+
+
+def spsc_benchmark(structure, total_messages, batch_size, capacity):
+    """
+    Passes the numbers 0 to `total_messages` - 1 from a producer thread to a
+    consumer thread and checks that they arrive complete and in order.
+
+    The consumer always takes all messages, so the producer never blocks on a
+    full buffer after a mismatch.
+
+    - 'queue': `queue.Queue(capacity)`, one put and one get per message.
+    - 'deque': unbounded `collections.deque`, filled with `extend` per batch and
+      emptied with `popleft`, the consumer yielding the GIL while it is empty.
+    - 'ring': RingBuffer(capacity) with `put_many`/`get_many` per batch, or
+      `put`/`get` when `batch_size` is 1.
+
+    :param structure: 'queue', 'deque' or 'ring'.
+    :param total_messages: The number of messages to pass.
+    :param batch_size: Messages per put and get of the deque and the ring.
+    :param capacity: Capacity of the queue and the ring.
+    :return: Tuple of messages per second and whether all messages arrived in order.
+    """
+    batches = [range(start, min(start + batch_size, total_messages))
+               for start in range(0, total_messages, batch_size)]
+    in_order = [False]
+
+    if structure == 'queue':
+        buffer = queue.Queue(maxsize=capacity)
+
+        def produce():
+            for i in range(total_messages):
+                buffer.put(i)
+
+        def consume():
+            in_order[0] = sum(buffer.get() == i for i in range(total_messages)) == total_messages
+    elif structure == 'deque':
+        buffer = deque()
+
+        def produce():
+            for batch in batches:
+                buffer.extend(batch)
+
+        def consume():
+            received = matching = 0
+            popleft = buffer.popleft
+            while received < total_messages:
+                try:
+                    matching += popleft() == received
+                    received += 1
+                except IndexError:
+                    time.sleep(0)
+            in_order[0] = matching == total_messages
+    elif structure == 'ring':
+        buffer = RingBuffer(capacity)
+
+        def produce():
+            if batch_size == 1:
+                for i in range(total_messages):
+                    buffer.put(i)
+                return
+            for batch in batches:
+                buffer.put_many(batch)
+
+        def consume():
+            if batch_size == 1:
+                in_order[0] = sum(buffer.get() == i for i in range(total_messages)) == total_messages
+                return
+            received = 0
+            ordered = True
+            while received < total_messages:
+                items = buffer.get_many(batch_size)
+                ordered = ordered and items == list(range(received, received + len(items)))
+                received += len(items)
+            in_order[0] = ordered
+    else:
+        raise ValueError(f"Unknown structure '{structure}'. Choose 'queue', 'deque' or 'ring'.")
+
+    producer = threading.Thread(target=produce)
+    consumer = threading.Thread(target=consume)
+    start_time = time.perf_counter()
+    consumer.start()
+    producer.start()
+    producer.join()
+    consumer.join()
+    elapsed = time.perf_counter() - start_time
+    return (total_messages / elapsed if elapsed else 0.0), in_order[0]
@@ -1,9 +1,14 @@
+import itertools
 import threading
 import time
 from color import Color
 from config.config import Config
 from examples.simulation import Simulation
 
+# Increments done by every thread, and how often a thread reports its progress.
+INCREMENTS_PER_THREAD = 100000
+PROGRESS_INTERVAL = 10000
+STRATEGIES = ('lock', 'striped', 'thread_local', 'batched')
 
 
 class SharedMemory(Simulation):
@@ -13,46 +18,213 @@ class SharedMemory(Simulation):
         self.config = Config()
         self.max_threads = self.config.get('max_threads', 10)
         self.print_lock = threading.Lock()
+        self.reset()
 
-    def increment(self, thread_name):
+    def reset(self):
+        """
+        Set the counter back to 0 and create the stripes of the 'striped'
+        strategy, 'shared_memory_stripes' cells with a lock each.
+        """
+        self.counter = 0
+        stripes = self.config.get('shared_memory_stripes', 8)
+        self.stripes = [0] * stripes
+        self.stripe_locks = [threading.Lock() for _ in range(stripes)]
+        self._stripe_numbers = itertools.count()
+        # (list of (start, end) perf_counter_ns of the incrementing, nanoseconds
+        # waiting for locks) of every finished thread.
+        self.thread_stats = []
+
+    def value(self):
+        """
+        The value of the counter: the shared counter plus the stripes.
+        """
+        return self.counter + sum(self.stripes)
+
+    def _adder(self, strategy):
+        """
+        Create the function a thread increments the counter with. It takes the
+        number of increments to do and returns the nanoseconds spent waiting for
+        locks. A lock is first tried without blocking, so the clock is only read
+        when the lock is taken by another thread.
+
+        - 'lock': every increment takes the one shared lock.
+        - 'striped': the thread increments one of the stripes, taking only that
+          stripe's lock, so threads on different stripes never wait for each other.
+        - 'thread_local': the thread counts in a local variable and adds it to
+          the counter under the lock every 'shared_memory_flush_interval' increments.
+        - 'batched': the thread adds 'shared_memory_batch_size' at once under the lock.
+
+        :param strategy: One of STRATEGIES.
+        :return: The function.
+        """
+        clock = time.perf_counter_ns
+        lock = self.lock
+
+        def add_locked(amount):
+            if lock.acquire(False):
+                wait = 0
+            else:
+                start = clock()
+                lock.acquire()
+                wait = clock() - start
+            self.counter += amount
+            lock.release()
+            return wait
+
+        if strategy == 'lock':
+            def add(count):
+                wait = 0
+                for _ in range(count):
+                    wait += add_locked(1)
+                return wait
+        elif strategy == 'striped':
+            stripe = next(self._stripe_numbers) % len(self.stripes)
+            stripe_lock = self.stripe_locks[stripe]
+            cells = self.stripes
+
+            def add(count):
+                wait = 0
+                for _ in range(count):
+                    if not stripe_lock.acquire(False):
+                        start = clock()
+                        stripe_lock.acquire()
+                        wait += clock() - start
+                    cells[stripe] += 1
+                    stripe_lock.release()
+                return wait
+        elif strategy == 'thread_local':
+            interval = self.config.get('shared_memory_flush_interval', 1000)
+
+            def add(count):
+                wait = 0
+                for done in range(0, count, interval):
+                    local = 0
+                    for _ in range(min(interval, count - done)):
+                        local += 1
+                    wait += add_locked(local)
+                return wait
+        elif strategy == 'batched':
+            batch_size = self.config.get('shared_memory_batch_size', 1000)
+
+            def add(count):
+                wait = 0
+                for done in range(0, count, batch_size):
+                    wait += add_locked(min(batch_size, count - done))
+                return wait
+        else:
+            raise ValueError(f"Unknown counter strategy '{strategy}'. Choose from {', '.join(STRATEGIES)}.")
+        return add
+
+    def increment(self, thread_name, strategy=None, verbose=True):
         """
         Increment the shared counter in a thread-safe manner.
 
         Each thread attempts to increase the counter, using a lock to ensure
-        atomicity of the operation, thus avoiding race conditions.
+        atomicity of the operation, thus avoiding race conditions. How the lock
+        is used depends on the strategy, see `_adder`. When the thread was
+        incrementing and how long it waited for locks is added to `thread_stats`.
 
         :param thread_name: Name of the thread for identification in print statements.
+        :param strategy: One of STRATEGIES, 'shared_memory_strategy' from the config by default.
+        :param verbose: Print the progress, with the simulated delay, every PROGRESS_INTERVAL increments.
         """
-        for _ in range(100000):
-            with self.lock:
-                self.counter += 1
-            if _ % 10000 == 0:
+        add = self._adder(strategy or self.config.get('shared_memory_strategy', 'lock'))
+        clock = time.perf_counter_ns
+        intervals = []
+        wait = 0
+        for _ in range(0, INCREMENTS_PER_THREAD, PROGRESS_INTERVAL):
+            start = clock()
+            wait += add(PROGRESS_INTERVAL)
+            intervals.append((start, clock()))
+            if verbose:
                 time.sleep(self.config.get('delay_between_messages', 2))
                 with self.print_lock:
-                    print(f"{Color.GREEN}{thread_name}: Counter is now {self.counter}{Color.RESET}")
+                    print(f"{Color.GREEN}{thread_name}: Counter is now {self.value()}{Color.RESET}")
                     print(f"{Color.BLUE}Blueprint: Every thread is trying to add to the same bank account, but only one can do it at a time.{Color.RESET}")
+        self.thread_stats.append((intervals, wait))
+
+    def busy_seconds(self):
+        """
+        The time in which at least one thread was incrementing, which leaves
+        out the simulated delays of a verbose run.
 
-    def run(self):
+        :return: Seconds.
+        """
+        busy = end = 0
+        for start, stop in sorted(interval for intervals, _ in self.thread_stats for interval in intervals):
+            if stop > end:
+                busy += stop - max(start, end)
+                end = stop
+        return busy / 1e9
+
+    def run_threads(self, strategy, verbose):
+        """
+        Reset the counter and let `max_threads` threads increment it.
+
+        :param strategy: One of STRATEGIES.
+        :param verbose: Whether the threads print their progress.
+        :return: Tuple of the final value, the wall time in seconds and the total lock wait in nanoseconds.
+        """
+        self.reset()
+        threads = [threading.Thread(target=self.increment, args=(f"Thread-{i}", strategy, verbose))
+                   for i in range(self.max_threads)]
+        start_time = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start_time
+        return self.value(), elapsed, sum(wait for _, wait in self.thread_stats)
+
+    def compare_strategies(self):
+        """
+        Runs every strategy of 'shared_memory_strategies' without delays and
+        prints the final value, the increments per second and the time the
+        threads waited for locks.
+        """
+        rows = []
+        for strategy in self.config.get('shared_memory_strategies', list(STRATEGIES)):
+            value, elapsed, wait = self.run_threads(strategy, verbose=False)
+            rows.append((strategy, value, elapsed, wait))
+
+        expected = self.max_threads * INCREMENTS_PER_THREAD
+        print(f"{Color.BLUE}Blueprint: The fewer times threads meet at the same lock, the less time they spend waiting for each other.{Color.RESET}")
+        print(f"{Color.GREEN}Counter Strategies ({self.max_threads} threads, {INCREMENTS_PER_THREAD} increments each):")
+        print(f"  {'strategy':>12} {'final value':>12} {'increments/s':>14} {'lock wait ms':>13} {'wait share':>11}")
+        for strategy, value, elapsed, wait in rows:
+            share = wait / 1e9 / (elapsed * self.max_threads) if elapsed else 0.0
+            wrong = f"  (expected {expected})" if value != expected else ''
+            print(f"  {strategy:>12} {value:>12} {expected / elapsed:>14.0f} {wait / 1e6:>13.1f} {share:>10.1%}{wrong}")
+        print(Color.RESET, end='')
+
+    def run(self, strategy=None):
         """
         Run the simulation where multiple threads concurrently increment a shared counter.
 
         This method creates and manages threads, ensuring synchronized access to
         shared memory to demonstrate lock usage for thread safety.
+
+        :param strategy: The counter strategy, one of STRATEGIES ('shared_memory_strategy'
+                         from the config by default), or 'compare' to measure all of them.
         """
+        strategy = strategy or self.config.get('shared_memory_strategy', 'lock')
+        if strategy == 'compare':
+            self.compare_strategies()
+            return
+        if strategy not in STRATEGIES:
+            print(f"{Color.RED}Unknown counter strategy '{strategy}'. Use {', '.join(STRATEGIES)} or compare.{Color.RESET}")
+            return
         with self.print_lock:
             print(f"{Color.BLUE}Blueprint: Here, we're showing how threads can safely share and modify memory using locks to avoid race conditions.{Color.RESET}")
-        threads = []
-        for i in range(self.max_threads):
-            t = threading.Thread(target=self.increment, args=(f"Thread-{i}",))
-            threads.append(t)
-            t.start()
-        for t in threads:
-            t.join()
+        value, _, wait = self.run_threads(strategy, verbose=True)
+        busy = self.busy_seconds()
 
         time.sleep(self.config.get('delay_between_messages', 2))
         with self.print_lock:
-            print(f"{Color.RED}Final counter value: {self.counter}{Color.RESET}")
-            print(f"Expected count if no race condition: {self.max_threads*100000}")
+            print(f"{Color.RED}Final counter value: {value}{Color.RESET}")
+            print(f"Expected count if no race condition: {self.max_threads*INCREMENTS_PER_THREAD}")
+            print(f"Strategy: {strategy}, increments per second: {value / busy if busy else 0:.0f}, "
+                  f"lock wait time: {wait / 1e6:.1f} ms")
 
     def show_code(self):
         """
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from color import Color
+
+
+class WordCountCache:
+    """
+    Persistent cache of per-file word counts.
+
+    An entry belongs to a file path together with the normalised word set and
+    match mode it was counted with, and records the file size, modification time
+    and optionally a content hash. It is only used while all of them still match,
+    so changed files are counted again. Entries are kept in least recently used
+    order and the oldest ones are evicted once there are more than `max_entries`.
+    """
+
+    def __init__(self, path, max_entries=10000, use_hash=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.use_hash = use_hash
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.entries = OrderedDict()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, TypeError, ValueError):
+                print(f"{Color.YELLOW}Word count cache {path} is not valid JSON. Starting a new cache.{Color.RESET}")
+                return
+            if not isinstance(data, dict):
+                print(f"{Color.YELLOW}Word count cache {path} is not a JSON object. Starting a new cache.{Color.RESET}")
+                return
+            self.entries = OrderedDict((key, entry) for key, entry in data.items() if self.valid_entry(key, entry))
+            if len(self.entries) < len(data):
+                print(f"{Color.YELLOW}Dropped {len(data) - len(self.entries)} malformed entries "
+                      f"from word count cache {path}.{Color.RESET}")
+
+    @staticmethod
+    def valid_entry(key, entry):
+        """
+        Check that a loaded entry has the shape `put` writes, with counts for all words of its key.
+
+        :param key: Key string of the entry.
+        :param entry: The loaded entry.
+        :return: True if `get` can use the entry.
+        """
+        try:
+            words = json.loads(key)[2]
+        except (json.JSONDecodeError, TypeError, IndexError):
+            return False
+        if not isinstance(entry, dict) or not isinstance(entry.get('identity'), dict) \
+                or not isinstance(entry.get('counts'), dict) or not isinstance(words, list):
+            return False
+        identity = entry['identity']
+        counts = entry['counts']
+        return (all(isinstance(identity.get(field), int) for field in ('size', 'mtime_ns'))
+                and all(isinstance(word, str) and isinstance(counts.get(word), int) for word in words))
+
+    @staticmethod
+    def key(file_path, words, mode):
+        """
+        Build the key of a file counted with a word list and match mode.
+
+        :param file_path: Path to the file.
+        :param words: List of words counted in the file.
+        :param mode: The word match mode.
+        :return: Key string of the cache entry.
+        """
+        return json.dumps([os.path.abspath(file_path), mode, sorted(set(words))])
+
+    def identity(self, file_path):
+        """
+        Describe the current state of a file.
+
+        :param file_path: Path to the file.
+        :return: Dictionary with the size, modification time and, if enabled, content hash.
+        """
+        stat = os.stat(file_path)
+        identity = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if self.use_hash:
+            digest = hashlib.blake2b()
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            identity['hash'] = digest.hexdigest()
+        return identity
+
+    def get(self, file_path, words, mode, identity):
+        """
+        Look up the counts of an unchanged file.
+
+        :param file_path: Path to the file.
+        :param words: List of words to count.
+        :param mode: The word match mode.
+        :param identity: The current identity of the file (see `identity`).
+        :return: Dictionary with words and their counts, or None on a miss.
+        """
+        key = self.key(file_path, words, mode)
+        entry = self.entries.get(key)
+        if entry is None or entry['identity'] != identity:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return {word: entry['counts'][word] for word in words}
+
+    def put(self, file_path, words, mode, identity, counts):
+        """
+        Store the counts of a file, evicting the least recently used entries when full.
+
+        :param file_path: Path to the file.
+        :param words: List of words counted.
+        :param mode: The word match mode.
+        :param identity: The identity of the file when it was counted.
+        :param counts: Dictionary with words and their counts.
+        """
+        key = self.key(file_path, words, mode)
+        self.entries[key] = {'identity': identity, 'counts': counts}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def save(self):
+        """
+        Write the cache to disk, replacing the previous file only once it is complete.
+        """
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,130 @@
+import re
+from collections import Counter, deque
+
+# Whole words are maximal runs of word characters, as in WordCountSimulation's chunk boundaries.
+WORD_PATTERN = re.compile(r'\w+')
+# The same words in ASCII bytes.
+WORD_PATTERN_BYTES = re.compile(rb'\w+')
+
+
+class WordMatcher:
+    """
+    Counts a fixed list of words in lowercased text using one of three modes:
+
+    - 'count': one `str.count` call per word (substring semantics).
+    - 'substring': the same counts as 'count', but from AUTOMATON_MIN_WORDS words
+      on the text is scanned once by an Aho-Corasick automaton, no matter how
+      many words there are. With fewer words `str.count` is faster.
+    - 'whole_word': a single pass splitting the text into words and looking them
+      up in a hash table, so "example" no longer matches "counterexample".
+
+    The matcher is built once and can be pickled to worker processes.
+    """
+
+    # Word count from which the pure-Python automaton (about 20-25 MB/s) beats one
+    # `str.count` per word (about 750 MB/s for 3 words, 22 MB/s for 100).
+    AUTOMATON_MIN_WORDS = 100
+
+    def __init__(self, words, mode='count'):
+        if mode not in ('count', 'substring', 'whole_word'):
+            raise ValueError(f"Unknown word match mode '{mode}'.")
+        self.words = list(words)
+        self.mode = mode
+        self._encoded_words = [word.encode('utf-8') for word in self.words]
+        # Words with a non-word character, which text cut at a non-word byte could
+        # split. They never match in 'whole_word' mode, so only the others list them.
+        self.separated_words = [] if mode == 'whole_word' else [
+            word for word in self.words if word and not WORD_PATTERN.fullmatch(word)]
+        self._use_automaton = mode == 'substring' and len(self.words) >= self.AUTOMATON_MIN_WORDS
+        if self._use_automaton:
+            self._build_automaton()
+
+    def _build_automaton(self):
+        """
+        Build the Aho-Corasick automaton as a deterministic transition table, so
+        scanning never has to follow failure links.
+        """
+        goto = [{}]
+        outputs = [[]]
+        for index, word in enumerate(self.words):
+            if not word:
+                continue
+            state = 0
+            for char in word:
+                if char not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            outputs[state].append(index)
+
+        fail = [0] * len(goto)
+        transitions = [None] * len(goto)
+        transitions[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions[state] = {**transitions[fail[state]], **goto[state]}
+            for char, child in goto[state].items():
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(char, 0)
+                outputs[child] = outputs[child] + outputs[fail[child]]
+                queue.append(child)
+        self._transitions = transitions
+        self._outputs = outputs
+
+    def _count_automaton(self, text):
+        """
+        Scan the text once with the automaton. A match only counts when it
+        doesn't overlap the previous counted match of the same word, which gives
+        exactly the `str.count` results.
+
+        :param text: The text to scan.
+        :return: List of counts in the order of `self.words`.
+        """
+        transitions = self._transitions
+        outputs = self._outputs
+        lengths = [len(word) for word in self.words]
+        counts = [0] * len(self.words)
+        last_end = [0] * len(self.words)
+        state = 0
+        for position, char in enumerate(text, 1):
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                for index in outputs[state]:
+                    if position - lengths[index] >= last_end[index]:
+                        counts[index] += 1
+                        last_end[index] = position
+        return counts
+
+    def count(self, text):
+        """
+        Count the words in a lowercased text.
+
+        :param text: The text to count the words in.
+        :return: Dictionary with words and their counts.
+        """
+        if self.mode == 'whole_word':
+            found = Counter(WORD_PATTERN.findall(text))
+            return {word: found[word] for word in self.words}
+        if self._use_automaton:
+            counts = self._count_automaton(text)
+            return {word: count if word else text.count(word) for word, count in zip(self.words, counts)}
+        return {word: text.count(word) for word in self.words}
+
+    def count_bytes(self, data):
+        """
+        Count the words in lowercased ASCII bytes, without decoding them. Gives
+        the same counts as `count` on the decoded text.
+
+        :param data: Bytes-like object with lowercased ASCII text.
+        :return: Dictionary with words and their counts.
+        """
+        if self.mode == 'whole_word':
+            found = Counter(WORD_PATTERN_BYTES.findall(data))
+            return {word: found[encoded] for word, encoded in zip(self.words, self._encoded_words)}
+        if self._use_automaton:
+            return self.count(bytes(data).decode('ascii'))
+        return {word: data.count(encoded) for word, encoded in zip(self.words, self._encoded_words)}
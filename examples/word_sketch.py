@@ -0,0 +1,173 @@
+import hashlib
+
+import numpy as np
+
+
+def word_hashes(words):
+    """
+    Hash words to two 64-bit values each. Unlike the built-in `hash`, the result
+    is the same in every process, so sketches from different workers can be merged.
+
+    :param words: List of words.
+    :return: Tuple of two NumPy uint64 arrays.
+    """
+    digests = b''.join(hashlib.blake2b(word.encode('utf-8'), digest_size=16).digest() for word in words)
+    hashes = np.frombuffer(digests, dtype=np.uint64).reshape(-1, 2)
+    return hashes[:, 0], hashes[:, 1] | np.uint64(1)
+
+
+class CountMinSketch:
+    """
+    Count-min sketch: a `depth` x `width` table of counters. Every word increments
+    one counter per row and its estimate is the smallest of them, which never
+    underestimates the true count. Memory is fixed no matter how many distinct
+    words are added, and two sketches of the same shape merge by adding tables.
+    """
+
+    def __init__(self, width=1 << 16, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+
+    def _indexes(self, words):
+        """
+        Compute the counter index of every word in every row (double hashing).
+
+        :param words: List of words.
+        :return: NumPy array of shape (depth, len(words)) with flat table indexes.
+        """
+        first, second = word_hashes(words)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        columns = (first[None, :] + rows * second[None, :]) % np.uint64(self.width)
+        return (rows * np.uint64(self.width) + columns).astype(np.int64)
+
+    def add(self, counts):
+        """
+        Add pre-aggregated word counts to the sketch.
+
+        :param counts: Dictionary (or Counter) with words and their counts.
+        """
+        if not counts:
+            return
+        indexes = self._indexes(list(counts))
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+        np.add.at(self.table.reshape(-1), indexes.ravel(), np.tile(values, self.depth))
+
+    def estimate(self, words):
+        """
+        Estimate the counts of words.
+
+        :param words: List of words.
+        :return: NumPy int64 array with the estimated count of every word.
+        """
+        if not words:
+            return np.zeros(0, dtype=np.int64)
+        return self.table.reshape(-1)[self._indexes(words)].min(axis=0)
+
+    def merge(self, other):
+        """
+        Add the counters of another sketch with the same width and depth.
+
+        :param other: The CountMinSketch to merge into this one.
+        :return: This sketch.
+        """
+        self.table += other.table
+        return self
+
+
+class HeavyHitters:
+    """
+    Mergeable Misra-Gries summary keeping at most about `capacity` candidate words.
+    Every word occurring more than total / capacity times is guaranteed to stay
+    among the candidates.
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counters = {}
+
+    def update(self, counts):
+        """
+        Add pre-aggregated word counts, pruning once there are twice too many candidates.
+
+        :param counts: Dictionary (or Counter) with words and their counts.
+        """
+        counters = self.counters
+        for word, count in counts.items():
+            counters[word] = counters.get(word, 0) + count
+        if len(counters) > 2 * self.capacity:
+            self.prune()
+
+    def prune(self):
+        """
+        Subtract the (capacity + 1)-th largest counter from all counters and drop
+        the ones that are no longer positive.
+        """
+        if len(self.counters) <= self.capacity:
+            return
+        threshold = sorted(self.counters.values(), reverse=True)[self.capacity]
+        self.counters = {word: count - threshold for word, count in self.counters.items() if count > threshold}
+
+    def merge(self, other):
+        """
+        Merge another summary into this one.
+
+        :param other: The HeavyHitters summary to merge.
+        :return: This summary.
+        """
+        self.update(other.counters)
+        return self
+
+
+class VocabularySketch:
+    """
+    Approximate word frequencies in bounded memory: a count-min sketch estimates
+    the counts and a heavy-hitters summary remembers which words may be frequent.
+    """
+
+    def __init__(self, width=1 << 16, depth=4, capacity=1000):
+        self.sketch = CountMinSketch(width, depth)
+        self.heavy_hitters = HeavyHitters(capacity)
+        self.total = 0
+
+    def update(self, counts):
+        """
+        Add pre-aggregated word counts.
+
+        :param counts: Dictionary (or Counter) with words and their counts.
+        """
+        self.sketch.add(counts)
+        self.heavy_hitters.update(counts)
+        self.total += sum(counts.values())
+
+    def merge(self, other):
+        """
+        Merge another vocabulary sketch with the same parameters into this one.
+
+        :param other: The VocabularySketch to merge.
+        :return: This sketch.
+        """
+        self.sketch.merge(other.sketch)
+        self.heavy_hitters.merge(other.heavy_hitters)
+        self.total += other.total
+        return self
+
+    def top_k(self, k):
+        """
+        Return the K most frequent words with their estimated counts.
+
+        :param k: The number of words to return.
+        :return: List of (word, estimated count) tuples, most frequent first.
+        """
+        self.heavy_hitters.prune()
+        words = list(self.heavy_hitters.counters)
+        estimates = self.sketch.estimate(words)
+        ranked = sorted(zip(words, estimates.tolist()), key=lambda item: (-item[1], item[0]))
+        return ranked[:k]
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory used by the counters of the sketch and the summary.
+        """
+        return self.sketch.table.nbytes + 2 * 8 * len(self.heavy_hitters.counters)
@@ -1,19 +1,43 @@
+import bz2
+import gzip
+import itertools
+import json
+import lzma
+import multiprocessing
+import os
+import queue
+import tempfile
 import threading
+from multiprocessing import shared_memory
 import unittest
+from collections import Counter
 from io import StringIO
 from unittest.mock import patch, MagicMock, mock_open
 
 import numpy as np
 
 from UI.interactive_menu import InteractiveMenu
+from color import Color
+from examples.async_messages import AsyncMessages
+from examples.compressed_input import MemberBoundaryError, member_ranges
+from examples.latency_histogram import HALF, LatencyHistogram, merge_histograms
 from examples.message import Messages
-from examples.mp_calculation import MultiprocessingSimulation
+from examples.mp_calculation import DTYPES, MultiprocessingSimulation, _shared_blocks, random_array
 from examples.mp_word_count import WordCountSimulation
-from examples.prime_number_cal import PrimeNumberSimulation, is_prime
-from examples.shared_memory import SharedMemory
+from examples.prime_cache import PrimeBitmapCache
+from examples.process_messages import (HEADER, TRANSPORTS, PipeTransport, QueueTransport, SharedRingTransport,
+                                       benchmark_transport, handle_record, run_pipeline)
+from examples.reductions import Reduction, combine_states, make_reductions, reduce_array
+from examples.prime_number_cal import (PrimeNumberSimulation, is_prime, is_prime_many, iter_primes, miller_rabin,
+                                       segmented_sieve)
+from examples.ring_buffer import RingBuffer, spsc_benchmark
+from examples.shared_memory import STRATEGIES, SharedMemory
 
 from config.config import Config
 from examples.thread_synchronization import ThreadSynchronization
+from examples.word_count_cache import WordCountCache
+from examples.word_matcher import WordMatcher
+from examples.word_sketch import CountMinSketch, HeavyHitters
 
 
 class TestMessages(unittest.TestCase):
@@ -38,6 +62,426 @@ class TestMessages(unittest.TestCase):
         self.messages.consumer()
         self.assertTrue(self.messages.message_queue.empty())
 
+    def test_benchmark_delivers_every_message(self):
+        """
+        Test that every combination of producers, consumers and batch sizes delivers all messages and stops.
+        """
+        for num_producers, num_consumers, batch_size in [(1, 1, 1), (3, 2, 16), (2, 4, 7)]:
+            throughput, received = self.messages.benchmark(num_producers, num_consumers, batch_size, 1001)
+            self.assertEqual(received, 1001)
+            self.assertGreater(throughput, 0)
+
+    def test_run_benchmark_table(self):
+        """
+        Test that the benchmark mode prints one row per combination.
+        """
+        self.messages.config.data = {'message_benchmark': True, 'message_benchmark_messages': 500,
+                                     'message_benchmark_producers': [1, 2], 'message_benchmark_consumers': [2],
+                                     'message_benchmark_batch_sizes': [1, 10]}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.messages.run()
+        rows = [line for line in mock_stdout.getvalue().splitlines() if line.rstrip().endswith('x')]
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(rows[0].rstrip().endswith("1.00x"))
+
+    def test_asyncio_engine_with_backpressure(self):
+        """
+        Test that the asyncio engine handles every message with a queue much smaller than the message count.
+        """
+        self.messages.config.data = {'message_queue_size': 2}
+        engine = AsyncMessages(self.messages.config)
+        throughput, handled = engine.benchmark(3, 50, 400, 0.001)
+        self.assertEqual(handled, 400)
+        self.assertGreater(throughput, 0)
+
+    def test_ring_transport(self):
+        """
+        Test that the simulation runs unchanged with the ring buffer as its queue.
+        """
+        self.messages.config.data = {'message_count': 3, 'delay_between_messages': 0, 'message_transport': 'ring',
+                                     'message_queue_size': 2}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.messages.run()
+        self.assertIsInstance(self.messages.message_queue, RingBuffer)
+        self.assertEqual(mock_stdout.getvalue().count('Consumer: Received'), 3)
+        self.assertTrue(self.messages.message_queue.empty())
+
+    def test_ring_transport_benchmark(self):
+        """
+        Test that the benchmark only measures one producer and one consumer with the ring,
+        and that the ring refuses several producers.
+        """
+        self.messages.config.data = {'message_transport': 'ring', 'message_benchmark': True,
+                                     'message_benchmark_messages': 1000, 'message_benchmark_producers': [1, 2],
+                                     'message_benchmark_consumers': [1, 2], 'message_benchmark_batch_sizes': [1, 8]}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.messages.run()
+        rows = [line.split()[:3] for line in mock_stdout.getvalue().splitlines() if line.strip().endswith('x')]
+        self.assertEqual(rows, [['1', '1', '1'], ['1', '1', '8']])
+        with self.assertRaises(ValueError):
+            self.messages.new_queue(2, 1)
+
+    def test_latency_report(self):
+        """
+        Test that the simulation reports the queueing delay of every message and exports it as JSON.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'latency.json')
+            self.messages.config.data = {'message_count': 3, 'delay_between_messages': 0,
+                                         'message_latency_json': path}
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                self.messages.run()
+            self.assertIn('Queueing delay of 3 messages', mock_stdout.getvalue())
+            for key in ('p50', 'p90', 'p99', 'p99.9', 'max'):
+                self.assertIn(f'{key}: ', mock_stdout.getvalue())
+            with open(path, encoding='utf-8') as file:
+                exported = json.load(file)
+        self.assertEqual(exported[0]['latency_ns']['count'], 3)
+        self.assertEqual(sum(count for _, count in exported[0]['latency_ns']['buckets']), 3)
+
+    def test_benchmark_latency_histograms(self):
+        """
+        Test that every message is recorded once in the consumers' histograms, batched or not.
+        """
+        for num_producers, num_consumers, batch_size in [(1, 1, 1), (2, 3, 1), (2, 2, 16)]:
+            histograms = []
+            self.messages.benchmark(num_producers, num_consumers, batch_size, 10000, latency_histograms=histograms)
+            self.assertEqual(len(histograms), num_consumers)
+            self.assertEqual(merge_histograms(histograms).count, 10000)
+
+    def test_benchmark_without_latency(self):
+        """
+        Test that the benchmark table leaves out the latency columns when latency recording is off.
+        """
+        self.messages.config.data = {'message_benchmark': True, 'message_benchmark_messages': 200,
+                                     'message_benchmark_producers': [1], 'message_benchmark_consumers': [1],
+                                     'message_benchmark_batch_sizes': [1], 'message_latency': False}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.messages.run()
+        self.assertNotIn('p99 us', mock_stdout.getvalue())
+        self.assertIn('1.00x', mock_stdout.getvalue())
+
+    def test_compare_buffers(self):
+        """
+        Test that 'messages run ring' reports every structure without lost messages.
+        """
+        self.messages.config.data = {'message_benchmark_messages': 2000, 'message_benchmark_batch_sizes': [1, 16]}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.messages.run('ring')
+        output = mock_stdout.getvalue()
+        rows = [line.split()[:2] for line in output.splitlines() if line.split()[:1] in (['queue'], ['deque'], ['ring'])]
+        self.assertEqual(rows, [['queue', '1'], ['deque', '1'], ['ring', '1'], ['deque', '16'], ['ring', '16']])
+        self.assertNotIn('lost', output)
+
+    def test_compare_engines(self):
+        """
+        Test that the comparison reports both engines for every consumer count.
+        """
+        self.messages.config.data = {'message_compare_consumers': [2, 20], 'message_handler_latency': 0.001,
+                                     'message_async_producers': 2}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.messages.run('compare')
+        rows = [line.split() for line in mock_stdout.getvalue().splitlines() if 'threads' in line.split()
+                or 'asyncio' in line.split()]
+        self.assertEqual([(row[0], row[1]) for row in rows],
+                         [('2', 'threads'), ('2', 'asyncio'), ('20', 'threads'), ('20', 'asyncio')])
+
+    def test_compare_engines_with_ring_transport(self):
+        """
+        Test that the engine comparison uses queue.Queue even when the ring transport is configured.
+        """
+        self.messages.config.data = {'message_compare_consumers': [3], 'message_handler_latency': 0.001,
+                                     'message_async_producers': 2, 'message_transport': 'ring'}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.messages.run('compare')
+        rows = [line.split() for line in mock_stdout.getvalue().splitlines() if 'threads' in line.split()]
+        self.assertEqual(len(rows), 1)
+        self.assertNotEqual(rows[0][2], 'failed')
+        self.assertEqual(self.messages.config.get('message_transport'), 'ring')
+
+    def test_transport_follows_config_between_runs(self):
+        """
+        Test that switching the transport back to 'queue' replaces the ring buffer of an earlier run.
+        """
+        with patch.object(Messages, 'producer'), patch.object(Messages, 'consumer'), \
+                patch('sys.stdout', new_callable=StringIO):
+            self.messages.config.data = {'message_transport': 'ring'}
+            self.messages.run()
+            self.assertIsInstance(self.messages.message_queue, RingBuffer)
+            self.messages.config.data = {'message_transport': 'queue'}
+            self.messages.run()
+            self.assertIsInstance(self.messages.message_queue, queue.Queue)
+
+
+class TestProcessMessages(unittest.TestCase):
+    def test_transports_deliver_in_order(self):
+        """
+        Test that every transport delivers all records, unchanged and in order, to another process.
+        """
+        for name, transport_class in TRANSPORTS.items():
+            with self.subTest(transport=name):
+                transport = transport_class(16, 4)
+                records = [bytes([i]) * 16 for i in range(50)]
+                producer = multiprocessing.Process(target=_send_records, args=(transport, records))
+                producer.start()
+                try:
+                    received = [bytes(transport.recv()) for _ in records]
+                finally:
+                    producer.join()
+                    transport.close()
+                    if isinstance(transport, SharedRingTransport):
+                        transport.unlink()
+                self.assertEqual(received, records)
+
+    def test_shared_ring_wraps_around(self):
+        """
+        Test that the ring reuses its slots within one process while the consumer keeps up.
+        """
+        ring = SharedRingTransport(HEADER.size, 2)
+        try:
+            for i in range(5):
+                ring.send(HEADER.pack(0, i))
+                self.assertEqual(HEADER.unpack(ring.recv())[1], i)
+        finally:
+            ring.close()
+            ring.unlink()
+
+    def test_benchmark_transport(self):
+        """
+        Test that the benchmark measures a latency for every message and rejects unknown transports.
+        """
+        for name in TRANSPORTS:
+            throughput, histogram = benchmark_transport(name, 4, 200, 8)
+            self.assertGreater(throughput, 0)
+            self.assertEqual(histogram.count, 200)
+            self.assertGreater(histogram.maximum, 0)
+        with self.assertRaises(ValueError):
+            benchmark_transport('carrier_pigeon', 64, 10)
+
+    def test_queue_copies_reused_buffers(self):
+        """
+        Test that records sent from one reused buffer arrive through the queue as the distinct values they had.
+        """
+        transport = QueueTransport(HEADER.size, 100)
+        payload = bytearray(HEADER.size)
+        for i in range(50):
+            HEADER.pack_into(payload, 0, 0, i)
+            transport.send(payload)
+        received = [HEADER.unpack(transport.recv())[1] for _ in range(50)]
+        transport.close()
+        self.assertEqual(received, list(range(50)))
+
+    def test_pipe_reports_eof_of_dead_producer(self):
+        """
+        Test that the consumer of a pipe gets EOFError once the producer is gone, instead of waiting forever.
+        """
+        transport = PipeTransport(4, 1)
+        producer = multiprocessing.Process(target=_send_records, args=(transport, [b'last']))
+        producer.start()
+        transport.as_receiver()
+        producer.join()
+        self.assertEqual(transport.recv(), b'last')
+        with self.assertRaises(EOFError):
+            transport.recv()
+        transport.close()
+
+    def test_pipeline_handles_every_message_once(self):
+        """
+        Test that several consumer processes handle every record exactly once with every transport.
+        """
+        expected = sum(handle_record(HEADER.pack(0, number) + bytes(16), 3) for number in range(301))
+        for name in TRANSPORTS:
+            throughput, histogram, checksum = run_pipeline(name, 32, 301, 4, consumers=3, rounds=3, timeout=60)
+            self.assertEqual(histogram.count, 301)
+            self.assertEqual(checksum, expected, name)
+
+    def test_pipeline_raises_when_a_consumer_dies(self):
+        """
+        Test that the parent raises instead of hanging when a consumer process fails.
+        """
+        if multiprocessing.get_start_method() != 'fork':
+            self.skipTest("The failing handler is only inherited by forked processes.")
+        with patch('examples.process_messages.handle_record', side_effect=RuntimeError('handler failed')):
+            for name in TRANSPORTS:
+                with self.assertRaises(RuntimeError):
+                    run_pipeline(name, 32, 1000, 4, consumers=2, rounds=1, timeout=60)
+
+    def test_run_processes(self):
+        """
+        Test that 'messages run processes' handles every message in consumer processes.
+        """
+        messages = Messages()
+        messages.config.data = {'message_process_messages': 300, 'message_process_consumers': 2,
+                                'message_process_transport': 'pipe', 'message_process_handler_rounds': 2}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            messages.run('processes')
+        self.assertIn('Messages handled: 300 of 300', mock_stdout.getvalue())
+        self.assertIn('p99.9: ', mock_stdout.getvalue())
+
+    def test_compare_transports(self):
+        """
+        Test that 'messages run processes' with the benchmark on reports every transport for every message size.
+        """
+        messages = Messages()
+        messages.config.data = {'message_process_sizes': [8, 256], 'message_process_messages': 100,
+                                'message_benchmark': True}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            messages.run('processes')
+        rows = [line.split()[:2] for line in mock_stdout.getvalue().splitlines()
+                if len(line.split()) > 1 and line.split()[1] in TRANSPORTS]
+        self.assertEqual(rows, [[str(size), name] for size in (8, 256) for name in TRANSPORTS])
+
+
+def _send_records(transport, records):
+    for record in records:
+        transport.send(record)
+    transport.close()
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_wraps_around_in_order(self):
+        """
+        Test that batches crossing the end of the slots come out in order.
+        """
+        ring = RingBuffer(5)
+        ring.put_many([0, 1, 2])
+        self.assertEqual(ring.get_many(2), [0, 1])
+        ring.put_many([3, 4, 5, 6])
+        self.assertEqual(ring.qsize(), 5)
+        self.assertTrue(ring.full())
+        self.assertEqual(ring.get_many(10), [2, 3, 4, 5, 6])
+        self.assertTrue(ring.empty())
+
+    def test_put_and_get_single_items(self):
+        """
+        Test the queue.Queue style methods, including None as an item.
+        """
+        ring = RingBuffer(2)
+        ring.put(None)
+        ring.put('message')
+        self.assertIsNone(ring.get())
+        self.assertEqual(ring.get(), 'message')
+
+    def test_timeouts(self):
+        """
+        Test that waiting on an empty or a full ring ends with queue.Empty or queue.Full.
+        """
+        ring = RingBuffer(1)
+        with self.assertRaises(queue.Empty):
+            ring.get(timeout=0.01)
+        with self.assertRaises(queue.Empty):
+            ring.get_many(3, block=False)
+        ring.put(1)
+        with self.assertRaises(queue.Full):
+            ring.put(2, timeout=0.01)
+        with self.assertRaises(queue.Full):
+            ring.put_many([2, 3], block=False)
+        self.assertEqual(ring.get(), 1)
+
+    def test_stress_ordering_and_loss(self):
+        """
+        Test that no item is lost, duplicated or reordered when both threads
+        move batches of varying sizes through a tiny ring that fills and empties constantly.
+        """
+        ring = RingBuffer(3)
+        total = 100000
+        received = []
+
+        def produce():
+            position = 0
+            size = 1
+            while position < total:
+                ring.put_many(range(position, min(position + size, total)))
+                position += size
+                size = size % 7 + 1
+
+        def consume():
+            size = 1
+            while len(received) < total:
+                received.extend(ring.get_many(size))
+                size = size % 5 + 1
+
+        threads = [threading.Thread(target=consume), threading.Thread(target=produce)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(received, list(range(total)))
+
+    def test_stress_single_items(self):
+        """
+        Test put and get of single items between two threads.
+        """
+        ring = RingBuffer(2)
+        total = 50000
+        producer = threading.Thread(target=lambda: [ring.put(i) for i in range(total)])
+        producer.start()
+        received = [ring.get(timeout=10) for _ in range(total)]
+        producer.join()
+        self.assertEqual(received, list(range(total)))
+
+    def test_spsc_benchmark(self):
+        """
+        Test that every structure delivers all messages in order.
+        """
+        for structure in ('queue', 'deque', 'ring'):
+            for batch_size in (1, 16):
+                throughput, in_order = spsc_benchmark(structure, 5000, batch_size, 8)
+                self.assertGreater(throughput, 0)
+                self.assertTrue(in_order, (structure, batch_size))
+        with self.assertRaises(ValueError):
+            spsc_benchmark('stack', 10, 1, 8)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_buckets_are_contiguous(self):
+        """
+        Test that every value falls into the bucket whose range contains it, without gaps between buckets.
+        """
+        histogram = LatencyHistogram()
+        previous_high = -1
+        for index in range(6 * HALF):
+            low, high = histogram.bucket_range(index)
+            self.assertEqual(low, previous_high + 1)
+            previous_high = high
+        for value in (0, 1, 255, 256, 257, 511, 512, 10 ** 6, 2 ** 40 + 12345):
+            single = LatencyHistogram()
+            single.record(value)
+            low, high = single.bucket_range(int(np.flatnonzero(single.counts)[0]))
+            self.assertTrue(low <= value <= high)
+            self.assertLessEqual(high - low, max(value, 1) / HALF)
+
+    def test_record_many_matches_record(self):
+        """
+        Test that bucketing with NumPy gives the same histogram as recording one value at a time.
+        """
+        values = np.random.default_rng(3).lognormal(10, 2, 5000).astype(np.int64).tolist() + [-5, 0, 255, 256]
+        one_by_one = LatencyHistogram()
+        for value in values:
+            one_by_one.record(value, 2)
+        at_once = LatencyHistogram()
+        at_once.record_many(values, [2] * len(values))
+        np.testing.assert_array_equal(one_by_one.counts, at_once.counts)
+        self.assertEqual((one_by_one.count, one_by_one.maximum), (at_once.count, at_once.maximum))
+
+    def test_percentiles_and_merge(self):
+        """
+        Test that the percentiles of merged histograms are within the bucket precision of the exact ones.
+        """
+        values = np.random.default_rng(5).lognormal(12, 1, 20000).astype(np.int64)
+        parts = [LatencyHistogram() for _ in range(4)]
+        for part, chunk in zip(parts, np.array_split(values, 4)):
+            part.record_many(chunk)
+        summary = merge_histograms(parts).summary()
+        self.assertEqual(summary['count'], values.size)
+        self.assertEqual(summary['max'], values.max())
+        ordered = np.sort(values)
+        for percent, rank in ((50, 10000), (90, 18000), (99, 19800), (99.9, 19980)):
+            exact = ordered[rank - 1]
+            self.assertAlmostEqual(summary[f'p{percent:g}'], exact, delta=exact / HALF + 1)
+        self.assertEqual(LatencyHistogram().summary()['p99'], 0)
+
 
 class TestSharedMemory(unittest.TestCase):
     def setUp(self):
@@ -60,6 +504,50 @@ class TestSharedMemory(unittest.TestCase):
 
         self.assertEqual(self.shared_memory.counter, 200000)
 
+    def test_strategies_reach_the_same_value(self):
+        """
+        Test that every counter strategy ends at the same value, also with stripes shared by several threads
+        and flush intervals and batch sizes that don't divide the number of increments.
+        """
+        self.shared_memory.config.data.update({'shared_memory_stripes': 3, 'shared_memory_flush_interval': 777,
+                                               'shared_memory_batch_size': 333})
+        self.shared_memory.max_threads = 5
+        for strategy in STRATEGIES:
+            value, elapsed, wait = self.shared_memory.run_threads(strategy, verbose=False)
+            self.assertEqual(value, 500000, strategy)
+            self.assertGreater(elapsed, 0)
+            self.assertGreaterEqual(wait, 0)
+            self.assertEqual(len(self.shared_memory.thread_stats), 5)
+
+    def test_run_reports_throughput_and_lock_wait(self):
+        """
+        Test that a run with a strategy from the config reports the final value, increments per second and lock wait.
+        """
+        self.shared_memory.config.data['shared_memory_strategy'] = 'thread_local'
+        self.shared_memory.max_threads = 2
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.shared_memory.run()
+        output = mock_stdout.getvalue()
+        self.assertIn('Final counter value: 200000', output)
+        self.assertIn('Strategy: thread_local, increments per second: ', output)
+        self.assertIn('lock wait time: ', output)
+
+    def test_compare_strategies(self):
+        """
+        Test that the comparison prints one row per strategy, all with the expected value.
+        """
+        self.shared_memory.config.data.update({'shared_memory_strategy': 'compare',
+                                               'shared_memory_strategies': ['lock', 'batched']})
+        self.shared_memory.max_threads = 2
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.shared_memory.run()
+        rows = [line.split() for line in mock_stdout.getvalue().splitlines()
+                if line.split()[:1] in (['lock'], ['batched'])]
+        self.assertEqual([row[:2] for row in rows], [['lock', '200000'], ['batched', '200000']])
+        self.assertNotIn('expected', mock_stdout.getvalue())
+        with self.assertRaises(ValueError):
+            self.shared_memory.increment('Thread-0', 'optimistic', verbose=False)
+
 class TestInteractiveMenu(unittest.TestCase):
     def setUp(self):
         self.menu = InteractiveMenu()
@@ -120,6 +608,25 @@ class TestInteractiveMenu(unittest.TestCase):
             self.menu.do_messages('run')
             mock_run.assert_called_once()
 
+    def test_run_messages_with_engine(self):
+        """
+        Test that an engine given after 'run' is passed to the Messages simulation.
+        """
+        with patch.object(AsyncMessages, 'run', return_value=None) as mock_run:
+            self.menu.do_messages('run asyncio')
+            mock_run.assert_called_once()
+        with patch('builtins.print') as mock_print:
+            self.menu.do_thread_synchronization('run fast')
+            mock_print.assert_called_with(f"{Color.RED}Too many options for 'thread_synchronization'.{Color.RESET}")
+
+    def test_run_shared_memory_with_strategy(self):
+        """
+        Test that a counter strategy given after 'run' is passed to the Shared Memory simulation.
+        """
+        with patch.object(SharedMemory, 'run', return_value=None) as mock_run:
+            self.menu.do_shared_memory('run striped')
+            mock_run.assert_called_once_with('striped')
+
     def test_show_messages_simulation_code(self):
         """
         Test showing the code for the Messages simulation.
@@ -308,6 +815,190 @@ class TestMultiprocessingSimulation(unittest.TestCase):
         result = sim.worker(array)
         self.assertEqual(result, 15)  # 1 + 2 + 3 + 4 + 5 = 15
 
+    def test_default_sum_is_tiled(self):
+        """
+        Test that the plain sum of the default run goes over tiles of 'array_block_bytes' bytes.
+        """
+        sim = MultiprocessingSimulation()
+        sim.config.data = {'array_block_bytes': 64}
+        array = np.arange(1000, dtype=np.float64)
+        with patch('examples.mp_calculation.reduce_array', wraps=reduce_array) as tiled:
+            self.assertEqual(sim.reduce(array), 499500.0)
+        self.assertEqual(tiled.call_args.args[2], 8)
+
+    def test_shared_worker_reads_block_in_place(self):
+        """
+        Test that the shared-memory worker sums the array at the given offset of a block.
+        """
+        sim = MultiprocessingSimulation()
+        block = shared_memory.SharedMemory(create=True, size=10 * 8)
+        try:
+            arrays = np.ndarray((2, 5), dtype=np.float64, buffer=block.buf)
+            arrays[:] = [[1, 2, 3, 4, 5], [10, 20, 30, 40, 50]]
+            self.assertEqual(sim.shared_worker((block.name, (5,), '<f8', 40)), 150)
+            del arrays
+        finally:
+            _shared_blocks.pop(block.name).close()
+            block.close()
+            block.unlink()
+
+    def test_worker_generation_is_reproducible(self):
+        """
+        Test that arrays generated in workers depend only on the seed, not on the number of processes.
+        """
+        outputs = []
+        for num_processes in (1, 3):
+            sim = MultiprocessingSimulation()
+            sim.config.data = {'array_size': 1000, 'num_processes': num_processes, 'num_arrays': 5,
+                               'array_worker_generation': True, 'array_seed': 12345}
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                sim.run()
+            outputs.append(mock_stdout.getvalue())
+        total = [line for line in outputs[0].splitlines() if "Total sum" in line]
+        self.assertEqual(total, [line for line in outputs[1].splitlines() if "Total sum" in line])
+        self.assertIn("- Seed: 12345", outputs[0])
+        self.assertIn("Generation time (summed over workers)", outputs[0])
+
+        sim = MultiprocessingSimulation()
+        children = np.random.SeedSequence(12345).spawn(2)
+        first, _, _ = sim.generate_and_reduce((children[0], 1000))
+        self.assertEqual(first, sim.generate_and_reduce((np.random.SeedSequence(12345).spawn(2)[0], 1000))[0])
+        self.assertNotEqual(first, sim.generate_and_reduce((children[1], 1000))[0])
+
+    def test_run_shared_memory_compares_with_pickling(self):
+        """
+        Test that the shared-memory mode reports both timings and matching sums.
+        """
+        sim = MultiprocessingSimulation()
+        sim.config.data = {'array_size': 1000, 'num_processes': 2, 'num_arrays': 4, 'array_shared_memory': True}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            sim.run()
+        output = mock_stdout.getvalue()
+        self.assertIn("Results match the pickling path: True", output)
+        self.assertIn("Time taken (shared memory)", output)
+        self.assertIn("Time taken (pickling)", output)
+
+
+class TestReductions(unittest.TestCase):
+
+    def test_reductions_match_numpy(self):
+        """
+        Test that all reductions, computed in blocks and merged across uneven parts, match NumPy.
+        """
+        data = np.random.default_rng(7).random(10007)
+        reductions = make_reductions(['sum', 'mean', 'variance', 'std', 'min', 'max', 'histogram'], 8)
+        parts = np.split(data, [1, 500, 4000, 4001])
+        results = combine_states(reductions, [reduce_array(part, reductions, 1000) for part in parts])
+        self.assertAlmostEqual(results['sum'], data.sum(), places=9)
+        self.assertAlmostEqual(results['mean'], data.mean(), places=12)
+        self.assertAlmostEqual(results['variance'], data.var(), places=12)
+        self.assertAlmostEqual(results['std'], data.std(), places=12)
+        self.assertEqual((results['min'], results['max']), (data.min(), data.max()))
+        np.testing.assert_array_equal(results['histogram'], np.histogram(data, np.linspace(0, 1, 9))[0])
+
+    def test_combine_is_numerically_stable(self):
+        """
+        Test the compensated sum and the variance of data with a large offset.
+        """
+        reductions = make_reductions(['sum', 'variance'])
+        parts = [np.array([1e16]), np.array([1.0]), np.array([-1e16]), np.array([1.0])]
+        self.assertEqual(combine_states(reductions, [reduce_array(part, reductions) for part in parts])['sum'], 2.0)
+        data = 1e9 + np.random.default_rng(3).random(4096)
+        states = [reduce_array(part, reductions, 100) for part in np.array_split(data, 7)]
+        self.assertAlmostEqual(combine_states(reductions, states)['variance'], np.var(data - 1e9), places=9)
+
+    def test_npy_files_are_reduced_in_place(self):
+        """
+        Test reductions over memory-mapped .npy files split into chunks, including a Fortran-ordered file.
+        """
+        rng = np.random.default_rng(11)
+        arrays = [rng.random(5000), np.asfortranarray(rng.random((30, 40))), rng.integers(0, 100, 777)]
+        data = np.concatenate([array.ravel() for array in arrays]).astype(np.float64)
+        with tempfile.TemporaryDirectory() as directory:
+            for i, array in enumerate(arrays):
+                np.save(os.path.join(directory, f"{i}.npy"), array)
+            sim = MultiprocessingSimulation()
+            sim.config.data = {'array_inputs': [directory], 'num_processes': 2, 'array_chunk_elements': 1000,
+                               'array_reductions': ['sum', 'mean', 'max']}
+            self.assertEqual(len(sim.collect_arrays()), 3)
+            result, nbytes, _ = sim.file_worker((os.path.join(directory, "1.npy"), 100, 300))
+            self.assertEqual(nbytes, 200 * 8)
+            self.assertEqual(combine_states(sim.reductions(), [result])['max'], arrays[1].ravel('K')[100:300].max())
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                sim.run()
+        output = mock_stdout.getvalue()
+        self.assertIn("- Number of chunks: 8", output)
+        self.assertIn("GB/s", output)
+        mean = float(output.split("  - mean: ")[1].splitlines()[0])
+        self.assertAlmostEqual(mean, data.mean(), places=12)
+
+    def test_dtypes_and_tile_sizes(self):
+        """
+        Test that every dtype is generated as requested and reduced the same with any tile size.
+        """
+        sim = MultiprocessingSimulation()
+        sim.config.data = {'array_reductions': ['sum', 'max']}
+        for dtype in DTYPES:
+            array = random_array(5000, dtype, np.random.default_rng(1))
+            self.assertEqual(array.dtype, np.dtype(dtype))
+            results = []
+            for block_bytes in (64, 4096, 1 << 20):
+                sim.config.data['array_block_bytes'] = block_bytes
+                results.append(sim.combine([sim.reduce(array)]))
+            self.assertEqual(results[0]['max'], array.max())
+            for result in results[1:]:
+                # float32 blocks are summed in float32, so the tile size changes the rounding.
+                self.assertTrue(np.isclose(result['sum'], results[0]['sum'], rtol=1e-6 if dtype == 'float32' else 1e-12))
+        with self.assertRaises(ValueError):
+            random_array(10, 'uint8')
+
+    def test_benchmark_table(self):
+        """
+        Test that the benchmark reports a row for every dtype and tile size.
+        """
+        sim = MultiprocessingSimulation()
+        sim.config.data = {'array_size': 2000, 'num_processes': 2, 'num_arrays': 2, 'array_benchmark': True,
+                           'array_benchmark_dtypes': ['float32', 'int64'], 'array_benchmark_block_bytes': [1024]}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            sim.run()
+        rows = [line.split() for line in mock_stdout.getvalue().splitlines() if line.startswith("  float32")
+                or line.startswith("  int64")]
+        self.assertEqual([(row[0], row[1]) for row in rows],
+                         [('float32', '1'), ('float32', 'array'), ('int64', '1'), ('int64', 'array')])
+        self.assertEqual(rows[2][-1], rows[3][-1])
+
+    def test_unknown_reduction(self):
+        """
+        Test that an unknown reduction name is rejected.
+        """
+        with self.assertRaises(ValueError):
+            make_reductions(['median'])
+
+    def test_incomplete_reduction_cannot_be_created(self):
+        """
+        Test that a reduction without `combine` fails when it is created, not while reducing.
+        """
+        class PartialOnly(Reduction):
+            def partial(self, block):
+                return block.sum()
+
+        with self.assertRaises(TypeError):
+            PartialOnly()
+
+    def test_run_with_several_reductions(self):
+        """
+        Test that the simulation reports every configured reduction.
+        """
+        sim = MultiprocessingSimulation()
+        sim.config.data = {'array_size': 1000, 'num_processes': 2, 'num_arrays': 3,
+                           'array_reductions': ['sum', 'std', 'histogram'], 'array_histogram_bins': 4}
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            sim.run()
+        output = mock_stdout.getvalue()
+        self.assertIn("  - std: ", output)
+        histogram = output.split("  - histogram: ")[1].splitlines()[0]
+        self.assertEqual(sum(json.loads(histogram)), 3000)
+
 
 class TestWordCountSimulation(unittest.TestCase):
 
@@ -332,6 +1023,522 @@ class TestWordCountSimulation(unittest.TestCase):
         # Check if file was opened correctly
         mock_file.assert_called_with(file_path, 'r')
 
+    def test_memory_mapped_chunks_match_count_words(self):
+        """
+        Test that counting a file in small memory-mapped chunks gives the same
+        counts as reading it whole, including words straddling chunk boundaries.
+        """
+        sim = WordCountSimulation()
+        sim.config = Config()
+        sim.config.data = {'word_count_read_size': 16}
+        words_to_count = ["python", "multiprocessing", "example", "čeština"]
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'text.txt')
+            with open(file_path, 'w', encoding='utf-8') as file:
+                file.write("Python, multiprocessing example ČEŠTINA counterexample.\n" * 50)
+            expected = sim.count_words(file_path, words_to_count)
+            totals = Counter()
+            for chunk in sim.split_files([file_path], 37):
+                totals.update(sim.count_chunk(*chunk, words_to_count))
+        self.assertEqual(dict(totals), expected)
+        self.assertEqual(expected["example"], 100)
+
+    def test_chunks_keep_words_with_separators(self):
+        """
+        Test that cuts never split words containing non-word characters, such as
+        "c++", "a-b" or phrases, in any match mode and for any chunk and piece size.
+        """
+        words_to_count = ["c++", "a-b", "a-a", "multiprocessing example", "python"]
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'text.txt')
+            with open(file_path, 'w', encoding='utf-8') as file:
+                file.write("C++ and a-b-a-b, A-B a-a-a-a-a Python multiprocessing example. Čeština c++\n" * 40)
+            for mode in ('count', 'substring', 'whole_word'):
+                sim = WordCountSimulation()
+                sim.config = Config()
+                sim.config.data = {'word_match': mode}
+                expected = sim.count_words(file_path, words_to_count)
+                for chunk_size, read_size in [(7, 3), (37, 16), (100, 1 << 20)]:
+                    sim.config.data = {'word_match': mode, 'word_count_read_size': read_size}
+                    totals = Counter()
+                    for chunk in sim.split_files([file_path], chunk_size):
+                        totals.update(sim.count_chunk(*chunk, words_to_count))
+                    self.assertEqual(dict(totals), expected, (mode, chunk_size, read_size))
+                if mode != 'whole_word':
+                    self.assertEqual(expected["c++"], 80)
+                    self.assertEqual(expected["multiprocessing example"], 40)
+
+    def test_collect_files_from_directories_and_globs(self):
+        """
+        Test that directories are searched recursively, globs expanded and duplicates dropped.
+        """
+        sim = WordCountSimulation()
+        sim.config = Config()
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'sub'))
+            paths = [os.path.join(directory, 'a.txt'), os.path.join(directory, 'sub', 'b.txt')]
+            for path in paths:
+                with open(path, 'w') as file:
+                    file.write("python")
+            sim.config.data = {'word_count_inputs': [os.path.join(directory, '*.txt'), directory]}
+            self.assertEqual(sim.collect_files(), paths)
+
+    def test_schedule_largest_first_and_batches_small_files(self):
+        """
+        Test that large items get their own task first and small items are packed into batches.
+        """
+        sim = WordCountSimulation()
+        items = [('small_1', 0, 10), ('large', 0, 500), ('small_2', 0, 30), ('small_3', 0, 40), ('medium', 0, 100)]
+        self.assertEqual(sim.schedule(items, 100), [
+            [('large', 0, 500)], [('medium', 0, 100)],
+            [('small_3', 0, 40), ('small_2', 0, 30), ('small_1', 0, 10)]])
+
+    def test_count_batch_reports_bytes(self):
+        """
+        Test that a batch returns merged counts together with the bytes processed.
+        """
+        sim = WordCountSimulation()
+        sim.config = Config()
+        sim.config.data = {}
+        with tempfile.TemporaryDirectory() as directory:
+            batch = []
+            for name in ['a.txt', 'b.txt']:
+                path = os.path.join(directory, name)
+                with open(path, 'w') as file:
+                    file.write("Python example python")
+                batch.append((path, 0, 21))
+            pid, busy, processed, file_counts = sim.count_batch((batch, ["python", "example"]))
+        self.assertEqual(pid, os.getpid())
+        self.assertEqual(processed, 42)
+        self.assertEqual(file_counts, {path: {"python": 2, "example": 1} for path, _, _ in batch})
+
+    def test_split_files(self):
+        """
+        Test that files are split into consecutive byte ranges covering the whole file.
+        """
+        sim = WordCountSimulation()
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'text.txt')
+            with open(file_path, 'wb') as file:
+                file.write(b'x' * 25)
+            self.assertEqual(sim.split_files([file_path], 10),
+                             [(file_path, 0, 10), (file_path, 10, 20), (file_path, 20, 25)])
+
+
+class TestCompressedInput(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Write the same text plain and as multi-member gzip, multi-stream bzip2 and xz files.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.parts = [f"Python part {i}: multiprocessing EXAMPLE, čeština example_{i}.\n".encode('utf-8') * 200
+                      for i in range(6)]
+        self.paths = {'plain': os.path.join(self.directory.name, 'text.txt')}
+        with open(self.paths['plain'], 'wb') as f:
+            f.write(b''.join(self.parts))
+        for name, compress in [('gz', gzip.compress), ('bz2', bz2.compress), ('xz', lzma.compress)]:
+            self.paths[name] = os.path.join(self.directory.name, f'text.txt.{name}')
+            with open(self.paths[name], 'wb') as f:
+                f.write(b''.join(compress(part) for part in self.parts))
+        self.words = ["python", "multiprocessing", "example", "čeština"]
+        self.sim = WordCountSimulation()
+        self.sim.config = Config()
+        self.sim.config.data = {'word_count_read_size': 64}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_compressed_counts_match_plain_text(self):
+        """
+        Test that every format, streamed in small reads and split at members,
+        gives the counts of the plain file.
+        """
+        expected = self.sim.count_words(self.paths['plain'], self.words)
+        for name in ('gz', 'bz2', 'xz'):
+            ranges = member_ranges(self.paths[name], 100)
+            if name in ('gz', 'bz2'):
+                self.assertEqual(len(ranges), len(self.parts), name)
+            totals = Counter()
+            for item in ranges:
+                totals.update(self.sim.count_compressed(*item, self.words))
+            self.assertEqual(dict(totals), expected, name)
+
+    def test_members_splitting_words(self):
+        """
+        Test that members cut in the middle of words and UTF-8 characters still
+        give the counts of the plain file, whatever the ranges and read size.
+        """
+        text = b''.join(self.parts)
+        words = self.words + ["multiprocessing example", "example, č", ".\npython"]
+        expected = self.sim.count_words(self.paths['plain'], words)
+        for name, compress in [('gz', gzip.compress), ('bz2', bz2.compress)]:
+            path = os.path.join(self.directory.name, f'split.txt.{name}')
+            with open(path, 'wb') as f:
+                f.write(b''.join(compress(text[i:i + 1001]) for i in range(0, len(text), 1001)))
+            for chunk_size, read_size in [(100, 64), (2000, 7), (100, 1 << 20)]:
+                self.sim.config.data = {'word_count_read_size': read_size}
+                ranges = member_ranges(path, chunk_size)
+                self.assertGreater(len(ranges), 1)
+                totals = Counter()
+                for item in ranges:
+                    totals.update(self.sim.count_compressed(*item, words))
+                self.assertEqual(dict(totals), expected, (name, chunk_size, read_size))
+        self.assertEqual(expected["multiprocessing example"], 1200)
+
+    def test_range_not_ending_at_member_is_rejected(self):
+        """
+        Test that a range whose end is not a member boundary fails the contiguity check.
+        """
+        _, _, end = member_ranges(self.paths['gz'], 100)[0]
+        with self.assertRaises(MemberBoundaryError):
+            self.sim.count_compressed(self.paths['gz'], 0, end - 1, self.words)
+        with self.assertRaises(MemberBoundaryError):
+            self.sim.count_compressed(self.paths['gz'], 1, end, self.words)
+
+    def test_count_batch_marks_misaligned_file(self):
+        """
+        Test that count_batch reports a compressed file with misaligned ranges as None.
+        """
+        batch = [(self.paths['gz'], 0, 10), (self.paths['plain'], 0, os.path.getsize(self.paths['plain']))]
+        _, _, _, file_counts = self.sim.count_batch((batch, self.words))
+        self.assertIsNone(file_counts[self.paths['gz']])
+        self.assertEqual(file_counts[self.paths['plain']]["python"], 1200)
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(12):
+            path = os.path.join(self.directory.name, f"{i}.txt")
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write("Python example, multiprocessing čeština PYTHON " * (i + 1))
+            self.paths.append(path)
+        self.sim = WordCountSimulation()
+        self.sim.config = Config()
+        self.sim.config.data = {'word_count_inputs': [self.directory.name], 'num_processes': 2,
+                                'word_count_batch_bytes': 200, 'word_count_prefetch_threads': 2,
+                                'word_count_prefetch_depth': 1}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_prefetched_run_matches_direct_run(self):
+        """
+        Test that counting prefetched batches gives the same totals as the workers reading the files.
+        """
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.sim.run()
+        direct = mock_stdout.getvalue()
+        self.sim.config.data['word_count_prefetch'] = True
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.sim.run()
+        prefetched = mock_stdout.getvalue()
+        self.assertIn("  - python: 156\n", direct)
+        self.assertEqual(direct.split("  - python:")[1], prefetched.split("  - python:")[1])
+        self.assertIn("Counting waited", prefetched)
+
+    def test_large_files_are_prefetched_in_chunks(self):
+        """
+        Test that prefetching reads a large file in chunks of about 'word_count_chunk_size'
+        bytes and still counts words crossing the chunk boundaries once.
+        """
+        path = os.path.join(self.directory.name, "large.txt")
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write("C++ and a-b, Python example. " * 300)
+        self.sim.config.data.update(word_count_inputs=[path], word_count_chunk_size=100,
+                                    words_to_count=["python", "c++", "a-b", "example. c"])
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.sim.run()
+        direct = mock_stdout.getvalue()
+        self.sim.config.data['word_count_prefetch'] = True
+        load_batch = WordCountSimulation.load_batch
+        loaded_sizes = []
+
+        def measured_load_batch(sim, batch, words=()):
+            loaded = load_batch(sim, batch, words)
+            loaded_sizes.extend(len(item[3]) for item in loaded)
+            return loaded
+
+        with patch.object(WordCountSimulation, 'load_batch', measured_load_batch), \
+                patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.sim.run()
+        prefetched = mock_stdout.getvalue()
+        self.assertIn("  - c++: 300\n  - a-b: 300\n  - example. c: 299\n", direct)
+        self.assertEqual(direct.split("  - python:")[1], prefetched.split("  - python:")[1])
+        self.assertGreater(len(loaded_sizes), 80)
+        self.assertLess(max(loaded_sizes), 150)
+
+    def test_prefetch_reports_stage_times_and_read_errors(self):
+        """
+        Test that the stage times are filled in and that a failed read is raised instead of hanging.
+        """
+        batches = self.sim.schedule([(path, 0, os.path.getsize(path)) for path in self.paths], 200)
+        stage_times = {}
+        with multiprocessing.Pool(2) as pool:
+            results = list(self.sim.prefetch_batches(pool, batches, ["python"], stage_times))
+            self.assertEqual(sum(counts["python"] for *_, file_counts in results
+                                 for counts in file_counts.values()), 156)
+            self.assertEqual(set(stage_times), {'read', 'reader_wait', 'counter_wait'})
+            missing = batches + [[(os.path.join(self.directory.name, "missing.txt"), 0, 10)]]
+            with self.assertRaises(FileNotFoundError):
+                list(self.sim.prefetch_batches(pool, missing, ["python"], {}))
+
+
+class TestWordCountCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.directory.name, 'cache.json')
+        self.paths = []
+        for name in ['a.txt', 'b.txt']:
+            path = os.path.join(self.directory.name, name)
+            with open(path, 'w') as file:
+                file.write("python example")
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_rerun_only_counts_changed_files(self):
+        """
+        Test that a rerun answers unchanged files from the cache and recounts changed ones.
+        """
+        sim = WordCountSimulation()
+        sim.config = Config()
+        sim.config.data = {'word_count_inputs': self.paths, 'word_count_cache': True,
+                           'word_count_cache_path': self.cache_path, 'words_to_count': ["python"],
+                           'num_processes': 2}
+        with patch('sys.stdout', new_callable=StringIO):
+            sim.run()
+        with open(self.paths[1], 'a') as file:
+            file.write(" python, a longer file")
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            sim.run()
+        output = mock_stdout.getvalue()
+        self.assertIn("Cache: 1 hits, 1 misses, 0 evictions", output)
+        self.assertIn("  - python: 3", output)
+
+    def test_cache_is_keyed_by_word_set_and_mode(self):
+        """
+        Test that counts are only reused for the same normalised word set and match mode.
+        """
+        cache = WordCountCache(self.cache_path)
+        identity = cache.identity(self.paths[0])
+        cache.put(self.paths[0], ["python", "example"], 'count', identity, {"python": 1, "example": 1})
+        self.assertEqual(cache.get(self.paths[0], ["example", "python", "python"], 'count', identity),
+                         {"example": 1, "python": 1})
+        self.assertIsNone(cache.get(self.paths[0], ["python"], 'count', identity))
+        self.assertIsNone(cache.get(self.paths[0], ["python", "example"], 'whole_word', identity))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_malformed_cache_file(self):
+        """
+        Test that a cache file of the wrong shape, or its malformed entries, are dropped on load.
+        """
+        with open(self.cache_path, 'w') as f:
+            json.dump([1, 2], f)
+        with patch('builtins.print'):
+            self.assertEqual(len(WordCountCache(self.cache_path).entries), 0)
+
+        cache = WordCountCache(self.cache_path)
+        identity = cache.identity(self.paths[0])
+        cache.put(self.paths[0], ["python"], 'count', identity, {"python": 1})
+        cache.put(self.paths[1], ["python"], 'count', identity, {"python": 1})
+        cache.entries[WordCountCache.key(self.paths[1], ["python"], 'count')] = {'identity': identity}
+        cache.entries['not a key'] = {'identity': identity, 'counts': {}}
+        cache.save()
+        with patch('builtins.print') as printed:
+            cache = WordCountCache(self.cache_path)
+        self.assertIn("Dropped 2 malformed entries", printed.call_args.args[0])
+        self.assertEqual(cache.get(self.paths[0], ["python"], 'count', identity), {"python": 1})
+        self.assertIsNone(cache.get(self.paths[1], ["python"], 'count', identity))
+
+    def test_lru_eviction_and_persistence(self):
+        """
+        Test that the least recently used entry is evicted and the cache survives a reload.
+        """
+        cache = WordCountCache(self.cache_path, max_entries=1, use_hash=True)
+        identities = [cache.identity(path) for path in self.paths]
+        for path, identity in zip(self.paths, identities):
+            cache.put(path, ["python"], 'count', identity, {"python": 1})
+        self.assertEqual(cache.evictions, 1)
+        cache.save()
+
+        reloaded = WordCountCache(self.cache_path, max_entries=1, use_hash=True)
+        self.assertIsNone(reloaded.get(self.paths[0], ["python"], 'count', identities[0]))
+        self.assertEqual(reloaded.get(self.paths[1], ["python"], 'count', identities[1]), {"python": 1})
+
+
+class TestVocabularyMode(unittest.TestCase):
+
+    def test_count_min_sketch_never_underestimates_and_merges(self):
+        """
+        Test that sketch estimates are upper bounds and merging equals adding everything to one sketch.
+        """
+        counts = {f"word{i}": i % 17 + 1 for i in range(2000)}
+        first, second, combined = CountMinSketch(256, 4), CountMinSketch(256, 4), CountMinSketch(256, 4)
+        first.add(dict(list(counts.items())[:1000]))
+        second.add(dict(list(counts.items())[1000:]))
+        combined.add(counts)
+        first.merge(second)
+        np.testing.assert_array_equal(first.table, combined.table)
+        self.assertTrue(np.all(combined.estimate(list(counts)) >= np.array(list(counts.values()))))
+
+    def test_heavy_hitters_keep_frequent_words(self):
+        """
+        Test that words occurring more than total / capacity times survive pruning and merging.
+        """
+        left, right = HeavyHitters(5), HeavyHitters(5)
+        left.update({"python": 500, **{f"rare{i}": 1 for i in range(100)}})
+        right.update({"example": 300, **{f"other{i}": 2 for i in range(100)}})
+        left.merge(right)
+        left.prune()
+        self.assertIn("python", left.counters)
+        self.assertIn("example", left.counters)
+        self.assertLessEqual(len(left.counters), 5)
+
+    def test_vocabulary_run_reports_top_words_and_accuracy(self):
+        """
+        Test the full-vocabulary mode with exact counts and with the sketch checked against them.
+        """
+        sim = WordCountSimulation()
+        sim.config = Config()
+        with tempfile.TemporaryDirectory() as directory:
+            for i in range(3):
+                with open(os.path.join(directory, f"{i}.txt"), 'w') as file:
+                    file.write("Python python python example example multiprocessing " * (i + 1))
+            sim.config.data = {'word_count_inputs': [directory], 'word_count_mode': 'vocabulary',
+                               'word_count_top_k': 2, 'num_processes': 2, 'word_count_batch_bytes': 1}
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                sim.run()
+            self.assertIn("- Distinct words: 3", mock_stdout.getvalue())
+            self.assertIn("  - python: 18\n  - example: 12", mock_stdout.getvalue())
+            self.assertIn("- Partial results merged: 3", mock_stdout.getvalue())
+
+            sim.config.data['word_count_sketch'] = True
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                sim.run()
+            self.assertIn("  - python: 18\n  - example: 12", mock_stdout.getvalue())
+            self.assertNotIn("Sketch accuracy", mock_stdout.getvalue())
+
+            sim.config.data['word_count_sketch_verify'] = True
+            with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+                sim.run()
+            self.assertIn("Top 2 words found: 2 of 2", mock_stdout.getvalue())
+
+    def test_group_batches(self):
+        """
+        Test that batches are dealt out into at most the given number of tasks, keeping every item.
+        """
+        sim = WordCountSimulation()
+        batches = [[('a', 0, 50)], [('b', 0, 40)], [('c', 0, 30)], [('d', 0, 20), ('e', 0, 10)]]
+        self.assertEqual(sim.group_batches(batches, 2),
+                         [[('a', 0, 50), ('c', 0, 30)], [('b', 0, 40), ('d', 0, 20), ('e', 0, 10)]])
+        self.assertEqual(sim.group_batches(batches[:1], 4), batches[:1])
+
+
+class TestWordMatcher(unittest.TestCase):
+
+    def test_substring_automaton_matches_str_count(self):
+        """
+        Test that the single-pass automaton gives exactly the str.count results,
+        including words that are prefixes, suffixes or overlaps of each other.
+        """
+        words = ["example", "counterexample", "ample", "aa", "ab", "b"]
+        text = "an example of a counterexample: aaa abab aab, examples"
+        with patch.object(WordMatcher, 'AUTOMATON_MIN_WORDS', 1):
+            matcher = WordMatcher(words, 'substring')
+        self.assertTrue(matcher._use_automaton)
+        self.assertEqual(matcher.count(text), WordMatcher(words, 'count').count(text))
+
+    def test_substring_mode_uses_str_count_for_few_words(self):
+        """
+        Test that substring mode only builds the automaton from AUTOMATON_MIN_WORDS words on.
+        """
+        self.assertFalse(WordMatcher(["a", "b"], 'substring')._use_automaton)
+        words = [f"w{i}" for i in range(WordMatcher.AUTOMATON_MIN_WORDS)]
+        self.assertTrue(WordMatcher(words, 'substring')._use_automaton)
+
+    def test_whole_word_mode(self):
+        """
+        Test that whole-word matching ignores words embedded in longer words.
+        """
+        matcher = WordMatcher(["example", "python"], 'whole_word')
+        counts = matcher.count("example, counterexample python3 python examples")
+        self.assertEqual(counts, {"example": 1, "python": 1})
+
+    def test_count_words_uses_configured_mode(self):
+        """
+        Test that WordCountSimulation counts with the configured match mode.
+        """
+        sim = WordCountSimulation()
+        sim.config = Config()
+        sim.config.data = {'word_match': 'whole_word'}
+        with patch('builtins.open', mock_open(read_data="Example counterexample EXAMPLE.")):
+            self.assertEqual(sim.count_words("test_file.txt", ["example"]), {"example": 2})
+
+    def test_unknown_mode(self):
+        """
+        Test that an unknown match mode is rejected.
+        """
+        with self.assertRaises(ValueError):
+            WordMatcher(["python"], 'regex')
+
+
+class TestBytesCounting(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Write a mixed-case corpus with punctuation, digits, underscores and
+        non-ASCII text, so some pieces take the ASCII path and others the fallback.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, "corpus.txt")
+        lines = [
+            "Python, PYTHON; python_3 pythonic Example counterEXAMPLE examples.\n",
+            "Multiprocessing multiPROCESSING! aaa AAA aAa ab-AB-ab A-B-a-b\n",
+            "Žluťoučký kůň Python ÉXAMPLE straße STRASSE example\n",
+            "Ünïcödé-python pythön example_example EXAMPLE\n",
+        ]
+        with open(self.file_path, 'w', encoding='utf-8') as f:
+            f.write("".join(lines) * 50)
+        self.words = ["python", "example", "multiprocessing", "aa", "ab", "straße", "pythön", "é",
+                      "a-b", "b-a", "ples.\nmulti", "-python"]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_bytes_path_matches_text_path(self):
+        """
+        Test that count_bytes gives exactly the count_words results in every match
+        mode, with pieces small enough to split the corpus many times.
+        """
+        size = os.path.getsize(self.file_path)
+        for mode, read_size in itertools.product(('count', 'substring', 'whole_word'), (5, 64)):
+            sim = WordCountSimulation()
+            sim.config = Config()
+            sim.config.data = {'word_match': mode, 'word_count_read_size': read_size}
+            expected = sim.count_words(self.file_path, self.words)
+            self.assertEqual(sim.count_bytes(self.file_path, 0, size, self.words), expected, mode)
+            middle = size // 3
+            halves = Counter(sim.count_bytes(self.file_path, 0, middle, self.words))
+            halves.update(sim.count_bytes(self.file_path, middle, size, self.words))
+            self.assertEqual(dict(halves), expected, mode)
+            if mode != 'whole_word':
+                self.assertEqual(expected["a-b"], 100)
+
+    def test_count_bytes_on_ascii_buffer(self):
+        """
+        Test that WordMatcher.count_bytes counts lowercased ASCII bytes like the decoded text.
+        """
+        data = b"python example python a-b-a-b"
+        for mode in ('count', 'substring', 'whole_word'):
+            matcher = WordMatcher(["python", "example", "a-b"], mode)
+            self.assertEqual(matcher.count_bytes(data), matcher.count(data.decode('ascii')), mode)
+            self.assertEqual(matcher.count_bytes(bytearray(data))["python"], 2)
+
 
 class TestPrimeNumberSimulation(unittest.TestCase):
 
@@ -368,13 +1575,121 @@ class TestPrimeNumberSimulation(unittest.TestCase):
         self.assertFalse(is_prime(9))
         self.assertFalse(is_prime(1))
 
+    def test_is_prime_many_matches_is_prime(self):
+        """
+        Test that the batched API agrees with is_prime, also when split across processes.
+        """
+        values = list(range(-5, 70000, 7))
+        expected = [is_prime(n) for n in values]
+        self.assertEqual(is_prime_many(values).tolist(), expected)
+        self.assertEqual(is_prime_many(values, num_processes=2, batch_size=2500).tolist(), expected)
+
+    def test_is_prime_many_large_values(self):
+        """
+        Test Miller-Rabin on 64-bit primes, composites and strong pseudoprimes.
+        """
+        values = [2 ** 61 - 1, 18446744073709551557, 2 ** 64 - 1, 3215031751, 3825123056546413051]
+        self.assertEqual(is_prime_many(values).tolist(), [True, True, False, False, False])
+        self.assertEqual(is_prime_many(np.array(values, dtype=np.uint64)).tolist(),
+                         [True, True, False, False, False])
+        self.assertEqual(is_prime_many([-7, 2 ** 64 - 59, 2 ** 64 - 1]).tolist(), [False, True, False])
+
+    def test_values_beyond_64_bits_are_rejected(self):
+        """
+        Test that values of 2**64 and above raise ValueError instead of a wrong answer,
+        such as for 399165290221 * 798330580441, a strong pseudoprime to all bases up to 37.
+        """
+        with self.assertRaises(ValueError):
+            miller_rabin(318665857834031151167461)
+        for values in ([2 ** 64], [3, 318665857834031151167461], [-1, 2 ** 64 + 1]):
+            with self.assertRaises(ValueError):
+                is_prime_many(values)
+
+    def test_segmented_sieve_matches_trial_division(self):
+        """
+        Test that the segmented sieve finds the same primes as trial division,
+        including ranges that span several segments.
+        """
+        for start, end in [(0, 2000), (2, 3), (97, 1000), (100000, 103000), (-10, 20), (-1000, 300), (-10, -2)]:
+            expected = [n for n in range(start, end) if is_prime(n)]
+            self.assertEqual(segmented_sieve(start, end, segment_size=256).tolist(), expected)
+
+    def test_iter_primes_streams_in_order(self):
+        """
+        Test that the streaming generator yields all primes in order across many chunks.
+        """
+        primes = iter_primes(0, 20000, num_processes=2, chunk_size=1000, max_in_flight=3)
+        self.assertEqual(list(primes), [n for n in range(20000) if is_prime(n)])
+
+    def test_iter_primes_stops_early(self):
+        """
+        Test that a consumer can stop the stream before the end of the range.
+        """
+        primes = iter_primes(10 ** 6, 10 ** 7, num_processes=2, chunk_size=10 ** 4)
+        self.assertEqual([next(primes) for _ in range(3)], [1000003, 1000033, 1000037])
+        primes.close()
+
+    def test_worker_engines_agree(self):
+        """
+        Test that the sieve and trial division engines return the same primes.
+        """
+        self.sim.config = Config()
+        self.sim.config.data = {'prime_engine': 'trial'}
+        trial = self.sim.worker(2, 500)
+        self.sim.config.data = {'prime_engine': 'sieve', 'sieve_segment_size': 64}
+        self.assertEqual(self.sim.worker(2, 500), trial)
+
+    def test_result_modes_agree(self):
+        """
+        Test that every result mode aggregates to the same count and first primes.
+        """
+        self.sim.config = Config()
+        summaries = []
+        for result_mode in ['list', 'count', 'array', 'bitmap']:
+            self.sim.config.data = {'prime_result_mode': result_mode}
+            ranges = self.sim.split_range(2, 3001, 3)
+            results = [self.sim.worker(start, end) for start, end in ranges]
+            summaries.append(self.sim.summarize(results, ranges))
+        for summary in summaries:
+            self.assertEqual(summary, (430, [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]))
+
+    def test_timed_worker(self):
+        """
+        Test that the timed worker reports the chunk index, process and busy time.
+        """
+        index, pid, busy, result = self.sim.timed_worker((3, 2, 11, None))
+        self.assertEqual(index, 3)
+        self.assertEqual(pid, os.getpid())
+        self.assertGreaterEqual(busy, 0)
+        self.assertEqual(result, self.sim.worker(2, 11))
+
+    def test_split_range_aligns_inner_bounds(self):
+        """
+        Test that the range is fully covered and inner chunk bounds are multiples of 16.
+        """
+        ranges = self.sim.split_range(3, 1001, 4)
+        self.assertEqual(ranges[0][0], 3)
+        self.assertEqual(ranges[-1][1], 1001)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(start % 16, 0)
+
+    def test_split_range_small_range(self):
+        """
+        Test that asking for more chunks than fit into the range never overshoots its end.
+        """
+        self.assertEqual(self.sim.split_range(2, 11, 64), [(2, 11)])
+        self.assertEqual(self.sim.split_range(0, 40, 64), [(0, 16), (16, 32), (32, 40)])
+
     @patch('multiprocessing.Pool', autospec=True)
     def test_no_primes_found(self, mock_pool):
         """
         Test if the simulation correctly handles cases where no primes are found.
         """
-        instance = mock_pool.return_value
-        instance.starmap.return_value = [[], []]  # No primes in these ranges
+        instance = mock_pool.return_value.__enter__.return_value
+        # No primes in any of the chunks
+        instance.imap_unordered.side_effect = lambda func, tasks: [
+            (index, 0, 0.0, (0, [])) for index, *_ in tasks]
 
         with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
             self.sim.run()
@@ -382,5 +1697,83 @@ class TestPrimeNumberSimulation(unittest.TestCase):
             self.assertIn("Number of primes found: 0", output)
             self.assertIn("First 10 primes: []", output)
 
+class TestPrimeBitmapCache(unittest.TestCase):
+    def setUp(self):
+        """
+        Point a PrimeNumberSimulation at a cache file in a temporary directory.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'primes.cache')
+        self.sim = PrimeNumberSimulation()
+        self.sim.config = Config()
+        self.sim.config.data = {'prime_cache': True, 'prime_cache_path': self.path, 'num_processes': 2}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_range(self, start_number, end_number):
+        self.sim.config.data.update({'start_number': start_number, 'end_number': end_number})
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.sim.run()
+        return mock_stdout.getvalue()
+
+    def test_cache_is_extended_and_reused(self):
+        """
+        Test that a later run only computes the part of the range beyond the cache.
+        """
+        self.assertIn("Number of primes found: 25", self.run_range(2, 100))
+        output = self.run_range(50, 1000)
+        self.assertIn("Numbers answered from cache: 62", output)
+        self.assertIn("Numbers computed and added to cache: 896", output)
+        self.assertIn("Number of primes found: 153", output)
+        self.assertIn("First 10 primes: [53, 59, 61, 67, 71, 73, 79, 83, 89, 97]", output)
+        self.assertEqual(PrimeBitmapCache(self.path).covered_end, 1008)
+
+    def test_cache_queries_match_is_prime(self):
+        """
+        Test counts and first primes read from the cache for ranges with unaligned ends.
+        """
+        self.run_range(2, 200)
+        cache = PrimeBitmapCache(self.path)
+        for start in range(0, 40, 3):
+            for end in range(start, 200, 7):
+                expected = [n for n in range(start, end) if is_prime(n)]
+                self.assertEqual(cache.count(start, end), len(expected))
+                self.assertEqual(cache.primes(start, end, 5), expected[:5])
+
+    def test_cache_starts_at_first_range(self):
+        """
+        Test that a new cache starts at the first range instead of 0, and that a
+        range far from the covered part is computed without the cache.
+        """
+        start = 10 ** 9
+        output = self.run_range(start, start + 1000)
+        self.assertIn("Numbers computed and added to cache: 1008", output)
+        self.assertIn("Number of primes found: 49", output)
+        cache = PrimeBitmapCache(self.path)
+        self.assertEqual((cache.base, cache.covered_end), (start, start + 1008))
+        self.assertEqual(cache.primes(start, start + 100, 3), [n for n in range(start, start + 100) if is_prime(n)][:3])
+
+        output = self.run_range(start + 1500, start + 2500)
+        self.assertIn("Numbers answered from cache: 0", output)
+        self.assertIn("Numbers computed and added to cache: 1504", output)
+        self.assertEqual(PrimeBitmapCache(self.path).covered_end, start + 2512)
+
+        for low, high in [(start - 100, start + 100), (start + 10 ** 6, start + 10 ** 6 + 100)]:
+            output = self.run_range(low, high)
+            self.assertIn("Computing the range without the cache", output)
+            self.assertIn(f"Number of primes found: {sum(map(is_prime, range(low, high + 1)))}", output)
+        self.assertEqual(PrimeBitmapCache(self.path).covered_end, start + 2512)
+
+    def test_invalid_cache_is_rebuilt(self):
+        """
+        Test that a file without a valid header is replaced by a new cache.
+        """
+        with open(self.path, 'wb') as f:
+            f.write(b'not a prime cache')
+        with patch('sys.stdout', new_callable=StringIO):
+            self.assertEqual(PrimeBitmapCache(self.path).covered_end, 0)
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file